@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the IBAN MOD-97 check.
+
+Compares the original character-by-character implementation with the
+table-driven validate_iban() and the validate_ibans() batch API.
+
+Usage (from project root):
+    python3 benchmarks/bench_iban.py [--count N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from csv_to_sepa_xml.validation import iban_mod97, validate_iban, validate_ibans  # noqa: E402
+
+SAMPLE_IBANS = [
+    "DE89370400440532013000",
+    "DE44500105175407324931",
+    "FR7630006000011234567890189",
+    "FR1420041010050500013M02606",
+    "IT60X0542811101000000123456",
+    "ES9121000418450200051332",
+    "NL91ABNA0417164300",
+    "BE68539007547034",
+    "AT611904300234573201",
+    "CH9300762011623852957",
+    "RO49AAAA1B31007593840000",
+    "DE89370400440532013001",  # wrong check digit
+]
+
+
+def legacy_mod97_ok(iban):
+    """The original check-digit loop, kept here as the baseline."""
+    rearranged = iban[4:] + iban[:4]
+    numeric_string = ""
+    for char in rearranged:
+        if char.isdigit():
+            numeric_string += char
+        else:
+            numeric_string += str(ord(char) - ord('A') + 10)
+    return int(numeric_string) % 97 == 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='IBAN MOD-97 micro-benchmark')
+    parser.add_argument('--count', type=int, default=200000, help='IBANs per run (default: 200000)')
+    args = parser.parse_args()
+
+    ibans = [random.choice(SAMPLE_IBANS) for _ in range(args.count)]
+    unique_ibans = [f"DE{random.randint(10, 99)}{random.randint(10**17, 10**18 - 1)}" for _ in range(args.count)]
+
+    def run(label, func):
+        seconds = min(timeit.repeat(func, number=1, repeat=3))
+        print(f"  {label:<40} {seconds:8.3f} s  {args.count / seconds:>12,.0f} IBAN/s")
+        return seconds
+
+    print(f"IBAN check, {args.count:,} IBANs (best of 3)")
+    legacy = run("legacy MOD-97 loop", lambda: [legacy_mod97_ok(i) for i in unique_ibans])
+    table = run("piecewise iban_mod97", lambda: [iban_mod97(i) == 1 for i in unique_ibans])
+    run("validate_iban (full validation)", lambda: [validate_iban(i) for i in unique_ibans])
+    run("validate_ibans, all distinct", lambda: validate_ibans(unique_ibans))
+    run("validate_ibans, repeating accounts", lambda: validate_ibans(ibans))
+    print(f"\n  MOD-97 speedup: {legacy / table:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
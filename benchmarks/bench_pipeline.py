@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the whole conversion pipeline.
+
+Generates CSV inputs of the requested sizes (with a share of invalid rows),
+then times every stage separately:
+
+    parse          csv.DictReader over the file, nothing else
+    validate       validate_payment_row() on every row (parsing not counted)
+    read_csv_file  parse + validate + build Payment records, error report included
+    read_csv_file_mmap  the same with the memory-mapped reader (--reader mmap)
+    build_sepa_xml serialize the valid payments into one XML string
+    write_sepa_xml serialize the valid payments straight into a file
+
+Each stage runs in a fresh Python process, so its peak memory (max RSS)
+is measured on its own and earlier stages cannot warm caches for it.
+Results can be saved as JSON and compared against a stored baseline; the
+run fails (exit code 1) when a stage got slower or bigger than the
+threshold allows.
+
+Usage (from project root):
+    python3 benchmarks/bench_pipeline.py --sizes 10k,100k
+    python3 benchmarks/bench_pipeline.py --sizes 1m,5m --output baseline.json
+    python3 benchmarks/bench_pipeline.py --sizes 1m,5m --baseline baseline.json
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'examples'))
+
+from generate_large_sample import generate_payment  # noqa: E402
+
+STAGES = ('parse', 'validate', 'read_csv_file', 'read_csv_file_mmap', 'build_sepa_xml', 'write_sepa_xml')
+
+CSV_COLUMNS = ['name', 'iban', 'bic', 'amount', 'reference', 'address', 'favorite_store']
+
+# Ways an invalid row is broken, picked at random for each invalid row
+CORRUPTIONS = (
+    ('iban', lambda value: value[:-1] + str((int(value[-1], 36) + 1) % 10)),  # checksum fails
+    ('bic', lambda value: 'XX'),
+    ('amount', lambda value: 'abc'),
+    ('name', lambda value: ''),
+)
+
+
+def parse_size(text):
+    """Parse a row count such as "10k", "1m" or "250000"."""
+    text = text.strip().lower()
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    if multiplier > 1:
+        text = text[:-1]
+    return int(float(text) * multiplier)
+
+
+def generate_input(path, rows, invalid_share, seed):
+    """Write a CSV with `rows` payments, of which about invalid_share are invalid."""
+    rng = random.Random(seed)
+    random.seed(seed)  # generate_payment() uses the global generator
+    temp_path = path + '.part'
+    with open(temp_path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        for _ in range(rows):
+            payment = generate_payment()
+            if rng.random() < invalid_share:
+                field, corrupt = rng.choice(CORRUPTIONS)
+                payment[field] = corrupt(payment[field])
+            writer.writerow(payment)
+    os.replace(temp_path, path)
+
+
+def input_path(data_dir, rows, invalid_share, seed):
+    """Return the cached input for these settings, generating it if needed."""
+    path = os.path.join(data_dir, f"bench_{rows}_{invalid_share:g}_{seed}.csv")
+    if not os.path.exists(path):
+        print(f"  generating {rows:,} rows -> {path}", flush=True)
+        generate_input(path, rows, invalid_share, seed)
+    return path
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process, in MB."""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_stage(stage, path):
+    """
+    Run one stage on one input (inside the child process).
+
+    Returns:
+        dict: seconds, rows processed (input rows for parse, validate and
+              read_csv_file; valid payments for the XML stages) and peak RSS
+    """
+    from csv_to_sepa_xml.csv_reader import read_csv_file
+    from csv_to_sepa_xml.validation import validate_payment_row
+    from csv_to_sepa_xml.xml_builder import build_sepa_xml, write_sepa_xml
+
+    # The converter logs every invalid row; keep that off the terminal
+    logging.basicConfig(level=logging.INFO, handlers=[logging.NullHandler()], force=True)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        error_report = os.path.join(scratch, 'errors.csv')
+
+        if stage == 'parse':
+            start = time.perf_counter()
+            with open(path, 'r', encoding='utf-8') as file:
+                rows = sum(1 for _ in csv.DictReader(file))
+            seconds = time.perf_counter() - start
+
+        elif stage == 'validate':
+            seconds = 0.0
+            rows = 0
+            clock = time.perf_counter
+            with open(path, 'r', encoding='utf-8') as file:
+                for row_number, row in enumerate(csv.DictReader(file), start=2):
+                    start = clock()
+                    validate_payment_row(row, row_number)
+                    seconds += clock() - start
+                    rows += 1
+
+        elif stage in ('read_csv_file', 'read_csv_file_mmap'):
+            engine = 'mmap' if stage == 'read_csv_file_mmap' else 'csv'
+            start = time.perf_counter()
+            read_csv_file(path, error_report_path=error_report, engine=engine)
+            seconds = time.perf_counter() - start
+            with open(path, 'r', encoding='utf-8') as file:
+                rows = sum(1 for _ in file) - 1  # generated rows never span lines
+
+        else:
+            payments = read_csv_file(path, error_report_path=error_report)
+            rows = len(payments)
+            if stage == 'build_sepa_xml':
+                start = time.perf_counter()
+                build_sepa_xml(payments)
+                seconds = time.perf_counter() - start
+            else:
+                start = time.perf_counter()
+                with open(os.path.join(scratch, 'out.xml'), 'w', encoding='utf-8') as file:
+                    write_sepa_xml(payments, file)
+                seconds = time.perf_counter() - start
+
+    return {'seconds': seconds, 'rows': rows, 'peak_rss_mb': peak_rss_mb()}
+
+
+def measure(stage, path, repeat):
+    """Run a stage in fresh processes and keep the best time and lowest peak memory."""
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run-stage', stage, path],
+            capture_output=True, text=True, check=True
+        )
+        runs.append(json.loads(completed.stdout))
+    result = {
+        'seconds': round(min(run['seconds'] for run in runs), 4),
+        'rows': runs[0]['rows'],
+        'peak_rss_mb': round(min(run['peak_rss_mb'] for run in runs), 1),
+    }
+    result['rows_per_second'] = round(result['rows'] / result['seconds']) if result['seconds'] else None
+    return result
+
+
+def compare(results, baseline, threshold, memory_threshold, min_seconds):
+    """
+    Compare results with a baseline.
+
+    Stages that took less than min_seconds in the baseline are too noisy to
+    judge on time and are only checked for memory.
+
+    Returns:
+        list: One message per regression (empty if none)
+    """
+    regressions = []
+    for size, stages in results['results'].items():
+        for stage, result in stages.items():
+            base = baseline.get('results', {}).get(size, {}).get(stage)
+            if base is None:
+                continue
+            if base['seconds'] >= min_seconds and result['seconds'] > base['seconds'] * (1 + threshold):
+                regressions.append(f"{stage} at {int(size):,} rows: {result['seconds']:.3f} s "
+                                   f"vs {base['seconds']:.3f} s baseline "
+                                   f"(+{result['seconds'] / base['seconds'] - 1:.0%})")
+            if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + memory_threshold):
+                regressions.append(f"{stage} at {int(size):,} rows: {result['peak_rss_mb']:.0f} MB "
+                                   f"vs {base['peak_rss_mb']:.0f} MB baseline "
+                                   f"(+{result['peak_rss_mb'] / base['peak_rss_mb'] - 1:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-stage benchmark of the CSV to SEPA XML pipeline')
+    parser.add_argument('--sizes', default='10k,100k',
+                        help='Comma-separated row counts, e.g. 10k,100k,1m,5m (default: 10k,100k)')
+    parser.add_argument('--invalid-share', type=float, default=0.05,
+                        help='Share of invalid rows in the generated input (default: 0.05)')
+    parser.add_argument('--stages', default=','.join(STAGES),
+                        help=f'Comma-separated stages to run (default: {",".join(STAGES)})')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage, best one is kept (default: 3)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the generated input')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'sepa_bench'),
+                        help='Where generated inputs are cached (default: system temp dir)')
+    parser.add_argument('--output', metavar='FILE', help='Save the results as JSON')
+    parser.add_argument('--baseline', metavar='FILE', help='Compare with a saved result and fail on regressions')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed slowdown per stage before failing (default: 0.25 = 25%%)')
+    parser.add_argument('--memory-threshold', type=float, default=0.25,
+                        help='Allowed peak memory growth per stage before failing (default: 0.25)')
+    parser.add_argument('--min-seconds', type=float, default=0.2,
+                        help='Ignore timing regressions of stages faster than this in the baseline')
+    parser.add_argument('--run-stage', nargs=2, metavar=('STAGE', 'CSV'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        print(json.dumps(run_stage(*args.run_stage)))
+        return 0
+
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+    sizes = [parse_size(size) for size in args.sizes.split(',') if size.strip()]
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    results = {
+        'created': datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'invalid_share': args.invalid_share,
+        'results': {},
+    }
+
+    print(f"{'rows':>10}  {'stage':<15} {'seconds':>9} {'rows/s':>12} {'peak MB':>9}")
+    for rows in sizes:
+        path = input_path(args.data_dir, rows, args.invalid_share, args.seed)
+        size_results = results['results'][str(rows)] = {}
+        for stage in stages:
+            result = size_results[stage] = measure(stage, path, args.repeat)
+            rate = f"{result['rows_per_second']:,}" if result['rows_per_second'] else '-'
+            print(f"{rows:>10,}  {stage:<15} {result['seconds']:>9.3f} {rate:>12} "
+                  f"{result['peak_rss_mb']:>9.1f}", flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+            file.write('\n')
+        print(f"\nResults saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold, args.memory_threshold, args.min_seconds)
+        if regressions:
+            print(f"\nREGRESSION against {args.baseline}:")
+            for message in regressions:
+                print(f"  {message}")
+            return 1
+        print(f"\nNo regressions against {args.baseline}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,30 @@
 CSV to SEPA XML Converter
 
 A tool for converting CSV payment files into SEPA-compliant XML format.
+
+Library use:
+    from csv_to_sepa_xml import convert
+    result = convert(csv_stream, xml_stream, debtor_name="ACME GmbH")
 """
 
 __version__ = "2.0.0"
+
+from .api import convert, ConversionResult
+from .csv_reader import PaymentReader, read_csv_file
+from .validation import validate_iban, validate_bic, validate_amount
+from .validation_cache import ValidationCache
+from .xml_builder import build_sepa_xml, write_sepa_xml, stream_sepa_xml
+
+__all__ = [
+    'convert',
+    'ConversionResult',
+    'PaymentReader',
+    'read_csv_file',
+    'validate_iban',
+    'validate_bic',
+    'validate_amount',
+    'ValidationCache',
+    'build_sepa_xml',
+    'write_sepa_xml',
+    'stream_sepa_xml',
+]
@@ -0,0 +1,123 @@
+"""
+Library API: convert CSV payments to SEPA XML between file objects.
+
+convert() reads from any readable text or binary stream and writes the
+XML to any writable text or binary stream as it is generated, so
+services can embed the converter without temporary files and without
+holding the document in memory. Invalid rows go to a callback and/or a
+CSV error report stream.
+
+Usage:
+    with open("payments.csv", "rb") as source, open("payments.xml", "wb") as target:
+        result = convert(source, target, debtor_name="ACME GmbH")
+    print(result.payments, result.total_cents, result.seconds)
+"""
+
+import io
+
+from .csv_reader import PaymentReader
+from .payment import format_cents
+from .profiling import Profiler
+from .xml_builder import write_sepa_xml, stream_sepa_xml
+
+
+class ConversionResult:
+    """
+    Counts, sums and timings of one convert() call.
+
+    Attributes:
+        payments: Number of payments written to the XML
+        invalid_rows: Number of rows rejected by validation
+        total_cents: Control sum of the XML, in cents
+        seconds: Wall time per stage ('read', 'write') and in 'total'
+    """
+
+    __slots__ = ('payments', 'invalid_rows', 'total_cents', 'seconds')
+
+    def __init__(self, payments, invalid_rows, total_cents, seconds):
+        self.payments = payments
+        self.invalid_rows = invalid_rows
+        self.total_cents = total_cents
+        self.seconds = seconds
+
+    @property
+    def total(self):
+        """The control sum as a string with two decimals (e.g. "1234.50")."""
+        return format_cents(self.total_cents)
+
+    def to_dict(self):
+        """Return the result as a JSON-friendly dictionary."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return (f"ConversionResult(payments={self.payments}, invalid_rows={self.invalid_rows}, "
+                f"total={self.total})")
+
+
+def convert(stream_in, stream_out, debtor_name=None, debtor_iban=None, debtor_bic=None,
+            on_error=None, error_stream=None, cache=None, keep_extra=False, encoding='utf-8',
+            streaming=False, spool_dir=None, aliases=None, duplicates=None, created=None):
+    """
+    Convert CSV payments from one stream into SEPA XML on another.
+
+    Nothing is written to the filesystem unless streaming is set (its
+    spool files go to spool_dir or the system temp dir). Without
+    streaming, the validated payments are kept in memory (as compact
+    Payment records) and the XML is written to stream_out piece by piece.
+
+    Arguments:
+        stream_in: Readable text or binary stream with the CSV (or a path)
+        stream_out: Writable text or binary stream for the XML (UTF-8); it
+                    is flushed but left open
+        debtor_name: Override for debtor name
+        debtor_iban: Override for debtor IBAN
+        debtor_bic: Override for debtor BIC
+        on_error: Optional function called as on_error(row, row_number, errors)
+                  for every invalid row
+        error_stream: Optional writable text stream for the CSV error report
+        cache: Optional ValidationCache shared across calls
+        keep_extra: If True, pass non-SEPA columns through in Payment.extra
+        encoding: Encoding of a binary input stream
+        streaming: If True, never hold all payments in memory (see stream_sepa_xml)
+        spool_dir: Directory for the streaming spool files
+        aliases: Header names accepted for each column (see schema);
+                 defaults to config.COLUMN_ALIASES
+        duplicates: Optional DuplicateDetector (see duplicates)
+        created: Creation time of the document (default: the run time, see
+                 clock); the same input and time give the same bytes
+
+    Returns:
+        A ConversionResult
+
+    Raises:
+        ValueError: If the CSV is malformed or has no valid rows
+    """
+    profiler = Profiler()
+    reader = PaymentReader(stream_in, error_stream, cache, keep_extra, on_error=on_error, encoding=encoding,
+                           aliases=aliases, duplicates=duplicates)
+    company = (debtor_name, debtor_iban, debtor_bic)
+
+    text_out = stream_out
+    if isinstance(stream_out, io.IOBase) and not isinstance(stream_out, io.TextIOBase):
+        text_out = io.TextIOWrapper(stream_out, encoding='utf-8')
+    try:
+        if streaming:
+            with profiler.stage('convert'):
+                payment_count, total = stream_sepa_xml(reader, text_out, *company, spool_dir=spool_dir,
+                                                        created=created)
+                reader.finish()
+        else:
+            with profiler.stage('read'):
+                payments = list(reader)
+                reader.finish()
+            with profiler.stage('write'):
+                total = write_sepa_xml(payments, text_out, *company, created=created)
+            payment_count = len(payments)
+        text_out.flush()
+    finally:
+        if text_out is not stream_out:
+            text_out.detach()  # Leave the caller's stream open
+
+    seconds = {name: round(stats.wall, 6) for name, stats in profiler.stages.items()}
+    seconds['total'] = round(profiler.totals()[0], 6)
+    return ConversionResult(payment_count, reader.invalid_count, total, seconds)
@@ -0,0 +1,480 @@
+"""
+Batch mode: many CSV files converted in one run.
+
+The inputs come from a directory (every *.csv in it), a glob pattern or a
+manifest file, and every input becomes one XML file in the output
+directory. The files are converted by a pool of worker processes, one
+file per task; a file that fails is reported and the others carry on.
+The run ends with one summary of files, payments, totals and timings.
+
+Usage:
+    jobs = collect_jobs("payments/", "out/")
+    results = run_batch(jobs, company, workers=4)
+    print(format_summary(summarize(results, wall_seconds)))
+"""
+
+import contextlib
+import csv
+import functools
+import glob
+import json
+import logging
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import row_log
+from .cli import open_payment_reader, convert_to_file
+from .clock import run_time
+from .duplicates import DuplicateDetector
+from .ids import ClockIds, SequenceIds
+from .payment import format_cents
+from .profiling import Profiler
+from .validation_cache import ValidationCache
+from .schema import parse_column_aliases
+from .config import DEFAULT_VALIDATION_CACHE_SIZE, DEFAULT_COMPRESSION_LEVEL
+
+logger = logging.getLogger(__name__)
+
+# Slowest files listed in the summary
+SLOWEST_FILES_SHOWN = 5
+
+# Per-process state, set up by _init_worker()
+_worker_cache = None
+_worker_ids = None
+
+
+def collect_jobs(source, output_dir):
+    """
+    Return the (input, output) pairs of a batch.
+
+    The source is one of:
+    - a directory: every *.csv file in it (not recursive)
+    - a glob pattern such as "exports/*/payments_*.csv"
+    - a manifest file: one input per line, optionally followed by a comma
+      and the output name; blank lines and lines starting with # are
+      skipped, relative inputs are relative to the manifest
+
+    Outputs default to the input name with an .xml extension; relative
+    outputs go into output_dir.
+
+    Arguments:
+        source: Directory, glob pattern or manifest path
+        output_dir: Directory for the XML files
+
+    Returns:
+        A list of (input path, output path) tuples, in a stable order
+
+    Raises:
+        FileNotFoundError: If the source does not exist
+        ValueError: If it names no inputs, or two inputs share an output
+    """
+    if os.path.isdir(source):
+        inputs = [(path, None) for path in sorted(glob.glob(os.path.join(source, '*.csv')))]
+    elif any(character in source for character in '*?['):
+        inputs = [(path, None) for path in sorted(glob.glob(source)) if os.path.isfile(path)]
+    elif os.path.isfile(source):
+        inputs = read_manifest(source)
+    else:
+        raise FileNotFoundError(f"Batch source not found: {source}")
+
+    if not inputs:
+        raise ValueError(f"No input files found for batch source: {source}")
+
+    jobs = []
+    seen = {}
+    for input_file, output_name in inputs:
+        if not output_name:
+            output_name = os.path.splitext(os.path.basename(input_file))[0] + '.xml'
+        output_file = os.path.join(output_dir, output_name)
+        key = os.path.normcase(os.path.abspath(output_file))
+        if key in seen:
+            raise ValueError(f"{input_file} and {seen[key]} would both be written to {output_file}")
+        seen[key] = input_file
+        jobs.append((input_file, output_file))
+    return jobs
+
+
+def read_manifest(path):
+    """
+    Read a batch manifest (see collect_jobs).
+
+    Returns:
+        A list of (input path, output name or None) tuples
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    inputs = []
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        for fields in csv.reader(file):
+            fields = [field.strip() for field in fields]
+            if not fields or not fields[0] or fields[0].startswith('#'):
+                continue
+            input_file = os.path.join(base_dir, fields[0])
+            inputs.append((input_file, fields[1] if len(fields) > 1 and fields[1] else None))
+    return inputs
+
+
+def convert_file(input_file, output_file, company, streaming=False, cache=None,
+                 max_error_rows=None, max_error_bytes=None, error_report_dir=None,
+                 id_generator=None, number=None, reader_engine='csv', aliases=None,
+                 duplicate_policy=None, duplicate_memory_mb=None, compression_level=DEFAULT_COMPRESSION_LEVEL):
+    """
+    Convert one file of a batch, never raising.
+
+    Arguments:
+        input_file: Path to the input CSV
+        output_file: Path for the output XML
+        company: (debtor name, IBAN, BIC) overrides, None for the defaults
+        streaming: If True, convert in one constant-memory pass
+        cache: ValidationCache shared by the files converted in this process
+        max_error_rows: Optional cap on the rows written to the error report
+        max_error_bytes: Optional cap on the size of the error report
+        error_report_dir: Optional directory for the error report, named
+                          <input name>_errors.csv (replacing an older one);
+                          by default it is written next to the input
+        id_generator: Where the document gets its ids (default: ClockIds, see ids)
+        number: Number of the file within the batch, which ClockIds adds to
+                the ids so files converted in the same second differ
+        reader_engine: 'csv' or 'mmap' (see cli.open_payment_reader)
+        aliases: Header names accepted for each column (see schema)
+        duplicate_policy: 'warn', 'keep-first' or 'reject' to look for duplicate
+                          payments within the file (see duplicates); None to skip
+        duplicate_memory_mb: Bloom filter size for the duplicate check, in MB
+        compression_level: Level for a compressed output, 1 (fastest) to 9 (smallest)
+
+    Returns:
+        dict: input, output, ok, payments, invalid, total_cents, seconds
+              and error (None on success)
+    """
+    start = time.perf_counter()
+    profiler = Profiler()
+    result = {
+        'input': input_file,
+        'output': output_file,
+        'ok': False,
+        'payments': 0,
+        'invalid': 0,
+        'total_cents': 0,
+        'seconds': None,
+        'error': None,
+    }
+    logger.info(f"Batch: converting {input_file} -> {output_file}")
+    try:
+        error_report_path = None
+        if error_report_dir is not None:
+            base_name = os.path.splitext(os.path.basename(input_file))[0]
+            error_report_path = os.path.join(error_report_dir, f"{base_name}_errors.csv")
+            if os.path.exists(error_report_path):
+                os.remove(error_report_path)
+        duplicates = None
+        if duplicate_policy:
+            memory_bytes = duplicate_memory_mb * 1024 * 1024 if duplicate_memory_mb else None
+            duplicates = DuplicateDetector(duplicate_policy, memory_bytes)
+        open_reader = functools.partial(open_payment_reader, input_file, cache, 1,
+                                        max_error_rows, max_error_bytes, error_report_path,
+                                        reader_engine=reader_engine, aliases=aliases, duplicates=duplicates)
+        created = run_time()
+        ids = (id_generator or ClockIds()).document(created, number)
+        payment_count, total = convert_to_file(open_reader, output_file, company, streaming, profiler,
+                                               compression_level, created=created, ids=ids)
+        result.update(ok=True, payments=payment_count, total_cents=total)
+    except Exception as e:
+        result['error'] = str(e) or type(e).__name__
+        logger.error(f"Batch: {input_file} failed: {result['error']}")
+    finally:
+        result['invalid'] = profiler.counters.get('rows_invalid', 0)
+        result['seconds'] = round(time.perf_counter() - start, 6)
+    return result
+
+
+def _init_worker(cache_size, cache_items, row_log_limit, ignore_interrupts, id_generator):
+    """
+    Give each worker process its own validation cache, seeded from the
+    parent and kept for all files the worker converts, and its own copy
+    of the id generator (a SequenceIds copy reserves its own numbers).
+    """
+    global _worker_cache, _worker_ids
+    _worker_cache = ValidationCache(cache_size)
+    _worker_ids = id_generator
+    _worker_cache.update(cache_items)
+    row_log.configure(row_log_limit)
+    if ignore_interrupts:
+        # Ctrl+C reaches the whole process group; let the parent decide
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _convert_in_worker(input_file, output_file, company, streaming, max_error_rows, max_error_bytes,
+                       error_report_dir, number, convert_options):
+    """convert_file() with the worker's validation cache and id generator."""
+    return convert_file(input_file, output_file, company, streaming, _worker_cache,
+                        max_error_rows, max_error_bytes, error_report_dir, _worker_ids, number,
+                        **convert_options)
+
+
+def create_pool(workers, cache, ignore_interrupts=False, id_generator=None):
+    """
+    Return a process pool for run_batch(), e.g. to keep one for many batches.
+
+    Arguments:
+        workers: Number of worker processes
+        cache: ValidationCache every worker's cache is seeded from
+        ignore_interrupts: If True, workers ignore Ctrl+C and finish their
+                           file; the caller shuts the pool down
+        id_generator: Where the documents get their ids (default: ClockIds)
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(cache.maxsize, cache.items(), row_log.get_limit(), ignore_interrupts, id_generator)
+    )
+
+
+def submit_file(pool, input_file, output_file, company, streaming=False,
+                max_error_rows=None, max_error_bytes=None, error_report_dir=None, number=None,
+                convert_options=None):
+    """
+    Convert one file in a pool from create_pool().
+
+    convert_options are further keyword arguments of convert_file()
+    (reader_engine, aliases, duplicate_policy, ...).
+
+    Returns:
+        A concurrent.futures.Future of the convert_file() result
+    """
+    return pool.submit(_convert_in_worker, input_file, output_file, company, streaming,
+                       max_error_rows, max_error_bytes, error_report_dir, number, convert_options or {})
+
+
+def run_batch(jobs, company, workers=1, streaming=False, cache=None,
+              max_error_rows=None, max_error_bytes=None, error_report_dir=None, pool=None,
+              id_generator=None, first_number=1, convert_options=None):
+    """
+    Convert every (input, output) pair, one file per task.
+
+    With one worker the files are converted in this process, one after the
+    other, sharing the given cache. Otherwise each worker process starts
+    from a copy of the cache and keeps it for the files it converts.
+
+    Arguments:
+        pool: Optional pool from create_pool() to use (and leave running)
+              instead of starting one for this batch (it brings its own
+              id generator)
+        id_generator: Where the documents get their ids (default: ClockIds)
+        first_number: Number of the first file, counting up through the jobs
+        convert_options: Further keyword arguments of convert_file()
+                         (reader_engine, aliases, duplicate_policy, ...)
+
+    Returns:
+        A list of convert_file() results, in job order
+    """
+    if cache is None:
+        cache = ValidationCache(DEFAULT_VALIDATION_CACHE_SIZE)
+    convert_options = convert_options or {}
+    options = (streaming, max_error_rows, max_error_bytes, error_report_dir)
+    results = [None] * len(jobs)
+
+    if pool is None and (workers <= 1 or len(jobs) == 1):
+        for index, (input_file, output_file) in enumerate(jobs):
+            results[index] = convert_file(input_file, output_file, company, streaming, cache,
+                                          max_error_rows, max_error_bytes, error_report_dir,
+                                          id_generator, first_number + index, **convert_options)
+            _log_progress(results, index)
+        return results
+
+    if pool is None:
+        owned_pool = pool = create_pool(min(workers, len(jobs)), cache, id_generator=id_generator)
+    else:
+        owned_pool = contextlib.nullcontext()
+    with owned_pool:
+        futures = {
+            submit_file(pool, input_file, output_file, company, *options, first_number + index,
+                        convert_options): index
+            for index, (input_file, output_file) in enumerate(jobs)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. killed for memory)
+                input_file, output_file = jobs[index]
+                results[index] = {
+                    'input': input_file, 'output': output_file, 'ok': False, 'payments': 0,
+                    'invalid': 0, 'total_cents': 0, 'seconds': None,
+                    'error': f"Worker process failed: {e}",
+                }
+                logger.error(f"Batch: {input_file} failed: {results[index]['error']}")
+            _log_progress(results, index)
+    return results
+
+
+def _log_progress(results, index):
+    done = sum(1 for result in results if result is not None)
+    result = results[index]
+    status = 'ok' if result['ok'] else 'FAILED'
+    logger.info(f"Batch: [{done}/{len(results)}] {result['input']}: {status}")
+
+
+def summarize(results, wall_seconds, workers=1):
+    """
+    Return the totals of a batch as a JSON-friendly dictionary.
+
+    Arguments:
+        results: convert_file() results
+        wall_seconds: Wall time of the whole batch
+        workers: Number of worker processes used
+    """
+    converted = [result for result in results if result['ok']]
+    timed = [result for result in results if result['seconds'] is not None]
+    return {
+        'files': len(results),
+        'converted': len(converted),
+        'failed': len(results) - len(converted),
+        'payments': sum(result['payments'] for result in converted),
+        'invalid_rows': sum(result['invalid'] for result in results),
+        'total_cents': sum(result['total_cents'] for result in converted),
+        'wall_seconds': round(wall_seconds, 6),
+        'file_seconds': round(sum(result['seconds'] for result in timed), 6),
+        'workers': workers,
+        'results': results,
+    }
+
+
+def format_summary(summary):
+    """Return the batch summary as text for the console."""
+    lines = [
+        "BATCH SUMMARY",
+        f"  Files:    {summary['converted']} converted, {summary['failed']} failed "
+        f"({summary['files']} total)",
+        f"  Payments: {summary['payments']:,}",
+        f"  Invalid:  {summary['invalid_rows']:,} row(s) skipped",
+        f"  Total:    EUR {format_cents(summary['total_cents'], grouping=True)}",
+        f"  Time:     {summary['wall_seconds']:.2f} s wall, {summary['file_seconds']:.2f} s converting "
+        f"({summary['workers']} worker(s))",
+    ]
+
+    timed = [result for result in summary['results'] if result['seconds'] is not None]
+    slowest = sorted(timed, key=lambda result: result['seconds'], reverse=True)[:SLOWEST_FILES_SHOWN]
+    if len(timed) > 1:
+        lines.append("  Slowest:")
+        for result in slowest:
+            lines.append(f"    {result['seconds']:8.2f} s  {result['input']}")
+
+    failed = [result for result in summary['results'] if not result['ok']]
+    if failed:
+        lines.append("  Failed:")
+        for result in failed:
+            lines.append(f"    {result['input']}: {result['error']}")
+    return '\n'.join(lines)
+
+
+def save_summary(summary, path):
+    """Write the batch summary, with one entry per file, as JSON (atomically)."""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(summary, file, indent=2)
+        file.write('\n')
+    os.replace(temp_path, path)
+    logger.info(f"Batch summary written to: {path}")
+
+
+def conversion_options(reader_engine='csv', column_aliases=None, duplicate_policy=None,
+                       duplicate_memory_mb=None, compression_level=DEFAULT_COMPRESSION_LEVEL):
+    """
+    Return the convert_file() keyword arguments for the reader, duplicate
+    and compression options of batch, watch and server mode.
+
+    Raises:
+        ValueError: For a malformed column alias
+    """
+    return {
+        'reader_engine': reader_engine,
+        'aliases': parse_column_aliases(column_aliases) if column_aliases else None,
+        'duplicate_policy': duplicate_policy,
+        'duplicate_memory_mb': duplicate_memory_mb,
+        'compression_level': compression_level,
+    }
+
+
+def run_batch_mode(source, output_dir, debtor_name=None, debtor_iban=None, debtor_bic=None, quiet=False,
+                   streaming=False, cache_path=None, cache_size=DEFAULT_VALIDATION_CACHE_SIZE, workers=1,
+                   metrics_path=None, max_error_rows=None, max_error_bytes=None, id_sequence=None,
+                   reader_engine='csv', column_aliases=None, duplicate_policy=None, duplicate_memory_mb=None,
+                   compression_level=DEFAULT_COMPRESSION_LEVEL):
+    """
+    Run the converter over many files in headless batch mode.
+
+    Arguments:
+        source: Directory, glob pattern or manifest of input CSVs (see collect_jobs)
+        output_dir: Directory for the XML files (created if missing)
+        debtor_name: Optional override for company name
+        debtor_iban: Optional override for company IBAN
+        debtor_bic: Optional override for company BIC
+        quiet: If True, suppress the console summary
+        streaming: If True, convert each file in one constant-memory pass
+        cache_path: Optional validation cache snapshot to load before the run
+                    (and save after it, when the files are converted in this process)
+        cache_size: Maximum number of cached IBAN/BIC validation results
+        workers: Number of files converted at the same time
+        metrics_path: Optional path for the batch summary as JSON
+        max_error_rows: Optional cap on the rows written to each error report
+        max_error_bytes: Optional cap on the size of each error report in bytes
+        id_sequence: Optional counter file to number the document ids from
+                     (see ids.SequenceIds); default: ids from the creation time
+        reader_engine: 'csv' or 'mmap' CSV reader (see cli.open_payment_reader)
+        column_aliases: Extra "column=Header name" aliases (see schema.parse_column_aliases)
+        duplicate_policy: 'warn', 'keep-first' or 'reject' to look for duplicate
+                          payments in each file (see duplicates); None to skip the check
+        duplicate_memory_mb: Bloom filter size for the duplicate check, in MB
+        compression_level: Level for compressed outputs, 1 (fastest) to 9 (smallest)
+
+    Returns:
+        Exit code (0 if every file was converted, 1 otherwise)
+    """
+    logger.info(f"Batch Mode: Converting {source} -> {output_dir}")
+    start = time.perf_counter()
+
+    try:
+        options = conversion_options(reader_engine, column_aliases, duplicate_policy, duplicate_memory_mb,
+                                     compression_level)
+        jobs = collect_jobs(source, output_dir)
+        os.makedirs(output_dir, exist_ok=True)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        logger.error(f"Batch setup failed: {e}")
+        return 1
+
+    workers = max(1, min(workers, len(jobs)))
+    logger.info(f"Batch: {len(jobs)} file(s) with {workers} worker(s)")
+
+    cache = ValidationCache(cache_size)
+    if cache_path:
+        cache.load(cache_path)
+
+    results = run_batch(jobs, (debtor_name, debtor_iban, debtor_bic), workers, streaming, cache,
+                        max_error_rows, max_error_bytes,
+                        id_generator=SequenceIds(id_sequence) if id_sequence else None,
+                        convert_options=options)
+
+    # Worker processes keep their own caches, so only a serial run adds to the snapshot
+    if cache_path and workers == 1:
+        try:
+            cache.save(cache_path)
+        except OSError as e:
+            logger.warning(f"Could not save validation cache: {e}")
+
+    summary = summarize(results, time.perf_counter() - start, workers)
+    text = format_summary(summary)
+    if not quiet or summary['failed']:
+        print("\n" + text)
+    for line in text.splitlines():
+        logger.info(line)
+
+    if metrics_path:
+        try:
+            save_summary(summary, metrics_path)
+        except OSError as e:
+            logger.warning(f"Could not write batch summary: {e}")
+
+    return 0 if summary['failed'] == 0 else 1
@@ -0,0 +1,292 @@
+"""
+Checkpointed, resumable conversion (--checkpoint and --resume).
+
+A conversion of millions of rows that dies near the end (out of memory,
+host preemption) normally starts over from row 1. In checkpoint mode the
+conversion works like the streaming one (see stream_sepa_xml), but its
+transactions go into spool files next to the output instead of anonymous
+temporary files, and every checkpoint_every rows a small JSON state file
+records:
+
+- the byte offset of the next input record and the last row number
+- the running counts and the sum in cents, in total and per PmtInf block
+- the size of each spool file and of the error report at that point
+- the creation time and the ids used in the XML, so the finished
+  document is the same as an uninterrupted run would have written
+
+Spool files and the error report are flushed and synced before the state
+file is (atomically) replaced. Resuming cuts them back to the sizes in
+the state file, so anything written after the last checkpoint is redone
+exactly once. Once the XML is complete the state and spool files are
+removed.
+
+Usage:
+    conversion = CheckpointedConversion("payments.csv", "payments.xml", company)
+    payment_count, total = conversion.run(resume=True)
+"""
+
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+
+from .compression import compression_for_output, detect_compression, open_text_output
+from .clock import run_time
+from .config import DEFAULT_CHECKPOINT_ROWS, DEFAULT_COMPRESSION_LEVEL
+from .ids import ClockIds, DocumentIds
+from .mmap_reader import MmapPaymentReader
+from .payment import PaymentGroup, format_cents
+from .xml_builder import SepaXmlWriter, SPOOL_COPY_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the state file layout changes; other versions are not resumed
+STATE_VERSION = 2
+
+
+def checkpoint_path(output_file):
+    """Return the state file used for an output file ("out.xml" -> "out.xml.checkpoint")."""
+    return output_file + '.checkpoint'
+
+
+def _input_identity(input_file):
+    """Size and modification time, to notice an input that changed since the checkpoint."""
+    stat = os.stat(input_file)
+    return {'path': os.path.abspath(input_file), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+class CheckpointedConversion:
+    """
+    Convert one CSV file into one XML file, saving progress as it goes.
+
+    Attributes:
+        state_path: Path of the JSON state file
+        checkpoints: Number of checkpoints saved by this run
+    """
+
+    def __init__(self, input_file, output_file, company, checkpoint_every=DEFAULT_CHECKPOINT_ROWS,
+                 cache=None, max_error_rows=None, max_error_bytes=None, aliases=None,
+                 compression_level=DEFAULT_COMPRESSION_LEVEL, state_path=None, id_generator=None):
+        """
+        Args:
+            input_file: Path to the (uncompressed) input CSV
+            output_file: Path for the output XML (.gz/.bz2/.xz to compress it)
+            company: (debtor name, IBAN, BIC) overrides
+            checkpoint_every: Rows read between two checkpoints
+            cache: Optional ValidationCache
+            max_error_rows: Optional cap on the rows written to the error report
+            max_error_bytes: Optional cap on the size of the error report in bytes
+            aliases: Header names accepted for each column (see schema)
+            compression_level: Level for compressed output
+            state_path: State file (default: see checkpoint_path)
+            id_generator: Where a new run gets its ids (default: ClockIds);
+                          a resumed run keeps the ids of its state file
+        """
+        self.input_file = input_file
+        self.output_file = output_file
+        self.company = tuple(company)
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.cache = cache
+        self.max_error_rows = max_error_rows
+        self.max_error_bytes = max_error_bytes
+        self.aliases = aliases
+        self.compression_level = compression_level
+        self.state_path = state_path or checkpoint_path(output_file)
+        self.id_generator = id_generator or ClockIds()
+        self.checkpoints = 0
+        self.reader = None
+        # group -> [spool file, spool path, number of transactions, sum in cents]
+        self._blocks = {}
+        self._count = 0
+        self._total = 0
+        self._created = None
+        self._ids = None
+
+    def _options(self):
+        """What must not change between a run and its resumption."""
+        aliases = {column: list(names) for column, names in self.aliases.items()} if self.aliases else None
+        return {'company': list(self.company), 'aliases': aliases}
+
+    def _spool_path(self, number):
+        return f"{self.output_file}.spool{number}"
+
+    def load_state(self):
+        """
+        Return the saved state if it can be resumed, else None.
+
+        Raises:
+            ValueError: If the input or the options changed since the checkpoint
+        """
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {self.state_path}: {e}")
+            return None
+        if state.get('version') != STATE_VERSION:
+            logger.warning(f"Ignoring checkpoint {self.state_path} from another version")
+            return None
+        if state['input'] != _input_identity(self.input_file):
+            raise ValueError(f"{self.input_file} changed since the checkpoint was saved; "
+                             f"delete {self.state_path} to start over")
+        if state['options'] != self._options():
+            raise ValueError(f"Debtor or column options differ from the checkpointed run; "
+                             f"use the same options or delete {self.state_path} to start over")
+        return state
+
+    def load_state_quietly(self):
+        """Return a saved state without checking it still matches (to clean it up)."""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def discard(self, state=None):
+        """Remove the state file and the spool files (of a saved state, or of this run)."""
+        paths = [block['spool'] for block in state['blocks']] if state else \
+            [block[1] for block in self._blocks.values()]
+        for path in paths + [self.state_path]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def save_state(self, offset, row_number):
+        """Sync the spools and error report, then atomically replace the state file."""
+        blocks = []
+        for group, (spool, path, count, total) in self._blocks.items():
+            spool.flush()
+            os.fsync(spool.fileno())
+            blocks.append({
+                'group': list(group) if group is not None else None,
+                'spool': path,
+                'size': os.fstat(spool.fileno()).st_size,
+                'count': count,
+                'total': total,
+            })
+        reader = self.reader
+        report = reader.error_report
+        state = {
+            'version': STATE_VERSION,
+            'input': _input_identity(self.input_file),
+            'options': self._options(),
+            'created': self._created.isoformat(),
+            'ids': self._ids.to_dict(),
+            'offset': offset,
+            'row_number': row_number,
+            'valid_count': reader.valid_count,
+            'invalid_count': reader.invalid_count,
+            'payments': self._count,
+            'total': self._total,
+            'blocks': blocks,
+            'error_report': report.state() if report is not None else None,
+        }
+        temp_path = self.state_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(state, file, indent=2)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.state_path)
+        self.checkpoints += 1
+        logger.info(f"Checkpoint at row {row_number}: {self._count} payments, "
+                    f"total {format_cents(self._total)}")
+
+    def _restore_blocks(self, state):
+        """Reopen the spool files of a saved state, cut back to their saved sizes."""
+        for block in state['blocks']:
+            group = PaymentGroup(*block['group']) if block['group'] is not None else None
+            os.truncate(block['spool'], block['size'])
+            spool = open(block['spool'], 'a', encoding='utf-8')
+            self._blocks[group] = [spool, block['spool'], block['count'], block['total']]
+        self._count = state['payments']
+        self._total = state['total']
+
+    def run(self, resume=False):
+        """
+        Convert the file, continuing from the saved checkpoint if resume is set.
+
+        Returns:
+            tuple: (number of payments, total in cents)
+
+        Raises:
+            ValueError: If the input is compressed, changed since the
+                        checkpoint, or has no valid rows
+        """
+        if detect_compression(self.input_file):
+            raise ValueError("Checkpoints need an uncompressed input (compressed files cannot be resumed "
+                             "at a byte offset)")
+
+        state = self.load_state() if resume else None
+        if state is None:
+            if resume:
+                logger.warning(f"No checkpoint at {self.state_path}: starting from the first row")
+            previous = self.load_state_quietly()
+            if previous is not None:
+                self.discard(previous)
+            self._created = run_time()
+            self._ids = self.id_generator.document(self._created)
+        else:
+            self._created = datetime.fromisoformat(state['created'])
+            self._ids = DocumentIds.from_dict(state['ids'])
+            logger.info(f"Resuming {self.input_file} after row {state['row_number']} "
+                        f"({state['payments']} payments so far)")
+
+        self.reader = reader = MmapPaymentReader(
+            self.input_file, cache=self.cache, max_error_rows=self.max_error_rows,
+            max_error_bytes=self.max_error_bytes, aliases=self.aliases)
+        reader.checkpoint_every = self.checkpoint_every
+        reader.on_checkpoint = self.save_state
+        writer = SepaXmlWriter(None, *self.company, created=self._created, ids=self._ids)
+
+        try:
+            if state is not None:
+                self._restore_blocks(state)
+                reader.resume_from(state['offset'], state['row_number'], state['valid_count'],
+                                   state['invalid_count'], state['error_report'])
+
+            blocks = self._blocks
+            for payment in reader:
+                self._count += 1
+                self._total += payment.amount_cents
+                block = blocks.get(payment.group)
+                if block is None:
+                    path = self._spool_path(len(blocks) + 1)
+                    block = blocks[payment.group] = [open(path, 'w', encoding='utf-8'), path, 0, 0]
+                block[0].write(writer.render_transaction(payment, self._count))
+                block[2] += 1
+                block[3] += payment.amount_cents
+            reader.finish()
+
+            self._write_output(writer)
+        finally:
+            for spool, _, _, _ in self._blocks.values():
+                spool.close()
+
+        self.discard()
+        logger.info(f"Generated XML with {self._count} payments in {len(self._blocks)} payment block(s), "
+                    f"total {format_cents(self._total)} ({self.checkpoints} checkpoint(s) saved)")
+        return self._count, self._total
+
+    def _write_output(self, writer):
+        """Write the header, copy the spools after it and move the XML into place."""
+        temp_file = self.output_file + '.part'
+        try:
+            with open_text_output(temp_file, compression_for_output(self.output_file),
+                                  self.compression_level) as stream:
+                stream.write(writer.render_group_header(self._count, self._total))
+                for (group, (spool, path, count, total)), payment_info_id in zip(
+                        self._blocks.items(), writer.payment_info_ids(len(self._blocks))):
+                    stream.write(writer.render_payment_info(count, total, group, payment_info_id))
+                    spool.flush()
+                    with open(path, 'r', encoding='utf-8') as source:
+                        shutil.copyfileobj(source, stream, SPOOL_COPY_CHUNK_SIZE)
+                    stream.write(writer.render_payment_info_end())
+                stream.write(writer.render_document_end())
+            os.replace(temp_file, self.output_file)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
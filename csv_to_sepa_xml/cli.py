@@ -5,15 +5,69 @@ Command-line argument parsing and CLI mode execution.
 import sys
 import os
 import argparse
+import contextlib
+import functools
+import json
 import logging
-from .csv_reader import read_csv_file
-from .xml_builder import build_sepa_xml
+from datetime import datetime
+from .csv_reader import PaymentReader
+from .parallel_reader import ParallelPaymentReader
+from .mmap_reader import MmapPaymentReader
+from .xml_builder import write_sepa_xml, stream_sepa_xml
+from .sharding import write_sharded_sepa_xml
+from .validation_cache import ValidationCache
+from .schema import parse_column_aliases
+from .checkpoint import CheckpointedConversion
+from .duplicates import DuplicateDetector, DUPLICATE_POLICIES
+from .ledger import PaymentLedger, LedgerCheck, LEDGER_POLICIES, prune_ledger
+from .clock import run_time
+from .ids import ClockIds, SequenceIds
+from .compression import detect_compression, compression_for_output, open_text_output
+from .profiling import Profiler
+from .payment import format_cents
+from .config import (DEFAULT_VALIDATION_CACHE_SIZE, DEFAULT_LOG_EXAMPLES, DEFAULT_SERVER_PORT,
+                     DEFAULT_MAX_CONCURRENT, DEFAULT_COMPRESSION_LEVEL, DEFAULT_CHECKPOINT_ROWS,
+                     DEFAULT_LEDGER_RETENTION_DAYS)
 
 logger = logging.getLogger(__name__)
 
+# Values of --reader
+READER_ENGINES = ('csv', 'mmap')
 
-def parse_arguments():
-    """Parse command-line arguments."""
+# Options only CLI mode applies (attribute names, see unsupported_options)
+LEDGER_OPTIONS = ('ledger', 'ledger_policy', 'ledger_retention')
+CHECKPOINT_OPTIONS = ('checkpoint', 'resume', 'checkpoint_every')
+SPLIT_OPTIONS = ('max_tx_per_file', 'max_bytes_per_file')
+
+
+def parse_arguments(argv=None):
+    """Parse command-line arguments (default: sys.argv)."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.duplicate_memory and args.duplicates != 'warn':
+        # A false positive would drop or fail a unique payment
+        parser.error("--duplicate-memory is only allowed with --duplicates warn")
+    return args
+
+
+def unsupported_options(args, names):
+    """
+    Return the flags of the named options that were given a non-default value.
+
+    Modes that do not apply an option refuse it with this instead of
+    silently ignoring it.
+
+    Arguments:
+        args: Namespace from parse_arguments()
+        names: Attribute names of the options (e.g. LEDGER_OPTIONS)
+    """
+    parser = build_parser()
+    return [f"--{name.replace('_', '-')}" for name in names
+            if getattr(args, name) != parser.get_default(name)]
+
+
+def build_parser():
+    """Return the command-line argument parser."""
     parser = argparse.ArgumentParser(
         description='CSV to SEPA XML Converter',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -22,6 +76,9 @@ Examples:
   %(prog)s                              # Start GUI
   %(prog)s --diagnostics                # Check system compatibility
   %(prog)s --cli input.csv output.xml   # Convert without GUI
+  %(prog)s --batch exports/ out/ --workers 4  # Convert every CSV in a directory
+  %(prog)s --watch inbox/ --outbox out/       # Convert new and changed CSVs until stopped
+  %(prog)s --serve 8765 --workers 2           # HTTP conversion service on 127.0.0.1
 
 For macOS troubleshooting, see MACOS_TKINTER_ANALYSIS.md
         """
@@ -34,6 +91,53 @@ For macOS troubleshooting, see MACOS_TKINTER_ANALYSIS.md
         help='Run in CLI mode: --cli input.csv output.xml'
     )
 
+    parser.add_argument(
+        '--batch',
+        nargs=2,
+        metavar=('SOURCE', 'OUTPUT_DIR'),
+        help='Convert many files: SOURCE is a directory, glob pattern or manifest file'
+    )
+
+    parser.add_argument(
+        '--watch',
+        metavar='DIR',
+        default=None,
+        help='Watch DIR and convert new or changed CSV files until interrupted'
+    )
+
+    parser.add_argument(
+        '--outbox',
+        metavar='DIR',
+        default=None,
+        help='Watch mode: directory for the XML files and error reports (default: DIR/outbox)'
+    )
+
+    parser.add_argument(
+        '--watch-interval',
+        type=float,
+        default=None,
+        metavar='SECONDS',
+        help='Watch mode: seconds between two scans of the directory (default: 2)'
+    )
+
+    parser.add_argument(
+        '--serve',
+        type=int,
+        nargs='?',
+        const=DEFAULT_SERVER_PORT,
+        default=None,
+        metavar='PORT',
+        help=f'Run the HTTP conversion service on 127.0.0.1:PORT (default port: {DEFAULT_SERVER_PORT})'
+    )
+
+    parser.add_argument(
+        '--max-concurrent',
+        type=int,
+        default=DEFAULT_MAX_CONCURRENT,
+        metavar='N',
+        help=f'Server mode: conversions running at the same time (default: {DEFAULT_MAX_CONCURRENT})'
+    )
+
     parser.add_argument(
         '--diagnostics',
         action='store_true',
@@ -70,13 +174,210 @@ For macOS troubleshooting, see MACOS_TKINTER_ANALYSIS.md
         help='Suppress non-error output'
     )
 
-    return parser.parse_args()
+    parser.add_argument(
+        '--log-summary',
+        action='store_true',
+        help='Log only a few examples of each per-row warning/error, then totals per category'
+    )
+
+    parser.add_argument(
+        '--log-examples',
+        type=int,
+        default=DEFAULT_LOG_EXAMPLES,
+        metavar='N',
+        help=f'Examples per category with --log-summary (default: {DEFAULT_LOG_EXAMPLES})'
+    )
+
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='CLI mode: convert in one constant-memory pass (for very large files)'
+    )
+
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        metavar='N',
+        help='CLI mode: validate rows in N worker processes; batch/watch/server mode: convert N files at a time (default: 1)'
+    )
+
+    parser.add_argument(
+        '--reader',
+        choices=READER_ENGINES,
+        default='csv',
+        help='CSV reader engine; mmap memory-maps the file and decodes only the SEPA columns, '
+             'which is faster on wide files (default: csv)'
+    )
+
+    parser.add_argument(
+        '--column-alias',
+        action='append',
+        default=None,
+        metavar='COLUMN=HEADER',
+        help='Also read COLUMN (name, iban, bic, amount, reference, ...) from a '
+             'header called HEADER; may be repeated'
+    )
+
+    parser.add_argument(
+        '--duplicates',
+        choices=DUPLICATE_POLICIES,
+        default=None,
+        metavar='POLICY',
+        help='Find payments with the same IBAN, amount and reference in each file; '
+             'warn, keep-first (drop repeats) or reject (fail the conversion)'
+    )
+
+    parser.add_argument(
+        '--duplicate-memory',
+        type=int,
+        default=None,
+        metavar='MB',
+        help='Find duplicates with a Bloom filter of MB megabytes instead of an exact index '
+             '(for huge files; may flag a unique payment as a probable duplicate, '
+             'so only with --duplicates warn)'
+    )
+
+    parser.add_argument(
+        '--ledger',
+        default=None,
+        metavar='FILE',
+        help='CLI mode: SQLite file of the payments converted by earlier runs; payments found '
+             'in it are not submitted again (created if missing)'
+    )
+
+    parser.add_argument(
+        '--ledger-policy',
+        choices=LEDGER_POLICIES,
+        default='reject',
+        help='CLI mode: what to do with payments already in the ledger: reject (fail the run, '
+             'default), skip (leave them out) or warn (keep them)'
+    )
+
+    parser.add_argument(
+        '--ledger-retention',
+        type=int,
+        default=DEFAULT_LEDGER_RETENTION_DAYS,
+        metavar='DAYS',
+        help=f'CLI mode: forget runs older than DAYS days; 0 keeps them all '
+             f'(default: {DEFAULT_LEDGER_RETENTION_DAYS})'
+    )
+
+    parser.add_argument(
+        '--id-sequence',
+        default=None,
+        metavar='FILE',
+        help='Number MsgId, PmtInfId and EndToEndId from a counter kept in FILE, so they never '
+             'repeat across runs (created if missing; default: made from the creation time)'
+    )
+
+    parser.add_argument(
+        '--compression-level',
+        type=int,
+        choices=range(1, 10),
+        default=DEFAULT_COMPRESSION_LEVEL,
+        metavar='1-9',
+        help='CLI and batch mode: level for .gz/.bz2/.xz output, 1 fastest to 9 smallest '
+             f'(default: {DEFAULT_COMPRESSION_LEVEL})'
+    )
+
+    parser.add_argument(
+        '--max-tx-per-file',
+        type=int,
+        default=None,
+        metavar='N',
+        help='CLI mode: split the output into files of at most N transactions'
+    )
+
+    parser.add_argument(
+        '--max-bytes-per-file',
+        type=int,
+        default=None,
+        metavar='BYTES',
+        help='CLI mode: split the output into files of at most BYTES bytes'
+    )
+
+    parser.add_argument(
+        '--max-error-rows',
+        type=int,
+        default=None,
+        metavar='N',
+        help='CLI mode: write at most N invalid rows to the error report'
+    )
+
+    parser.add_argument(
+        '--max-error-bytes',
+        type=int,
+        default=None,
+        metavar='BYTES',
+        help='CLI mode: stop adding rows to the error report at the first one that would '
+             'take it over BYTES bytes'
+    )
+
+    parser.add_argument(
+        '--checkpoint',
+        action='store_true',
+        help='CLI mode: save progress regularly to OUTPUT.checkpoint so an interrupted run can be resumed'
+    )
+
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='CLI mode: continue from the last checkpoint of the same output (implies --checkpoint)'
+    )
+
+    parser.add_argument(
+        '--checkpoint-every',
+        type=int,
+        default=DEFAULT_CHECKPOINT_ROWS,
+        metavar='N',
+        help=f'CLI mode: rows read between two checkpoints (default: {DEFAULT_CHECKPOINT_ROWS})'
+    )
+
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='CLI mode: print wall/CPU time, row counts and throughput per stage'
+    )
+
+    parser.add_argument(
+        '--metrics',
+        metavar='FILE',
+        default=None,
+        help='CLI mode: write the per-stage measurements as JSON to FILE; batch mode: the batch summary'
+    )
+
+    parser.add_argument(
+        '--validation-cache',
+        metavar='FILE',
+        default=None,
+        help='CLI mode: load/save IBAN/BIC validation results here so repeated runs start warm'
+    )
+
+    parser.add_argument(
+        '--cache-size',
+        type=int,
+        default=DEFAULT_VALIDATION_CACHE_SIZE,
+        help=f'Maximum number of cached IBAN/BIC validation results (default: {DEFAULT_VALIDATION_CACHE_SIZE})'
+    )
+
+    return parser
 
 
-def run_cli_mode(input_file, output_file, debtor_name=None, debtor_iban=None, debtor_bic=None, quiet=False):
+def run_cli_mode(input_file, output_file, debtor_name=None, debtor_iban=None, debtor_bic=None, quiet=False,
+                 streaming=False, cache_path=None, cache_size=DEFAULT_VALIDATION_CACHE_SIZE, workers=1,
+                 max_tx_per_file=None, max_bytes_per_file=None, profile=False, metrics_path=None,
+                 max_error_rows=None, max_error_bytes=None, reader_engine='csv',
+                 compression_level=DEFAULT_COMPRESSION_LEVEL, column_aliases=None, checkpoint=False,
+                 resume=False, checkpoint_every=DEFAULT_CHECKPOINT_ROWS, duplicate_policy=None,
+                 duplicate_memory_mb=None, ledger_path=None, ledger_policy='reject',
+                 ledger_retention_days=DEFAULT_LEDGER_RETENTION_DAYS, id_sequence=None):
     """
     Run the converter in headless CLI mode.
 
+    A gzip, bz2 or xz input is decompressed while it is read; an output
+    name ending in .gz, .bz2 or .xz is compressed while it is written.
+
     Arguments:
         input_file: Path to input CSV
         output_file: Path for output XML
@@ -84,6 +385,33 @@ def run_cli_mode(input_file, output_file, debtor_name=None, debtor_iban=None, de
         debtor_iban: Optional override for company IBAN
         debtor_bic: Optional override for company BIC
         quiet: If True, suppress console output
+        streaming: If True, never hold all payments in memory (see stream_sepa_xml)
+        cache_path: Optional validation cache snapshot to load before and save after the run
+        cache_size: Maximum number of cached IBAN/BIC validation results
+        workers: Number of processes used to validate rows (and to write split files)
+        max_tx_per_file: Split the output into files of at most this many transactions
+        max_bytes_per_file: Split the output into files of at most this many bytes
+        profile: If True, time every validator and print a per-stage summary table
+        metrics_path: Optional path for the per-stage measurements as JSON
+        max_error_rows: Optional cap on the rows written to the error report
+        max_error_bytes: Optional cap on the size of the error report in bytes
+        reader_engine: 'csv' (csv.reader, columns picked by a RowSchema) or
+                       'mmap' (see mmap_reader); ignored with workers > 1
+        compression_level: Level for compressed output, 1 (fastest) to 9 (smallest)
+        column_aliases: Extra "column=Header name" aliases (see schema.parse_column_aliases)
+        checkpoint: If True, save progress every checkpoint_every rows (see checkpoint)
+        resume: If True, continue from the last checkpoint (implies checkpoint)
+        checkpoint_every: Rows read between two checkpoints
+        duplicate_policy: 'warn', 'keep-first' or 'reject' to look for duplicate
+                          payments (see duplicates); None to skip the check
+        duplicate_memory_mb: Bloom filter size for the duplicate check, in MB
+                             (default: an exact index)
+        ledger_path: Optional SQLite ledger of earlier runs to check the
+                     payments against and record them in (see ledger)
+        ledger_policy: 'reject', 'skip' or 'warn' for payments found in the ledger
+        ledger_retention_days: Days runs stay in the ledger (0: forever)
+        id_sequence: Optional counter file to number the document ids from
+                     (see ids.SequenceIds); default: ids from the creation time
 
     Returns:
         Exit code (0 for success, 1 for error)
@@ -98,37 +426,131 @@ def run_cli_mode(input_file, output_file, debtor_name=None, debtor_iban=None, de
         logger.error(f"Input file not found: {input_file}")
         return 1
 
+    sharded = max_tx_per_file is not None or max_bytes_per_file is not None
+    if sharded and streaming:
+        print("ERROR: --stream cannot be combined with --max-tx-per-file/--max-bytes-per-file")
+        logger.error("Streaming mode does not support split output")
+        return 1
+
+    checkpointed = checkpoint or resume
+    if checkpointed and sharded:
+        print("ERROR: --checkpoint/--resume cannot be combined with --max-tx-per-file/--max-bytes-per-file")
+        logger.error("Checkpoint mode does not support split output")
+        return 1
+    if checkpointed and duplicate_policy:
+        print("ERROR: --duplicates cannot be combined with --checkpoint/--resume")
+        logger.error("Checkpoint mode does not save the duplicate index")
+        return 1
+    if checkpointed and ledger_path:
+        print("ERROR: --ledger cannot be combined with --checkpoint/--resume")
+        logger.error("Checkpoint mode does not support the payment ledger")
+        return 1
+
+    # Stage totals are always cheap to take; per-validator timing only when asked for
+    profiler = Profiler()
+    profiled = profile or metrics_path is not None
+    if profiled:
+        if checkpointed:
+            instrumentation = profiler.instrument('checkpointed_conversion')
+        else:
+            instrumentation = profiler.instrument('stream_sepa_xml' if streaming else 'read_csv_file')
+    else:
+        instrumentation = contextlib.nullcontext()
+
     try:
-        # Read and validate
-        payments = read_csv_file(input_file)
-
-        if not payments:
-            print("ERROR: CSV file is empty or has no valid data")
-            logger.error("Empty CSV file")
-            return 1
-
-        # Generate XML
-        xml_content = build_sepa_xml(
-            payments,
-            company_name=debtor_name,
-            company_iban=debtor_iban,
-            company_bic=debtor_bic
-        )
-
-        # Write output
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(xml_content)
+        cache = ValidationCache(cache_size)
+        if cache_path:
+            cache.load(cache_path)
+
+        aliases = parse_column_aliases(column_aliases) if column_aliases else None
+        duplicates = None
+        if duplicate_policy:
+            memory_bytes = duplicate_memory_mb * 1024 * 1024 if duplicate_memory_mb else None
+            duplicates = DuplicateDetector(duplicate_policy, memory_bytes)
+        company = (debtor_name, debtor_iban, debtor_bic)
+        open_reader = functools.partial(open_payment_reader, input_file, cache, workers,
+                                        max_error_rows, max_error_bytes, reader_engine=reader_engine,
+                                        aliases=aliases, duplicates=duplicates)
+        manifest_path = None
+        ledger = ledger_check = None
+        try:
+            created = run_time()
+            # One document per run: reserve a single number, not a block
+            id_generator = SequenceIds(id_sequence, block_size=1) if id_sequence else ClockIds()
+            # A resumed conversion keeps the ids saved in its checkpoint
+            ids = None if checkpointed else id_generator.document(created)
+            if ledger_path:
+                ledger = PaymentLedger(ledger_path)
+                # Recorded and pruned by the wall clock: created may be fixed by SOURCE_DATE_EPOCH
+                recorded = datetime.now()
+                ledger_check = LedgerCheck(ledger, ledger_policy, created, input_file, output_file,
+                                           ids=ids, recorded=recorded)
+            with instrumentation:
+                if checkpointed:
+                    # Streams like --stream, saving its position as it goes
+                    conversion = CheckpointedConversion(input_file, output_file, company, checkpoint_every,
+                                                        cache, max_error_rows, max_error_bytes, aliases,
+                                                        compression_level, id_generator=id_generator)
+                    with profiler.stage('checkpointed_conversion') as stats:
+                        try:
+                            payment_count, total = conversion.run(resume)
+                        finally:
+                            if conversion.reader is not None:
+                                stats.rows = _count_rows(profiler, conversion.reader)
+                elif sharded:
+                    # Read and validate, then write the split files in parallel
+                    payments = _read_payments(open_reader, profiler)
+                    if ledger_check is not None:
+                        payments = _check_ledger(ledger_check, payments, profiler)
+                    if not payments:
+                        raise ValueError("CSV file is empty or has no valid data")
+                    with profiler.stage('write_sharded_sepa_xml') as stats:
+                        manifest_path, manifest = write_sharded_sepa_xml(
+                            payments,
+                            output_file,
+                            *company,
+                            max_tx_per_file=max_tx_per_file,
+                            max_bytes_per_file=max_bytes_per_file,
+                            workers=workers,
+                            compression_level=compression_level,
+                            created=created,
+                            ids=ids
+                        )
+                        stats.rows = len(payments)
+                    payment_count = len(payments)
+                    total = sum(payment.amount_cents for payment in payments)
+                else:
+                    payment_count, total = convert_to_file(open_reader, output_file, company,
+                                                           streaming, profiler, compression_level,
+                                                           created, ledger_check, ids)
+                if ledger_check is not None:
+                    # Only once the XML is in place
+                    with profiler.stage('record_ledger'):
+                        ledger_check.commit()
+                    prune_ledger(ledger, ledger_retention_days, recorded)
+        finally:
+            if ledger is not None:
+                ledger.close()
+            if cache_path:
+                try:
+                    cache.save(cache_path)
+                except OSError as e:
+                    logger.warning(f"Could not save validation cache: {e}")
+            if profiled:
+                _report_profile(profiler, profile, metrics_path)
 
         # Report success
-        total = sum(float(p.get('amount', 0)) for p in payments)
         company_name = debtor_name or DEFAULT_COMPANY_NAME
 
         if not quiet:
             print(f"\nSUCCESS: SEPA XML created")
             print(f"  Input:    {input_file}")
-            print(f"  Output:   {output_file}")
-            print(f"  Payments: {len(payments)}")
-            print(f"  Total:    EUR {total:,.2f}")
+            if manifest_path:
+                print(f"  Output:   {manifest['files']} file(s), manifest {manifest_path}")
+            else:
+                print(f"  Output:   {output_file}")
+            print(f"  Payments: {payment_count}")
+            print(f"  Total:    EUR {format_cents(total, grouping=True)}")
             print(f"  Debtor:   {company_name}")
 
         logger.info(f"Successfully created {output_file}")
@@ -146,3 +568,127 @@ def run_cli_mode(input_file, output_file, debtor_name=None, debtor_iban=None, de
         print(f"ERROR: {e}")
         logger.exception("Unexpected error in CLI mode")
         return 1
+
+
+def open_payment_reader(input_file, cache, workers, max_error_rows=None, max_error_bytes=None,
+                        error_report_path=None, reader_engine='csv', aliases=None, duplicates=None):
+    """Return the serial, memory-mapped or parallel PaymentReader for the input."""
+    if (workers > 1 or reader_engine == 'mmap') and detect_compression(input_file):
+        logger.info(f"{input_file} is compressed: reading it with a single csv reader")
+        workers, reader_engine = 1, 'csv'
+    if workers > 1 and duplicates is not None:
+        logger.info("Duplicate detection reads the file in a single process")
+        workers = 1
+    if workers > 1:
+        return ParallelPaymentReader(input_file, error_report_path, cache=cache, max_error_rows=max_error_rows,
+                                     max_error_bytes=max_error_bytes, workers=workers, aliases=aliases)
+    if reader_engine == 'mmap':
+        return MmapPaymentReader(input_file, error_report_path, cache=cache, max_error_rows=max_error_rows,
+                                 max_error_bytes=max_error_bytes, aliases=aliases, duplicates=duplicates)
+    return PaymentReader(input_file, error_report_path, cache=cache, max_error_rows=max_error_rows,
+                         max_error_bytes=max_error_bytes, aliases=aliases, duplicates=duplicates)
+
+
+def _count_rows(profiler, reader):
+    """Record the reader's row counts on the profiler."""
+    profiler.count('rows_read', reader.valid_count + reader.invalid_count)
+    profiler.count('rows_valid', reader.valid_count)
+    profiler.count('rows_invalid', reader.invalid_count)
+    return reader.valid_count + reader.invalid_count
+
+
+def _read_payments(open_reader, profiler):
+    """Read and validate the whole CSV (what read_csv_file does), as a profiled stage."""
+    with profiler.stage('read_csv_file') as stats:
+        reader = open_reader()
+        try:
+            payments = list(reader)
+            reader.finish()
+        except Exception as e:
+            logger.error(f"Failed to read CSV: {e}")
+            raise
+        finally:
+            stats.rows = _count_rows(profiler, reader)
+    return payments
+
+
+def _check_ledger(ledger_check, payments, profiler):
+    """Check a list of payments against the ledger, as a profiled stage; return those to write."""
+    with profiler.stage('check_ledger') as stats:
+        stats.rows = len(payments)
+        payments = list(ledger_check.filter(payments))
+        ledger_check.finish()
+    return payments
+
+
+def convert_to_file(open_reader, output_file, company, streaming, profiler,
+                    compression_level=DEFAULT_COMPRESSION_LEVEL, created=None, ledger_check=None, ids=None):
+    """
+    Convert one CSV into one XML file.
+
+    The XML is generated straight into a temporary file next to the output
+    and renamed at the end, so a failure half-way never leaves a truncated
+    XML behind. An output name ending in .gz, .bz2 or .xz is compressed
+    on the way into the temporary file.
+
+    With a LedgerCheck the payments are checked against the ledger on
+    their way to the writer; the caller commits it once the file is in place.
+    ids are the DocumentIds to write (default: made from the creation time).
+
+    Returns:
+        tuple: (number of payments, total in cents)
+    """
+    temp_file = output_file + '.part'
+    try:
+        with open_text_output(temp_file, compression_for_output(output_file), compression_level) as f:
+            if streaming:
+                # Read, validate and write in a single pass
+                reader = open_reader()
+                with profiler.stage('stream_sepa_xml') as stats:
+                    try:
+                        payment_count, total = stream_sepa_xml(
+                            reader if ledger_check is None else ledger_check.filter(reader),
+                            profiler.timed_stream(f),
+                            *company,
+                            spool_dir=os.path.dirname(os.path.abspath(output_file)),
+                            created=created,
+                            ids=ids
+                        )
+                    finally:
+                        stats.rows = _count_rows(profiler, reader)
+                reader.finish()
+                if ledger_check is not None:
+                    ledger_check.finish()
+            else:
+                # Read and validate
+                payments = _read_payments(open_reader, profiler)
+                if ledger_check is not None:
+                    payments = _check_ledger(ledger_check, payments, profiler)
+                if not payments:
+                    raise ValueError("CSV file is empty or has no valid data")
+
+                payment_count = len(payments)
+                with profiler.stage('write_sepa_xml') as stats:
+                    total = write_sepa_xml(payments, profiler.timed_stream(f), *company, created=created,
+                                           ids=ids)
+                    stats.rows = payment_count
+        with profiler.stage('rename_output'):
+            os.replace(temp_file, output_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+    return payment_count, total
+
+
+def _report_profile(profiler, print_table, metrics_path):
+    """Print the per-stage table and/or write the JSON metrics file."""
+    if print_table:
+        print("\nPROFILE")
+        print(profiler.format_table())
+    logger.info(f"Profile: {json.dumps(profiler.to_dict()['stages'])}")
+    if metrics_path:
+        try:
+            profiler.save(metrics_path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics file: {e}")
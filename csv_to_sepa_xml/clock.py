@@ -0,0 +1,51 @@
+"""
+The run clock: one creation time per run, optionally reproducible.
+
+Everything in a document that depends on the time (CreDtTm, the default
+execution date and the ClockIds ids) comes from a single creation time,
+taken once when the run starts and passed down as `created`. A document
+therefore never mixes two times, even when it is written across midnight.
+
+When the SOURCE_DATE_EPOCH environment variable is set (the reproducible
+builds convention: whole seconds since 1970-01-01 UTC), that time is used
+instead of the current one, so the same input and options give
+byte-for-byte the same XML, which makes outputs cheap to cache and diff.
+
+Usage:
+    created = run_time()
+    write_sepa_xml(payments, stream, created=created)
+"""
+
+import os
+from datetime import datetime, timezone
+
+# Environment variable fixing the creation time (https://reproducible-builds.org/specs/source-date-epoch/)
+SOURCE_DATE_EPOCH = 'SOURCE_DATE_EPOCH'
+
+
+def source_date_epoch(environ=None):
+    """
+    Return the time SOURCE_DATE_EPOCH fixes, or None if it is not set.
+
+    The time is in UTC (without tzinfo, like the rest of the converter's
+    times), so it gives the same document on every machine.
+
+    Raises:
+        ValueError: If the variable is not a whole number of seconds
+    """
+    value = (os.environ if environ is None else environ).get(SOURCE_DATE_EPOCH, '').strip()
+    if not value:
+        return None
+    try:
+        seconds = int(value)
+        return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+    except (ValueError, OverflowError, OSError):
+        raise ValueError(f"{SOURCE_DATE_EPOCH} must be a number of seconds since 1970, got '{value}'") from None
+
+
+def run_time(environ=None):
+    """Return the creation time of a run: SOURCE_DATE_EPOCH if set, else now (whole seconds)."""
+    fixed = source_date_epoch(environ)
+    if fixed is not None:
+        return fixed
+    return datetime.now().replace(microsecond=0)
@@ -0,0 +1,131 @@
+"""
+Transparent gzip, bz2 and xz compression of input and output files.
+
+Compressed CSV input is recognised by its first bytes (whatever the file
+is called) and decompressed while it is read. XML output is compressed
+while it is written when the output name ends in .gz, .bz2 or .xz. In
+both directions the data goes through the compressor in small blocks,
+so an uncompressed copy of the file never exists on disk or in memory.
+
+Usage:
+    with open_text_input("payments.csv.gz") as file:
+        ...
+    with open_text_output("payments.xml.xz", level=6) as file:
+        file.write(...)
+"""
+
+import bz2
+import contextlib
+import gzip
+import io
+import lzma
+import os
+
+from .config import DEFAULT_COMPRESSION_LEVEL
+
+# Leading bytes of each format
+MAGIC_NUMBERS = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+)
+
+# Output file suffix -> format
+SUFFIXES = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz',
+}
+
+
+def detect_compression(path):
+    """
+    Return the compression of a file from its first bytes.
+
+    Returns:
+        'gzip', 'bz2', 'xz', or None for an uncompressed (or empty) file
+    """
+    with open(path, 'rb') as file:
+        head = file.read(6)
+    for magic, compression in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def compression_for_output(path):
+    """Return the compression an output name asks for ('gzip', 'bz2', 'xz' or None)."""
+    return SUFFIXES.get(os.path.splitext(path)[1].lower())
+
+
+def split_compression_suffix(path):
+    """
+    Split a compression suffix off a file name.
+
+    "payments.xml.gz" gives ("payments.xml", ".gz"); "payments.xml"
+    gives ("payments.xml", "").
+    """
+    base, extension = os.path.splitext(path)
+    if extension.lower() in SUFFIXES:
+        return base, extension
+    return path, ''
+
+
+def _open_binary(file, compression, mode, level=DEFAULT_COMPRESSION_LEVEL):
+    """Wrap an open binary file in the (de)compressor for the format."""
+    if compression == 'gzip':
+        # No file name or time stamp in the header: the output only depends on its content
+        return gzip.GzipFile(filename='', mode=mode, fileobj=file, compresslevel=level, mtime=0)
+    if compression == 'bz2':
+        return bz2.BZ2File(file, mode, compresslevel=max(1, level))
+    if compression == 'xz':
+        if mode == 'rb':
+            return lzma.LZMAFile(file, mode)
+        return lzma.LZMAFile(file, mode, preset=level)
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+@contextlib.contextmanager
+def open_text_input(path, encoding='utf-8'):
+    """
+    Open a CSV file for reading as text, decompressing it if needed.
+
+    Args:
+        path: Path to a plain, gzip, bz2 or xz file
+        encoding: Encoding of the (decompressed) text
+
+    Yields:
+        A text stream
+    """
+    compression = detect_compression(path)
+    if compression is None:
+        with open(path, 'r', encoding=encoding) as file:
+            yield file
+        return
+    with open(path, 'rb') as raw, _open_binary(raw, compression, 'rb') as binary:
+        with io.TextIOWrapper(binary, encoding=encoding) as file:
+            yield file
+
+
+@contextlib.contextmanager
+def open_text_output(path, compression=None, level=DEFAULT_COMPRESSION_LEVEL, encoding='utf-8'):
+    """
+    Open a file for writing text, compressing it on the way if asked to.
+
+    Args:
+        path: Path of the file to write
+        compression: 'gzip', 'bz2', 'xz' or None (see compression_for_output)
+        level: Compression level, 1 (fastest) to 9 (smallest); 0 is also
+               accepted for gzip and xz
+        encoding: Encoding of the text
+
+    Yields:
+        A text stream
+    """
+    if compression is None:
+        with open(path, 'w', encoding=encoding) as file:
+            yield file
+        return
+    with open(path, 'wb') as raw, _open_binary(raw, compression, 'wb', level) as binary:
+        with io.TextIOWrapper(binary, encoding=encoding) as file:
+            yield file
@@ -2,8 +2,11 @@
 Configuration constants and settings for the SEPA converter.
 """
 
+import atexit
 import os
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 
 # ============================================================================
 # COMPANY CONFIGURATION - Default values (can be overridden via CLI or GUI)
@@ -63,39 +66,154 @@ SEPA_COUNTRY_IBAN_LENGTHS = {
     'VA': 22,  # Vatican City State
 }
 
+# ============================================================================
+# CSV COLUMNS
+# ============================================================================
+
+# Other header names accepted for each column (case and spaces/hyphens vs
+# underscores do not matter); more can be added with --column-alias
+COLUMN_ALIASES = {
+    'name': ('beneficiary', 'beneficiary_name', 'creditor', 'creditor_name', 'payee', 'recipient'),
+    'iban': ('beneficiary_iban', 'creditor_iban', 'payee_iban', 'account_iban'),
+    'bic': ('swift', 'swift_bic', 'bic_swift', 'beneficiary_bic', 'creditor_bic'),
+    'amount': ('payment_amount', 'transfer_amount', 'betrag'),
+    'reference': ('remittance_information', 'remittance_info', 'purpose', 'verwendungszweck'),
+    'execution_date': ('requested_execution_date', 'value_date'),
+    'currency': ('ccy', 'currency_code'),
+}
+
+# ============================================================================
+# PERFORMANCE SETTINGS
+# ============================================================================
+
+# Maximum number of IBAN/BIC verdicts kept by the validation cache
+DEFAULT_VALIDATION_CACHE_SIZE = 100_000
+
+# Rows read between two checkpoints with --checkpoint
+DEFAULT_CHECKPOINT_ROWS = 100_000
+
+# gzip/bz2/xz level for compressed output (1 fastest ... 9 smallest)
+DEFAULT_COMPRESSION_LEVEL = 6
+
+# Document numbers a process takes from the --id-sequence file at a time
+DEFAULT_ID_BLOCK_SIZE = 16
+
+# Payments looked up in and added to the --ledger database at a time
+DEFAULT_LEDGER_BATCH_SIZE = 10_000
+
+# Days runs are kept in the --ledger database before they are pruned
+DEFAULT_LEDGER_RETENTION_DAYS = 400
+
+# ============================================================================
+# HTTP SERVICE (--serve)
+# ============================================================================
+
+# Port on 127.0.0.1 the conversion service listens on
+DEFAULT_SERVER_PORT = 8765
+
+# Conversions the service runs at the same time (further requests wait)
+DEFAULT_MAX_CONCURRENT = 2
+
 # ============================================================================
 # LOGGING CONFIGURATION
 # ============================================================================
 
-def setup_logging(quiet=False):
+# Example messages kept per category with --log-summary
+DEFAULT_LOG_EXAMPLES = 5
+
+# Background thread writing log records (see setup_logging)
+_log_listener = None
+
+
+class _ProcessLocalQueueHandler(QueueHandler):
+    """
+    QueueHandler that only queues records in the process that set it up.
+
+    Worker processes forked from the converter inherit this handler but
+    not the listener thread draining the queue; there the records are
+    handed straight to the (inherited) file and console handlers instead,
+    as before logging went through a queue.
+    """
+
+    def __init__(self, log_queue, handlers):
+        super().__init__(log_queue)
+        self._pid = os.getpid()
+        self._direct_handlers = handlers
+
+    def emit(self, record):
+        if os.getpid() == self._pid:
+            super().emit(record)
+            return
+        for handler in self._direct_handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+def stop_logging():
+    """Write out all queued log records and stop the listener thread."""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+
+atexit.register(stop_logging)
+
+
+def setup_logging(quiet=False, log_summary=False, log_examples=DEFAULT_LOG_EXAMPLES):
     """
     Configure logging for the application.
-    
+
+    Records are put on a queue and written to the log file (and console)
+    by a background QueueListener thread, so file I/O stays off the
+    validation loop. The listener is stopped, and the queue flushed, at
+    interpreter exit.
+
     Args:
         quiet: If True, only log to file (no console output)
-    
+        log_summary: If True, log only the first log_examples per-row
+                     warnings/errors of each category, then their totals
+        log_examples: Example messages kept per category with log_summary
+
     Returns:
         The configured logger instance
     """
+    global _log_listener
+
     # Determine log file location (same directory as script)
     from . import __file__ as pkg_file
+    from . import row_log
     pkg_dir = os.path.dirname(os.path.abspath(pkg_file))
     parent_dir = os.path.dirname(pkg_dir)
     log_file = os.path.join(parent_dir, 'sepa_converter.log')
-    
+
     # Configure logging handlers
     handlers = [logging.FileHandler(log_file)]
     if not quiet:
         handlers.append(logging.StreamHandler())
-    
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # Replace the listener of an earlier call
+    stop_logging()
+    log_queue = queue.SimpleQueue()
+    _log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+
+    # The queued record only carries the message; the listener's handlers add the rest
+    queue_handler = _ProcessLocalQueueHandler(log_queue, handlers)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+
     logging.basicConfig(
         level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=handlers,
+        handlers=[queue_handler],
         force=True  # Force reconfiguration
     )
-    
+
+    row_log.configure(log_examples if log_summary else None)
+
     logger = logging.getLogger(__name__)
     logger.info(f"Logging initialized. Log file: {log_file}")
-    
+
     return logger
@@ -2,88 +2,498 @@
 CSV file reading with validation.
 """
 
+import codecs
+import contextlib
 import csv
+import io
 import logging
 import os
 from datetime import datetime
-from .validation import validate_payment_row
+from . import row_log
+from .compression import detect_compression, open_text_input, split_compression_suffix
+from .payment import Payment
+from .schema import RowSchema
+from .validation import check_payment_row
+from .validation_cache import ValidationCache
 
 logger = logging.getLogger(__name__)
 
+REQUIRED_COLUMNS = {'name', 'iban', 'bic', 'amount', 'reference'}
 
-def read_csv_file(filepath, error_report_path=None):
+
+def check_columns(fieldnames):
+    """
+    Check that a CSV header (or the columns a RowSchema found in it)
+    contains all required columns.
+
+    Raises:
+        ValueError: If the header is missing or incomplete
+    """
+    if not fieldnames:
+        raise ValueError("CSV file is empty or has no header")
+
+    missing_columns = REQUIRED_COLUMNS - set(fieldnames)
+    if missing_columns:
+        raise ValueError(f"CSV is missing required columns: {', '.join(missing_columns)}")
+
+
+def is_path(source):
+    """Return True if source is a file path rather than an open stream."""
+    return isinstance(source, (str, bytes, os.PathLike))
+
+
+@contextlib.contextmanager
+def open_text_stream(source, encoding='utf-8'):
+    """
+    Open a CSV source for reading as text.
+
+    Args:
+        source: File path (plain, gzip, bz2 or xz), or a readable text or
+                binary stream; binary streams are decoded with the given encoding
+        encoding: Encoding of paths and binary streams
+
+    Yields:
+        A text stream; a stream passed in is left open
+    """
+    if is_path(source):
+        with open_text_input(source, encoding) as file:
+            yield file
+    elif isinstance(source.read(0), str):
+        yield source
+    elif isinstance(source, io.IOBase):
+        wrapper = io.TextIOWrapper(source, encoding=encoding)
+        try:
+            yield wrapper
+        finally:
+            wrapper.detach()  # Leave the caller's stream open
+    else:
+        # Any other object with a read() returning bytes
+        yield codecs.getreader(encoding)(source)
+
+
+class PaymentReader:
+    """
+    Iterate over the valid payments of a CSV file (or stream) one row at
+    a time, as Payment records.
+
+    The header is compiled into a RowSchema (columns found by name or
+    alias), and rows are read with csv.reader and picked by position.
+    Invalid rows are logged, written to the error report and skipped while
+    iterating; nothing is kept for them but a count. Call finish() once the
+    iteration is done to log the summary. read_csv_file() uses this to
+    build a list; the streaming conversion in the CLI consumes it directly
+    so the file is never held in memory.
+
+    Usage:
+        reader = PaymentReader("payments.csv")
+        for payment in reader:
+            ...
+        reader.finish()
     """
-    Read a CSV file and return a list of valid payment dictionaries.
+
+    def __init__(self, filepath, error_report_path=None, cache=None, keep_extra=False,
+                 max_error_rows=None, max_error_bytes=None, on_error=None, encoding='utf-8',
+                 aliases=None, duplicates=None):
+        """
+        Args:
+            filepath: The path to the CSV file, or a readable text or binary stream
+            error_report_path: Optional path or writable text stream for the CSV
+                               error report (see read_csv_file). For a stream
+                               input no report is written unless one is given.
+            cache: Optional ValidationCache; a fresh one is used if omitted
+            keep_extra: If True, pass non-SEPA columns through in Payment.extra
+            max_error_rows: Optional cap on the rows written to the error report
+            max_error_bytes: Optional cap on the size of the error report
+            on_error: Optional function called as on_error(row, row_number, errors)
+                      for every invalid row
+            encoding: Encoding of the file (or binary stream)
+            aliases: Header names accepted for each column (see schema);
+                     defaults to config.COLUMN_ALIASES
+            duplicates: Optional DuplicateDetector applied to the valid payments
+        """
+        self.filepath = filepath
+        self.error_report_path = error_report_path
+        self.cache = cache if cache is not None else ValidationCache()
+        self.keep_extra = keep_extra
+        self.max_error_rows = max_error_rows
+        self.max_error_bytes = max_error_bytes
+        self.on_error = on_error
+        self.encoding = encoding
+        self.aliases = aliases
+        self.duplicates = duplicates
+        self.fieldnames = None
+        self.schema = None
+        self.valid_count = 0
+        self.invalid_count = 0
+        self.error_report = None  # ErrorReportWriter, set up once the header is known
+
+    def __iter__(self):
+        row_log.reset()
+        with open_text_stream(self.filepath, self.encoding) as file:
+            reader = csv.reader(file)
+            schema = self._compile_schema(next(reader, None))
+            # Shares one PaymentGroup per execution date/currency/debtor
+            groups = {} if schema.has_groups else None
+            row_of = schema.row
+            cache = self.cache
+            keep_extra = self.keep_extra
+            duplicates = self.duplicates
+
+            with self._open_error_report():
+                # Process each row with validation
+                row_number = 1  # Row 1 is the header
+                for values in reader:
+                    if not values:
+                        continue  # Blank line
+                    row_number += 1
+                    row = row_of(values)
+                    validation_errors, amount_cents = check_payment_row(row, row_number, cache)
+
+                    if not validation_errors:
+                        payment = Payment.from_row(row, keep_extra, amount_cents, groups)
+                        if duplicates is not None:
+                            first_row = duplicates.check(payment, row_number)
+                            if first_row is not None and self._duplicate(payment, schema.full_row(values),
+                                                                         row_number, first_row):
+                                continue
+                        self.valid_count += 1
+                        yield payment
+                    else:
+                        self._reject(schema.full_row(values), row_number, validation_errors)
+
+    def _compile_schema(self, fieldnames):
+        """
+        Resolve the columns of a header and check the required ones are there.
+
+        Raises:
+            ValueError: If the header is missing or incomplete
+        """
+        schema = RowSchema(fieldnames, self.aliases, self.keep_extra)
+        check_columns(schema.columns)
+        renamed = schema.renamed()
+        if renamed:
+            logger.info("Columns read under another name: " +
+                        ", ".join(f"'{header}' as {column}" for header, column in renamed.items()))
+        self.fieldnames = schema.fieldnames
+        self.schema = schema
+        return schema
+
+    def _open_error_report(self):
+        """Set up the error report writer for the current header (the file comes later)."""
+        if self.error_report_path is None and not is_path(self.filepath):
+            self.error_report = None  # Nowhere to put an automatic report
+            return contextlib.nullcontext()
+        path = self.error_report_path if hasattr(self.error_report_path, 'write') else self._error_report_path
+        self.error_report = ErrorReportWriter(path, self.fieldnames, self.max_error_rows, self.max_error_bytes)
+        return self.error_report
+
+    def _error_report_path(self):
+        """Return the error report path, generating one from the input name if none was given."""
+        if self.error_report_path is not None:
+            return self.error_report_path
+        # Auto-generate error report path from input filename with timestamp
+        base_name = os.path.splitext(os.path.basename(split_compression_suffix(self.filepath)[0]))[0]
+        directory = os.path.dirname(self.filepath) or '.'
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        return os.path.join(directory, f"{base_name}_errors_{timestamp}.csv")
+
+    def _duplicate(self, payment, row, row_number, first_row):
+        """
+        Apply the duplicate policy to a repeated payment.
+
+        Returns:
+            True if the payment must be dropped
+        """
+        message = self.duplicates.describe(payment, first_row)
+        if self.duplicates.policy == 'warn':
+            row_log.warning(logger, 'duplicate', "Row %s: %s", row_number, message)
+            if self.error_report is not None:
+                self.error_report.write(row, row_number, [message])
+            return False
+        self._reject(row, row_number, [message])
+        return True
+
+    def _reject(self, row, row_number, validation_errors):
+        """Count an invalid row, log its errors and add it to the error report."""
+        self.invalid_count += 1
+        # Log all errors for this row
+        for error in validation_errors:
+            row_log.error(logger, 'invalid_row', error)
+        if self.error_report is not None:
+            self.error_report.write(row, row_number, validation_errors)
+        if self.on_error is not None:
+            self.on_error(row, row_number, validation_errors)
+
+    def finish(self):
+        """
+        Log the summary, including where the error report went.
+
+        Raises:
+            ValueError: If no valid rows were found, or duplicates were found
+                        under the 'reject' policy
+        """
+        invalid_count = self.invalid_count
+        total_rows = self.valid_count + invalid_count
+        logger.info(f"Processed {total_rows} rows: {self.valid_count} valid, {invalid_count} invalid")
+
+        stats = self.cache.stats()
+        logger.info(f"Validation cache: {stats['hits']} hits, {stats['misses']} misses, "
+                    f"{stats['evictions']} evictions ({stats['hit_rate']:.1%} hit rate)")
+
+        # Totals of the per-row warnings and errors, by category
+        row_log.log_summary(logger)
+
+        if self.valid_count == 0:
+            raise ValueError("No valid payments found in CSV file")
+
+        duplicates = self.duplicates.duplicates if self.duplicates is not None else 0
+        if invalid_count > 0 or duplicates:
+            if invalid_count > 0:
+                logger.warning(f"Skipped {invalid_count} invalid payment(s)")
+            report = self.error_report
+            if report is not None and not report.failed:
+                if report.rows_dropped:
+                    logger.warning(f"Error report truncated: {report.rows_dropped} invalid row(s) "
+                                   f"not written (report limit reached)")
+                logger.info(f"Error report written to: {report.path}")
+
+        if duplicates:
+            logger.warning(f"Found {duplicates} duplicate payment(s) (policy: {self.duplicates.policy})")
+            if self.duplicates.policy == 'reject':
+                raise ValueError(f"{duplicates} duplicate payment(s) found; see the error report "
+                                 f"(--duplicates reject)")
+
+
+def read_csv_file(filepath, error_report_path=None, cache=None, workers=1, keep_extra=False,
+                  max_error_rows=None, max_error_bytes=None, engine='csv', aliases=None, duplicates=None):
+    """
+    Read a CSV file and return a list of valid payments.
     Invalid rows are logged and skipped. Optionally writes an error report.
 
     Arguments:
-        filepath: The path to the CSV file (like "/Users/me/payments.csv")
+        filepath: The path to the CSV file (like "/Users/me/payments.csv"); gzip,
+                  bz2 and xz files are decompressed while reading
         error_report_path: Optional path for CSV error report. If None, generates
                           filename based on input CSV (e.g., "payments_errors.csv")
+        cache: Optional ValidationCache shared across calls (e.g. a warm one
+               loaded from disk); a fresh one is used if omitted
+        workers: Number of processes used to validate rows (see parallel_reader)
+        keep_extra: If True, pass non-SEPA columns through in Payment.extra
+        max_error_rows: Optional cap on the rows written to the error report
+        max_error_bytes: Optional cap on the size of the error report in bytes
+        engine: 'csv' (csv.reader, columns picked by a RowSchema) or 'mmap'
+                (see mmap_reader); ignored with workers > 1 and for
+                compressed files
+        aliases: Header names accepted for each column (see schema);
+                 defaults to config.COLUMN_ALIASES
+        duplicates: Optional DuplicateDetector (see duplicates); forces a
+                    single reading process
 
     Returns:
-        A list of dictionaries, one for each valid payment
+        A list of Payment records, one for each valid payment
 
     Raises:
         FileNotFoundError: If the file doesn't exist
         ValueError: If the CSV is malformed or has no valid rows
     """
-    payments = []
-    invalid_payments_data = []  # Will store (row, row_number, errors)
-    
     try:
-        with open(filepath, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            
-            # Check if required columns exist
-            required_columns = {'name', 'iban', 'bic', 'amount', 'reference'}
-            if not reader.fieldnames:
-                raise ValueError("CSV file is empty or has no header")
-            
-            missing_columns = required_columns - set(reader.fieldnames)
-            if missing_columns:
-                raise ValueError(f"CSV is missing required columns: {', '.join(missing_columns)}")
-            
-            # Process each row with validation
-            for row_number, row in enumerate(reader, start=2):  # Start at 2 (row 1 is header)
-                is_valid, validation_errors = validate_payment_row(row, row_number)
-                
-                if is_valid:
-                    payments.append(row)
-                else:
-                    invalid_payments_data.append((row, row_number, validation_errors))
-                    # Log all errors for this row
-                    for error in validation_errors:
-                        logger.error(error)
-        
-        # Summary logging
-        total_rows = len(payments) + len(invalid_payments_data)
-        logger.info(f"Processed {total_rows} rows: {len(payments)} valid, {len(invalid_payments_data)} invalid")
-        
-        if len(payments) == 0:
-            raise ValueError("No valid payments found in CSV file")
-        
-        if len(invalid_payments_data) > 0:
-            logger.warning(f"Skipped {len(invalid_payments_data)} invalid payment(s)")
-            
-            # Generate error report
-            if error_report_path is None:
-                # Auto-generate error report path from input filename with timestamp
-                base_name = os.path.splitext(os.path.basename(filepath))[0]
-                directory = os.path.dirname(filepath) or '.'
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                error_report_path = os.path.join(directory, f"{base_name}_errors_{timestamp}.csv")
-            
-            write_error_report(invalid_payments_data, error_report_path, reader.fieldnames)
-            logger.info(f"Error report written to: {error_report_path}")
-        
+        if is_path(filepath) and detect_compression(filepath):
+            workers, engine = 1, 'csv'  # Only readable front to back
+        if duplicates is not None:
+            workers = 1  # Duplicates are found in file order, in one index
+        if workers > 1:
+            from .parallel_reader import ParallelPaymentReader
+            reader = ParallelPaymentReader(filepath, error_report_path, cache, keep_extra,
+                                           max_error_rows, max_error_bytes, workers=workers, aliases=aliases)
+        elif engine == 'mmap':
+            from .mmap_reader import MmapPaymentReader
+            reader = MmapPaymentReader(filepath, error_report_path, cache, keep_extra,
+                                       max_error_rows, max_error_bytes, aliases=aliases, duplicates=duplicates)
+        else:
+            reader = PaymentReader(filepath, error_report_path, cache, keep_extra,
+                                   max_error_rows, max_error_bytes, aliases=aliases, duplicates=duplicates)
+        payments = list(reader)
+        reader.finish()
     except Exception as e:
         logger.error(f"Failed to read CSV: {e}")
         raise
-    
+
     return payments
 
 
+class ErrorReportWriter:
+    """
+    Write the CSV error report one invalid row at a time.
+
+    The report has the original columns between a leading row_number and
+    a trailing error_details column (all errors of the row joined by
+    " | "). The file is only created when the first invalid row arrives,
+    so clean inputs leave nothing behind. Values beyond the header (kept
+    under the None key) are left out. Optional caps stop the report from
+    growing past a number of rows or bytes: once a row does not fit, it
+    and every later row are counted in rows_dropped but not written.
+
+    Usage:
+        with ErrorReportWriter("payments_errors.csv", fieldnames) as report:
+            report.write(row, row_number, errors)
+    """
+
+    def __init__(self, path, fieldnames, max_rows=None, max_bytes=None):
+        """
+        Args:
+            path: Report path, a function returning it (called when the
+                  first invalid row arrives, e.g. to timestamp the name), or
+                  a writable text stream (left open)
+            fieldnames: Original CSV column names
+            max_rows: Optional maximum number of rows written
+            max_bytes: Optional maximum report size in bytes (header included)
+        """
+        self._path = path
+        self._stream = path if hasattr(path, 'write') else None
+        if self._stream is not None:
+            self.path = getattr(path, 'name', '<stream>')
+        else:
+            self.path = None if callable(path) else path
+        self.fieldnames = ['row_number'] + list(fieldnames) + ['error_details']
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.bytes_written = 0
+        self.failed = False
+        self._file = None
+        self._append_at = None  # Size to continue from after restore()
+        # Rows are rendered here first so the byte cap is never overshot
+        self._buffer = io.StringIO()
+        # Surplus values of a row have no column; ignore them instead of failing
+        self._writer = csv.DictWriter(self._buffer, fieldnames=self.fieldnames, extrasaction='ignore')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        """Create the report file and write its header (done by the first write())."""
+        if self._file is not None or self.failed:
+            return
+        try:
+            if self._stream is not None:
+                self._file = self._stream
+            elif self._append_at is not None:
+                # Continue a report restored from a checkpoint (header already there)
+                os.truncate(self.path, self._append_at)
+                self._file = open(self.path, 'a', encoding='utf-8', newline='')
+            else:
+                if self.path is None:
+                    self.path = self._path()
+                self._file = open(self.path, 'w', encoding='utf-8', newline='')
+            if self._append_at is None:
+                self._writer.writeheader()
+            self._flush_buffer()
+        except Exception as e:
+            self._fail(e)
+
+    def write(self, row, row_number, errors):
+        """
+        Add one invalid row to the report.
+
+        Args:
+            row: The original row dictionary
+            row_number: Row number in the input file
+            errors: List of error messages for the row
+        """
+        if self._file is None:
+            self.open()
+        # Once a row is left out, so are all later ones: the report stops at the cap
+        if self.failed or self.rows_dropped or (self.max_rows is not None and self.rows_written >= self.max_rows):
+            self.rows_dropped += 1
+            return
+
+        # Create output row with all original fields plus error info
+        output_row = {'row_number': row_number}
+        output_row.update(row)
+        output_row['error_details'] = ' | '.join(errors)
+        try:
+            self._writer.writerow(output_row)
+        except Exception as e:
+            self._fail(e)
+            self.rows_dropped += 1
+            return
+
+        if self.max_bytes is not None:
+            size = len(self._buffer.getvalue().encode('utf-8'))
+            if self.bytes_written + size > self.max_bytes:
+                self._buffer.seek(0)
+                self._buffer.truncate()
+                self.rows_dropped += 1
+                return
+        self._flush_buffer()
+        self.rows_written += 1
+
+    def close(self):
+        """Close the report file, if one was created (a stream is only flushed)."""
+        if self._file is not None:
+            if self._file is self._stream:
+                self._file.flush()
+            else:
+                self._file.close()
+            self._file = None
+            if not self.failed:
+                logger.info(f"Successfully wrote {self.rows_written} error(s) to {self.path}")
+
+    def state(self):
+        """
+        Return what restore() needs to continue this report later.
+
+        The report file is flushed and synced to disk first.
+        """
+        size = 0
+        if self._file is not None and self._file is not self._stream:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            size = os.fstat(self._file.fileno()).st_size
+        elif self._append_at is not None:
+            size = self._append_at
+        return {
+            'path': self.path if size else None,
+            'size': size,
+            'rows_written': self.rows_written,
+            'rows_dropped': self.rows_dropped,
+            'bytes_written': self.bytes_written,
+        }
+
+    def restore(self, state):
+        """
+        Continue a report saved with state(): rows written after it are
+        appended once the file is cut back to its saved size.
+        """
+        self.rows_written = state['rows_written']
+        self.rows_dropped = state['rows_dropped']
+        self.bytes_written = state['bytes_written']
+        if state['path'] is not None:
+            self.path = state['path']
+            self._append_at = state['size']
+
+    def _flush_buffer(self):
+        text = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        try:
+            self._file.write(text)
+        except Exception as e:
+            self._fail(e)
+            return
+        if self.max_bytes is not None:
+            self.bytes_written += len(text.encode('utf-8'))
+
+    def _fail(self, error):
+        """Log a write failure once and stop writing (conversion goes on)."""
+        logger.error(f"Failed to write error report: {error}")
+        self.failed = True
+
+
 def write_error_report(invalid_payments_data, output_path, original_fieldnames):
     """
     Write a CSV error report for invalid payments.
@@ -93,24 +503,7 @@ def write_error_report(invalid_payments_data, output_path, original_fieldnames):
         output_path: Path where to write the error report CSV
         original_fieldnames: Original CSV column names
     """
-    try:
-        with open(output_path, 'w', encoding='utf-8', newline='') as file:
-            # Add error columns to the original fieldnames
-            fieldnames = ['row_number'] + list(original_fieldnames) + ['error_details']
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            
-            for row, row_number, errors in invalid_payments_data:
-                # Combine all errors into a single string
-                error_text = ' | '.join(errors)
-                
-                # Create output row with all original fields plus error info
-                output_row = {'row_number': row_number}
-                output_row.update(row)
-                output_row['error_details'] = error_text
-                
-                writer.writerow(output_row)
-        
-        logger.info(f"Successfully wrote {len(invalid_payments_data)} error(s) to {output_path}")
-    except Exception as e:
-        logger.error(f"Failed to write error report: {e}")
+    with ErrorReportWriter(output_path, original_fieldnames) as report:
+        report.open()
+        for row, row_number, errors in invalid_payments_data:
+            report.write(row, row_number, errors)
@@ -0,0 +1,147 @@
+"""
+Detection of duplicate payments within one run (--duplicates).
+
+Two rows paying the same amount to the same IBAN with the same reference
+are almost always the same payment exported twice. Every valid payment
+is fingerprinted once (a 128-bit BLAKE2 digest of IBAN, amount in cents
+and reference, with surrounding spaces and the spaces inside the IBAN
+ignored, as validation does) and looked up in an index, so the whole
+file is checked in a single O(n) pass:
+
+- by default the index is exact: a dictionary from fingerprint to the
+  row number where it was first seen (about 150 bytes per payment)
+- with a memory budget it is a Bloom filter of that size instead, which
+  never misses a duplicate but can flag a unique payment as a probable
+  duplicate (below 1% while it holds fewer payments than one per 10 bits
+  of budget, i.e. 800,000 payments per MB), and cannot tell the first row;
+  it is therefore only allowed with the warn policy, so that a false
+  positive never drops or fails a unique payment
+
+What happens to a duplicate depends on the policy:
+
+    warn        keep it, log a warning and list it in the error report
+    keep-first  drop it like an invalid row (reported), keep the first one
+    reject      report every duplicate, then fail the run: no XML is written
+"""
+
+import hashlib
+import math
+import struct
+
+# Values of --duplicates
+DUPLICATE_POLICIES = ('warn', 'keep-first', 'reject')
+
+# Hash functions of the Bloom filter; optimal at about 10 bits per payment
+BLOOM_HASHES = 7
+
+# The two 64-bit halves of a fingerprint
+_HALVES = struct.Struct('<QQ')
+
+
+def payment_fingerprint(payment):
+    """Return the 16-byte fingerprint of a payment's IBAN, amount and reference."""
+    iban = payment.iban.strip().replace(' ', '')
+    key = f"{iban}\x1f{payment.amount_cents}\x1f{payment.reference.strip()}"
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+
+
+class BloomFilter:
+    """
+    Fixed-size set of fingerprints that may answer "seen" for a new one.
+
+    Positions come from the two halves of the fingerprint (double hashing),
+    so no extra hashing is done per lookup.
+    """
+
+    def __init__(self, size_bytes, hashes=BLOOM_HASHES):
+        """
+        Args:
+            size_bytes: Memory budget for the bit array
+            hashes: Number of bit positions per fingerprint
+        """
+        self.bits = max(8, int(size_bytes) * 8)
+        self.hashes = hashes
+        self._array = bytearray(self.bits // 8)
+        self.count = 0
+
+    def add(self, fingerprint):
+        """Add a fingerprint; return True if it was (probably) there already."""
+        first, step = _HALVES.unpack(fingerprint)
+        step |= 1
+        bits = self.bits
+        positions = [(first + i * step) % bits for i in range(self.hashes)]
+        array = self._array
+        if all(array[position >> 3] >> (position & 7) & 1 for position in positions):
+            return True
+        for position in positions:
+            array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+        return False
+
+    def false_positive_rate(self):
+        """Estimated chance that a new fingerprint is reported as seen, at the current fill."""
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+
+class DuplicateDetector:
+    """
+    Remember every valid payment of a run and recognise repeats.
+
+    Usage:
+        detector = DuplicateDetector('keep-first')
+        first_row = detector.check(payment, row_number)  # None for a new payment
+    """
+
+    def __init__(self, policy='warn', memory_bytes=None):
+        """
+        Args:
+            policy: 'warn', 'keep-first' or 'reject' (see the module docstring)
+            memory_bytes: Use a Bloom filter of this size instead of the exact
+                          index; only with the 'warn' policy
+
+        Raises:
+            ValueError: For an unknown policy, or a Bloom filter with a policy
+                        that drops or fails payments
+        """
+        if policy not in DUPLICATE_POLICIES:
+            raise ValueError(f"Unknown duplicate policy '{policy}' "
+                             f"(expected one of: {', '.join(DUPLICATE_POLICIES)})")
+        if memory_bytes and policy != 'warn':
+            raise ValueError(f"A Bloom filter can flag unique payments as duplicates, so it is only "
+                             f"allowed with the 'warn' policy, not '{policy}'")
+        self.policy = policy
+        self.bloom = BloomFilter(memory_bytes) if memory_bytes else None
+        self._first_rows = {}
+        self.duplicates = 0
+
+    def check(self, payment, row_number):
+        """
+        Record a payment and tell whether it was seen before.
+
+        Returns:
+            The row number of the first occurrence, 0 if the Bloom filter
+            only knows it was (probably) seen, or None for a new payment
+        """
+        fingerprint = payment_fingerprint(payment)
+        if self.bloom is not None:
+            if not self.bloom.add(fingerprint):
+                return None
+            self.duplicates += 1
+            return 0
+        first_row = self._first_rows.setdefault(fingerprint, row_number)
+        if first_row == row_number:
+            return None
+        self.duplicates += 1
+        return first_row
+
+    def describe(self, payment, first_row):
+        """Return the error report message for a duplicate."""
+        if first_row:
+            what = f"Duplicate of row {first_row}"
+        else:
+            what = "Probable duplicate of an earlier row"
+        message = (f"{what} for '{payment.name}': same IBAN, amount {payment.amount} "
+                   f"and reference '{payment.reference}'")
+        if self.policy == 'warn':
+            message += " (kept)"
+        return message
@@ -17,8 +17,9 @@ except ImportError as e:
     raise ImportError(f"Tkinter not available: {e}")
 
 from .csv_reader import read_csv_file
-from .xml_builder import build_sepa_xml
+from .xml_builder import write_sepa_xml
 from .config import DEFAULT_COMPANY_NAME
+from .payment import format_cents
 
 
 class SimpleConverterApp:
@@ -144,14 +145,6 @@ class SimpleConverterApp:
                 messagebox.showwarning("Warning", "The CSV file is empty")
                 return
 
-            # Generate XML
-            xml_content = build_sepa_xml(
-                payments,
-                company_name=self.debtor_name,
-                company_iban=self.debtor_iban,
-                company_bic=self.debtor_bic
-            )
-
             # Ask where to save
             output_path = filedialog.asksaveasfilename(
                 title="Save SEPA XML",
@@ -161,21 +154,34 @@ class SimpleConverterApp:
             )
 
             if output_path:
-                # Write file
-                with open(output_path, 'w', encoding='utf-8') as file:
-                    file.write(xml_content)
+                # Generate XML into a temporary file next to it, renamed once
+                # complete, so a failure never leaves a truncated file behind
+                temp_path = output_path + '.part'
+                try:
+                    with open(temp_path, 'w', encoding='utf-8') as file:
+                        total = write_sepa_xml(
+                            payments,
+                            file,
+                            company_name=self.debtor_name,
+                            company_iban=self.debtor_iban,
+                            company_bic=self.debtor_bic
+                        )
+                    os.replace(temp_path, output_path)
+                finally:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
 
                 # Show success
-                total = sum(float(p.get('amount', 0)) for p in payments)
+                total = format_cents(total, grouping=True)
                 self.status_label.config(
-                    text=f"Created! {len(payments)} payments, total: EUR {total:,.2f}"
+                    text=f"Created! {len(payments)} payments, total: EUR {total}"
                 )
 
                 messagebox.showinfo(
                     "Success",
                     f"SEPA XML file created!\n\n"
                     f"Payments: {len(payments)}\n"
-                    f"Total: EUR {total:,.2f}\n\n"
+                    f"Total: EUR {total}\n\n"
                     f"Saved to:\n{output_path}"
                 )
 
@@ -0,0 +1,220 @@
+"""
+MsgId, PmtInfId and EndToEndId generation.
+
+SEPA ids are at most 35 characters and must not repeat: banks refuse a
+MsgId they have already seen, and EndToEndIds are how a payment is traced
+through returns and inquiries. Every document gets its ids from an id
+generator, an object with a document(created, number=None) method
+returning DocumentIds:
+
+- ClockIds (the default) makes them from the creation time, to the
+  second. Batch, watch and server mode add the number of the document
+  within the batch, so files converted in the same second differ; two
+  separate runs in the same second can still collide.
+- SequenceIds numbers documents from a counter kept in a small file and
+  locked while it is advanced, so ids never repeat across runs and
+  processes. Each process takes a block of numbers at a time, so worker
+  pools do not wait on the lock for every file.
+
+An EndToEndId is the document's prefix followed by the payment's 1-based
+position, always END_TO_END_DIGITS digits wide.
+
+Usage:
+    ids = SequenceIds("ids.seq").document(datetime.now())
+    ids.message_id, ids.payment_info_id, ids.end_to_end_id(1)
+"""
+
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from .config import DEFAULT_ID_BLOCK_SIZE
+
+# Longest id SEPA allows (Max35Text)
+SEPA_ID_MAX_LENGTH = 35
+
+# Digits of the payment's position in an EndToEndId
+END_TO_END_DIGITS = 9
+
+# Digits of a document number from a SequenceIds counter
+SEQUENCE_DIGITS = 10
+
+
+def check_id(value):
+    """
+    Return an id unchanged if it fits SEPA's 35 characters.
+
+    Raises:
+        ValueError: If it is longer
+    """
+    if len(value) > SEPA_ID_MAX_LENGTH:
+        raise ValueError(f"Id '{value}' is longer than {SEPA_ID_MAX_LENGTH} characters")
+    return value
+
+
+class DocumentIds:
+    """
+    The ids of one document.
+
+    Attributes:
+        message_id: MsgId of the group header
+        payment_info_id: PmtInfId (a "-001", "-002", ... suffix is added per
+                         block when there are several)
+        end_to_end_prefix: Start of every EndToEndId
+    """
+
+    def __init__(self, message_id, payment_info_id, end_to_end_prefix):
+        self.message_id = check_id(message_id)
+        self.payment_info_id = check_id(payment_info_id)
+        if len(end_to_end_prefix) + END_TO_END_DIGITS > SEPA_ID_MAX_LENGTH:
+            raise ValueError(f"EndToEndId prefix '{end_to_end_prefix}' leaves no room for "
+                             f"{END_TO_END_DIGITS} digits in {SEPA_ID_MAX_LENGTH} characters")
+        self.end_to_end_prefix = end_to_end_prefix
+
+    def end_to_end_id(self, index):
+        """Return the EndToEndId of the index-th (1-based) payment."""
+        return f"{self.end_to_end_prefix}{index:0{END_TO_END_DIGITS}d}"
+
+    def shard(self, number):
+        """
+        Return the ids of one file of a split document.
+
+        MsgId and PmtInfId get a "-0001", "-0002", ... suffix; EndToEndIds
+        keep counting across the files, so they share the prefix.
+        """
+        return DocumentIds(f"{self.message_id}-{number:04d}", f"{self.payment_info_id}-{number:04d}",
+                           self.end_to_end_prefix)
+
+    def to_dict(self):
+        """Return the ids as a dictionary (e.g. to save them in a checkpoint)."""
+        return {'message_id': self.message_id, 'payment_info_id': self.payment_info_id,
+                'end_to_end_prefix': self.end_to_end_prefix}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['message_id'], data['payment_info_id'], data['end_to_end_prefix'])
+
+    def __eq__(self, other):
+        return isinstance(other, DocumentIds) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"DocumentIds({self.message_id!r}, {self.payment_info_id!r}, {self.end_to_end_prefix!r})"
+
+
+class ClockIds:
+    """Ids made from the creation time (and the document number in a batch)."""
+
+    def document(self, created, number=None):
+        """
+        Args:
+            created: Creation time (datetime) of the document
+            number: Optional number of the document within its batch
+        """
+        stamp = created.strftime("%Y%m%d%H%M%S")
+        if number is None:
+            return DocumentIds(f"MSG{stamp}", f"PMT{stamp}", f"E2E{stamp}")
+        return DocumentIds(f"MSG{stamp}-{number:04d}", f"PMT{stamp}-{number:04d}", f"E2E{stamp}{number:04d}")
+
+
+class SequenceIds:
+    """
+    Ids numbered from a counter file shared by all runs and processes.
+
+    Attributes:
+        path: The counter file
+        block_size: Numbers taken from the file at a time
+    """
+
+    def __init__(self, path, block_size=DEFAULT_ID_BLOCK_SIZE):
+        """
+        Args:
+            path: Counter file; created (starting at 1) if missing
+            block_size: Numbers reserved per lock; unused ones are skipped,
+                        which leaves gaps but never repeats a number
+        """
+        self.path = path
+        self.block_size = max(1, block_size)
+        self._next = self._end = 0
+        self._pid = None
+
+    def __getstate__(self):
+        # A copy in another process reserves its own block
+        return {'path': self.path, 'block_size': self.block_size}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['block_size'])
+
+    def next_number(self):
+        """Return the next unused number, reserving a new block when needed."""
+        if self._pid != os.getpid() or self._next >= self._end:
+            self._next = allocate(self.path, self.block_size)
+            self._end = self._next + self.block_size
+            self._pid = os.getpid()
+        number = self._next
+        self._next += 1
+        return number
+
+    def document(self, created, number=None):
+        """
+        Args:
+            created: Creation time (datetime) of the document
+            number: Ignored (the counter already makes the ids unique)
+        """
+        sequence = f"{self.next_number():0{SEQUENCE_DIGITS}d}"
+        date = created.strftime("%Y%m%d")
+        return DocumentIds(f"MSG{date}{sequence}", f"PMT{date}{sequence}", f"E2E{sequence}")
+
+
+def allocate(path, count=1):
+    """
+    Reserve count consecutive numbers from a counter file.
+
+    The file holds the next free number. It is locked while it is read
+    and rewritten in place, so concurrent processes never get the same
+    numbers.
+
+    Returns:
+        The first reserved number
+
+    Raises:
+        ValueError: If the file does not contain a number
+    """
+    descriptor = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(descriptor, 'r+', encoding='ascii') as file:
+        _lock(file)
+        try:
+            text = file.read().strip()
+            try:
+                first = int(text) if text else 1
+            except ValueError:
+                raise ValueError(f"Id sequence file {path} is corrupt: {text[:40]!r}") from None
+            file.seek(0)
+            file.write(f"{first + count:020d}\n")
+            file.truncate()
+            file.flush()
+            os.fsync(file.fileno())
+        finally:
+            _unlock(file)
+    return first
+
+
+def _lock(file):
+    """Block until this process holds the lock on the file."""
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+    file.seek(0)
+
+
+def _unlock(file):
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,346 @@
+"""
+Ledger of submitted payments across runs (--ledger).
+
+A CSV exported twice, or converted again days later, would have the
+bank pay everything a second time. The ledger is a local SQLite file
+remembering every payment written by earlier runs, under the fingerprint
+used by duplicate detection (IBAN, amount in cents and reference, see
+duplicates.payment_fingerprint) and under the EndToEndId it was given.
+
+Payments are checked as they stream from the reader, in batches: one
+indexed SELECT looks up a whole batch of fingerprints (and one its
+EndToEndIds), and the batch is added with a single executemany(). All
+inserts of a run belong to one transaction that is only committed once
+the XML has been written, so a failed conversion leaves no trace in the
+ledger.
+
+What happens to a payment found in the ledger depends on the policy:
+
+    reject  report every one, then fail the run: no XML is written
+    skip    leave it out of the XML
+    warn    keep it and log a warning
+
+An EndToEndId already used by an earlier run for another payment is only
+logged (with the default ids this happens when two runs start in the same
+second; see ids). Runs older than the retention period are
+pruned with their payments, so the file does not grow forever.
+
+Usage:
+    with PaymentLedger("payments.ledger") as ledger:
+        check = LedgerCheck(ledger, 'reject', created, "in.csv", "out.xml")
+        write_sepa_xml(list(check.filter(payments)), ...)
+        check.finish()
+        check.commit()
+"""
+
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+
+from . import row_log
+from .config import DEFAULT_LEDGER_BATCH_SIZE
+from .duplicates import payment_fingerprint
+from .ids import ClockIds
+from .payment import format_cents
+
+logger = logging.getLogger(__name__)
+
+# Values of --ledger-policy
+LEDGER_POLICIES = ('reject', 'skip', 'warn')
+
+# Parameters per SELECT ... IN (...) (SQLite allows 32766 since 3.32, 999 before)
+_LOOKUP_CHUNK = 900
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    submitted TEXT NOT NULL,
+    input TEXT,
+    output TEXT,
+    payments INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_submitted ON runs (submitted);
+CREATE TABLE IF NOT EXISTS payments (
+    fingerprint BLOB PRIMARY KEY,
+    end_to_end_id TEXT NOT NULL,
+    run INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS payments_end_to_end_id ON payments (end_to_end_id);
+CREATE INDEX IF NOT EXISTS payments_run ON payments (run);
+"""
+
+
+class PaymentLedger:
+    """
+    SQLite file of the payments written by earlier runs.
+
+    Attributes:
+        path: Path of the database file
+        run_id: Id of the run being recorded (see begin_run), or None
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Database file; created with its tables if missing
+        """
+        self.path = path
+        self.run_id = None
+        # Transactions are managed explicitly (BEGIN ... COMMIT)
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA cache_size=-65536")  # 64 MB of index pages
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        """Close the database, rolling back a run that was not committed."""
+        if self.run_id is not None:
+            self.rollback()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def begin_run(self, submitted, input_file=None, output_file=None):
+        """
+        Start recording a run; nothing is stored until commit().
+
+        Args:
+            submitted: Time (datetime) the run is recorded under, which
+                       pruning compares with the wall clock
+            input_file: Name of the CSV, for the record
+            output_file: Name of the XML, for the record
+
+        Returns:
+            The id of the new run
+        """
+        self._db.execute("BEGIN IMMEDIATE")
+        cursor = self._db.execute("INSERT INTO runs (submitted, input, output) VALUES (?, ?, ?)",
+                                  (submitted.isoformat(), input_file, output_file))
+        self.run_id = cursor.lastrowid
+        return self.run_id
+
+    def lookup(self, fingerprints):
+        """
+        Find fingerprints recorded by earlier runs.
+
+        Returns:
+            {fingerprint: (EndToEndId, submitted, output)} for those found
+        """
+        return self._lookup(
+            "SELECT p.fingerprint, p.end_to_end_id, r.submitted, r.output FROM payments p "
+            "JOIN runs r ON r.id = p.run WHERE p.fingerprint IN ({}) AND p.run IS NOT ?",
+            fingerprints)
+
+    def lookup_end_to_end_ids(self, end_to_end_ids):
+        """
+        Find EndToEndIds used by earlier runs.
+
+        Returns:
+            {EndToEndId: (fingerprint, submitted, output)} for those found
+        """
+        return self._lookup(
+            "SELECT p.end_to_end_id, p.fingerprint, r.submitted, r.output FROM payments p "
+            "JOIN runs r ON r.id = p.run WHERE p.end_to_end_id IN ({}) AND p.run IS NOT ?",
+            end_to_end_ids)
+
+    def _lookup(self, query, keys):
+        """Run an IN (...) query over the keys in chunks; map the first column to the others."""
+        found = {}
+        keys = list(keys)
+        for start in range(0, len(keys), _LOOKUP_CHUNK):
+            chunk = keys[start:start + _LOOKUP_CHUNK]
+            sql = query.format(','.join('?' * len(chunk)))
+            for key, *values in self._db.execute(sql, chunk + [self.run_id]):
+                found[key] = tuple(values)
+        return found
+
+    def record(self, entries):
+        """
+        Add payments to the current run.
+
+        Args:
+            entries: (fingerprint, EndToEndId) pairs; a fingerprint already
+                     in the ledger moves to this run, so it is kept for the
+                     retention period after its latest submission
+        """
+        # In key order, so consecutive inserts touch neighbouring pages of the index
+        self._db.executemany("INSERT INTO payments (fingerprint, end_to_end_id, run) VALUES (?, ?, ?) "
+                             "ON CONFLICT (fingerprint) DO UPDATE "
+                             "SET end_to_end_id = excluded.end_to_end_id, run = excluded.run",
+                             sorted((fingerprint, e2e, self.run_id) for fingerprint, e2e in entries))
+
+    def commit(self, payment_count):
+        """Store the current run and its payments."""
+        self._db.execute("UPDATE runs SET payments = ? WHERE id = ?", (payment_count, self.run_id))
+        self._db.execute("COMMIT")
+        self.run_id = None
+
+    def rollback(self):
+        """Forget the current run."""
+        self._db.execute("ROLLBACK")
+        self.run_id = None
+
+    def prune(self, before):
+        """
+        Delete the runs submitted before a time, with their payments.
+
+        Returns:
+            tuple: (number of runs, number of payments) deleted
+        """
+        cutoff = before.isoformat()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            payments = self._db.execute(
+                "DELETE FROM payments WHERE run IN (SELECT id FROM runs WHERE submitted < ?)", (cutoff,)).rowcount
+            runs = self._db.execute("DELETE FROM runs WHERE submitted < ?", (cutoff,)).rowcount
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return runs, payments
+
+    def stats(self):
+        """Return (number of runs, number of payments) in the ledger."""
+        runs, = self._db.execute("SELECT COUNT(*) FROM runs").fetchone()
+        payments, = self._db.execute("SELECT COUNT(*) FROM payments").fetchone()
+        return runs, payments
+
+
+class LedgerCheck:
+    """
+    Check one run's payments against the ledger and record them.
+
+    Attributes:
+        submitted: Payments found in the ledger
+        reused_ids: EndToEndIds of this run already used by an earlier run
+    """
+
+    def __init__(self, ledger, policy, created, input_file=None, output_file=None,
+                 batch_size=DEFAULT_LEDGER_BATCH_SIZE, ids=None, recorded=None):
+        """
+        Args:
+            ledger: Open PaymentLedger
+            policy: 'reject', 'skip' or 'warn' (see the module docstring)
+            created: Creation time (datetime) of the XML
+            input_file: Name of the CSV, for the record
+            output_file: Name of the XML, for the record
+            batch_size: Payments looked up and inserted at a time
+            ids: DocumentIds the XML writer uses, which the EndToEndIds come
+                 from (default: made from the creation time, as the writer does)
+            recorded: Time the run is recorded under, which pruning goes by
+                      (default: now; not created, which SOURCE_DATE_EPOCH
+                      may fix in the past)
+
+        Raises:
+            ValueError: For an unknown policy
+        """
+        if policy not in LEDGER_POLICIES:
+            raise ValueError(f"Unknown ledger policy '{policy}' "
+                             f"(expected one of: {', '.join(LEDGER_POLICIES)})")
+        self.ledger = ledger
+        self.policy = policy
+        self.created = created
+        self.ids = ids or ClockIds().document(created)
+        self.batch_size = max(1, batch_size)
+        self.submitted = 0
+        self.reused_ids = 0
+        self._count = 0
+        ledger.begin_run(recorded or datetime.now(), input_file, output_file)
+
+    def filter(self, payments):
+        """
+        Yield the payments to write, in order, checking them batch by batch.
+
+        Under the 'skip' policy payments found in the ledger are left out.
+        """
+        batch = []
+        for payment in payments:
+            batch.append(payment)
+            if len(batch) >= self.batch_size:
+                yield from self._check_batch(batch)
+                batch = []
+        if batch:
+            yield from self._check_batch(batch)
+
+    def _check_batch(self, batch):
+        """Look up one batch, report what was submitted before and record the rest."""
+        fingerprints = [payment_fingerprint(payment) for payment in batch]
+        found = self.ledger.lookup(fingerprints)
+        kept = []
+        for payment, fingerprint in zip(batch, fingerprints):
+            earlier = found.get(fingerprint)
+            if earlier is not None:
+                self.submitted += 1
+                e2e, submitted, output = earlier
+                row_log.log(logger, logging.WARNING if self.policy == 'warn' else logging.ERROR,
+                            'already_submitted',
+                            "Already submitted on %s in %s as %s: '%s', %s, amount %s, reference '%s'",
+                            submitted, output, e2e, payment.name, payment.iban,
+                            format_cents(payment.amount_cents), payment.reference)
+                if self.policy == 'skip':
+                    continue
+            kept.append((payment, fingerprint))
+
+        entries = []
+        for payment, fingerprint in kept:
+            self._count += 1
+            entries.append((fingerprint, self.ids.end_to_end_id(self._count)))
+        reused = self.ledger.lookup_end_to_end_ids([e2e for _, e2e in entries])
+        for fingerprint, e2e in entries:
+            if e2e not in reused:
+                continue
+            earlier_fingerprint, submitted, output = reused[e2e]
+            if earlier_fingerprint == fingerprint:
+                continue  # The same payment again, reported above
+            self.reused_ids += 1
+            row_log.warning(logger, 'end_to_end_id_reused',
+                            "EndToEndId %s was already used on %s in %s", e2e, submitted, output)
+        self.ledger.record(entries)
+        return [payment for payment, _ in kept]
+
+    def finish(self):
+        """
+        Log what was found.
+
+        Raises:
+            ValueError: If payments were found in the ledger under the 'reject'
+                        policy, or all of them under 'skip'
+        """
+        if self.reused_ids:
+            logger.warning(f"{self.reused_ids} EndToEndId(s) were already used by earlier runs")
+        if self.submitted:
+            logger.warning(f"Found {self.submitted} payment(s) already submitted by earlier runs "
+                           f"(policy: {self.policy})")
+            if self.policy == 'reject':
+                raise ValueError(f"{self.submitted} payment(s) were already submitted according to "
+                                 f"{self.ledger.path} (--ledger-policy skip leaves them out)")
+            if self._count == 0:
+                raise ValueError(f"All {self.submitted} payment(s) were already submitted according to "
+                                 f"{self.ledger.path}")
+
+    def commit(self):
+        """Store the run in the ledger, once its XML is in place."""
+        self.ledger.commit(self._count)
+        logger.info(f"Recorded {self._count} payment(s) in ledger {self.ledger.path}")
+
+
+def prune_ledger(ledger, retention_days, now):
+    """
+    Delete runs older than the retention period, logging what went.
+
+    Args:
+        ledger: Open PaymentLedger
+        retention_days: Days runs are kept; 0 or None keeps everything
+        now: Current time (datetime)
+    """
+    if not retention_days:
+        return
+    runs, payments = ledger.prune(now - timedelta(days=retention_days))
+    if runs:
+        logger.info(f"Pruned {runs} run(s) with {payments} payment(s) older than "
+                    f"{retention_days} days from ledger {ledger.path}")
@@ -8,11 +8,17 @@ Includes macOS compatibility layer with diagnostics and CLI fallback.
 Features:
 - GUI mode (default): Interactive Tkinter interface
 - CLI mode: Headless operation for automation/fallback
+- Batch mode: Many files converted by a pool of workers in one run
+- Watch mode: Long-running conversion of new and changed files in a folder
+- Server mode: Local HTTP service converting uploaded CSVs
 - Diagnostics mode: System compatibility check
 
 Usage:
     python3 main.py                          # GUI mode
     python3 main.py --cli input.csv out.xml  # CLI mode
+    python3 main.py --batch exports/ out/    # Batch mode
+    python3 main.py --watch inbox/           # Watch-folder mode
+    python3 main.py --serve 8765             # Local HTTP service
     python3 main.py --diagnostics            # Check system
 
 The CSV file must have columns: name, iban, amount, reference, bic
@@ -36,10 +42,21 @@ if __name__ == "__main__":
         sys.path.insert(0, parent_dir)
 
 
+def refuse_options(args, mode, names):
+    """Exit with an error if any of the named options was given (see cli.unsupported_options)."""
+    from csv_to_sepa_xml.cli import unsupported_options
+
+    flags = unsupported_options(args, names)
+    if flags:
+        print(f"ERROR: {mode} cannot be combined with {', '.join(flags)}")
+        sys.exit(1)
+
+
 def main():
     """Main entry point with mode selection."""
     # Import modules
-    from csv_to_sepa_xml.cli import parse_arguments, run_cli_mode
+    from csv_to_sepa_xml.cli import (parse_arguments, run_cli_mode, LEDGER_OPTIONS, CHECKPOINT_OPTIONS,
+                                     SPLIT_OPTIONS)
     from csv_to_sepa_xml.diagnostics import print_diagnostics, check_tkinter_available
     from csv_to_sepa_xml.config import setup_logging
     
@@ -47,7 +64,7 @@ def main():
     args = parse_arguments()
     
     # Setup logging
-    setup_logging(quiet=args.quiet)
+    setup_logging(quiet=args.quiet, log_summary=args.log_summary, log_examples=args.log_examples)
     logger = logging.getLogger(__name__)
     
     # --- DIAGNOSTICS MODE ---
@@ -64,7 +81,111 @@ def main():
             debtor_name=args.debtor_name,
             debtor_iban=args.debtor_iban,
             debtor_bic=args.debtor_bic,
-            quiet=args.quiet
+            quiet=args.quiet,
+            streaming=args.stream,
+            cache_path=args.validation_cache,
+            cache_size=args.cache_size,
+            workers=args.workers,
+            max_tx_per_file=args.max_tx_per_file,
+            max_bytes_per_file=args.max_bytes_per_file,
+            profile=args.profile,
+            metrics_path=args.metrics,
+            max_error_rows=args.max_error_rows,
+            max_error_bytes=args.max_error_bytes,
+            reader_engine=args.reader,
+            compression_level=args.compression_level,
+            column_aliases=args.column_alias,
+            checkpoint=args.checkpoint,
+            resume=args.resume,
+            checkpoint_every=args.checkpoint_every,
+            duplicate_policy=args.duplicates,
+            duplicate_memory_mb=args.duplicate_memory,
+            ledger_path=args.ledger,
+            ledger_policy=args.ledger_policy,
+            ledger_retention_days=args.ledger_retention,
+            id_sequence=args.id_sequence
+        )
+        sys.exit(exit_code)
+    
+    # --- BATCH MODE ---
+    if args.batch:
+        from csv_to_sepa_xml.batch import run_batch_mode
+
+        refuse_options(args, '--batch', SPLIT_OPTIONS + CHECKPOINT_OPTIONS + LEDGER_OPTIONS + ('profile',))
+        source, output_dir = args.batch
+        exit_code = run_batch_mode(
+            source,
+            output_dir,
+            debtor_name=args.debtor_name,
+            debtor_iban=args.debtor_iban,
+            debtor_bic=args.debtor_bic,
+            quiet=args.quiet,
+            streaming=args.stream,
+            cache_path=args.validation_cache,
+            cache_size=args.cache_size,
+            workers=args.workers,
+            metrics_path=args.metrics,
+            max_error_rows=args.max_error_rows,
+            max_error_bytes=args.max_error_bytes,
+            id_sequence=args.id_sequence,
+            reader_engine=args.reader,
+            column_aliases=args.column_alias,
+            duplicate_policy=args.duplicates,
+            duplicate_memory_mb=args.duplicate_memory,
+            compression_level=args.compression_level
+        )
+        sys.exit(exit_code)
+    
+    # --- WATCH MODE ---
+    if args.watch:
+        from csv_to_sepa_xml.watch import run_watch_mode, DEFAULT_WATCH_INTERVAL
+
+        refuse_options(args, '--watch', SPLIT_OPTIONS + CHECKPOINT_OPTIONS + LEDGER_OPTIONS +
+                       ('profile', 'metrics', 'compression_level'))
+
+        exit_code = run_watch_mode(
+            args.watch,
+            args.outbox,
+            debtor_name=args.debtor_name,
+            debtor_iban=args.debtor_iban,
+            debtor_bic=args.debtor_bic,
+            streaming=args.stream,
+            cache_path=args.validation_cache,
+            cache_size=args.cache_size,
+            workers=args.workers,
+            interval=args.watch_interval if args.watch_interval is not None else DEFAULT_WATCH_INTERVAL,
+            max_error_rows=args.max_error_rows,
+            max_error_bytes=args.max_error_bytes,
+            id_sequence=args.id_sequence,
+            reader_engine=args.reader,
+            column_aliases=args.column_alias,
+            duplicate_policy=args.duplicates,
+            duplicate_memory_mb=args.duplicate_memory
+        )
+        sys.exit(exit_code)
+    
+    # --- SERVER MODE ---
+    if args.serve is not None:
+        from csv_to_sepa_xml.server import run_server_mode
+
+        refuse_options(args, '--serve', SPLIT_OPTIONS + CHECKPOINT_OPTIONS + LEDGER_OPTIONS +
+                       ('profile', 'metrics', 'compression_level'))
+
+        exit_code = run_server_mode(
+            args.serve,
+            debtor_name=args.debtor_name,
+            debtor_iban=args.debtor_iban,
+            debtor_bic=args.debtor_bic,
+            workers=args.workers,
+            max_concurrent=args.max_concurrent,
+            streaming=args.stream,
+            cache_path=args.validation_cache,
+            cache_size=args.cache_size,
+            id_sequence=args.id_sequence,
+            reader_engine=args.reader,
+            column_aliases=args.column_alias,
+            duplicate_policy=args.duplicates,
+            duplicate_memory_mb=args.duplicate_memory
         )
         sys.exit(exit_code)
     
@@ -0,0 +1,199 @@
+"""
+Memory-mapped CSV ingestion for very large files (the --reader mmap option).
+
+csv.DictReader decodes every byte of the file and builds a dictionary of
+all columns for every row. The validators only look at the SEPA columns
+(and the grouping columns, when present), so this reader works on the
+raw bytes of a memory-mapped file instead:
+
+- records are cut on newlines, joined while their quote count is odd
+  (a newline inside a quoted field), as in parallel_reader
+- a cheap pre-check on the bytes decides whether the needed columns can
+  be split off directly: every needed column must lie before the first
+  quote character of the record (a quoted address at the end of the
+  line is fine). Only those few fields are decoded.
+- any other record (quotes in a needed column, a stray carriage return,
+  too few fields) goes through the csv module, exactly as PaymentReader
+  would read it
+- the full row with all columns is only built for rejected rows, for the
+  error report
+
+Valid payments, invalid rows and row numbers are the same as with
+PaymentReader, on RFC 4180 files (quotes only around whole fields).
+
+Since every record's byte offset is known, this reader is also the one
+checkpointed conversions use (see checkpoint): it can report its
+position between records and start again from one.
+"""
+
+import csv
+import io
+import logging
+import mmap
+import operator
+import os
+
+from . import row_log
+from .csv_reader import PaymentReader, check_columns
+from .payment import Payment
+from .validation import check_payment_row
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_record(record):
+    """
+    Parse one record's raw bytes with the csv module, the way text-mode
+    reading and PaymentReader would (universal newlines, blank rows skipped).
+
+    Returns:
+        A list of rows (lists of strings); more than one if the record
+        contained a lone carriage return, which text mode reads as a newline
+    """
+    text = record.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+    return [row for row in csv.reader(io.StringIO(text)) if row]
+
+
+class MmapPaymentReader(PaymentReader):
+    """
+    PaymentReader that memory-maps the file and decodes only the columns
+    validation needs (see the module docstring).
+
+    Usage:
+        reader = MmapPaymentReader("payments.csv")
+        for payment in reader:
+            ...
+        reader.finish()
+    """
+
+    # Called as on_checkpoint(offset, row_number) between records, every
+    # checkpoint_every rows: offset is where the next record starts and all
+    # payments yielded so far have been consumed
+    on_checkpoint = None
+    checkpoint_every = None
+    _resume = None
+
+    def resume_from(self, offset, row_number, valid_count, invalid_count, error_report=None):
+        """
+        Start at a saved position instead of the first row.
+
+        Args:
+            offset: Byte offset of the next record (from on_checkpoint)
+            row_number: Number of the last row read before it
+            valid_count: Valid rows read before it
+            invalid_count: Invalid rows read before it
+            error_report: ErrorReportWriter.state() saved with the position
+        """
+        self._resume = (offset, row_number, error_report)
+        self.valid_count = valid_count
+        self.invalid_count = invalid_count
+
+    def __iter__(self):
+        row_log.reset()
+        with open(self.filepath, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                check_columns(None)  # Empty file (which cannot be mapped)
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                readline = data.readline
+
+                # The header is the first non-blank row
+                fieldnames = None
+                for record in self._records(readline):
+                    rows = _parse_record(record)
+                    if rows:
+                        fieldnames = rows[0]
+                        break
+                schema = self._compile_schema(fieldnames)
+                groups = {} if schema.has_groups else None
+
+                # Only the schema's columns are decoded on the fast path
+                names = schema.columns
+                pick = operator.itemgetter(*schema.indexes)
+                last = max(schema.indexes)
+                if self.keep_extra:
+                    last = len(fieldnames) - 1  # Every field is needed
+
+                cache = self.cache
+                keep_extra = self.keep_extra
+                duplicates = self.duplicates
+                decode = bytes.decode
+                with self._open_error_report():
+                    row_number = 1
+                    if self._resume is not None:
+                        offset, row_number, error_report = self._resume
+                        data.seek(offset)
+                        if error_report is not None and self.error_report is not None:
+                            self.error_report.restore(error_report)
+
+                    next_checkpoint = float('inf')
+                    if self.on_checkpoint is not None:
+                        next_checkpoint = row_number + self.checkpoint_every
+                    for record in self._records(readline):
+                        if row_number >= next_checkpoint:
+                            self.on_checkpoint(data.tell() - len(record), row_number)
+                            next_checkpoint = row_number + self.checkpoint_every
+                        # Pre-check: the needed columns all lie before the first
+                        # quote, and the only CR is the one of a CRLF line end
+                        # (with keep_extra: no quotes and no surplus fields at all)
+                        quote = record.find(b'"')
+                        if quote < 0:
+                            fields = record.split(b',', last + 1)
+                            fast = len(fields) > last
+                            if len(fields) == last + 1:
+                                fields[last] = fields[last].rstrip(b'\r\n')
+                            elif keep_extra:
+                                fast = False
+                        else:
+                            fields = record[:quote].split(b',', last + 1)
+                            fast = len(fields) > last + 1 and not keep_extra
+                        carriage_return = record.find(b'\r')
+                        if fast and (carriage_return < 0 or carriage_return == len(record) - 2):
+                            row_number += 1
+                            row = dict(zip(names, map(decode, pick(fields))))
+                            validation_errors, amount_cents = check_payment_row(row, row_number, cache)
+                            if not validation_errors:
+                                payment = Payment.from_row(row, keep_extra, amount_cents, groups)
+                                if duplicates is not None:
+                                    first_row = duplicates.check(payment, row_number)
+                                    if first_row is not None and self._duplicate(
+                                            payment, schema.full_row(_parse_record(record)[0]),
+                                            row_number, first_row):
+                                        continue
+                                self.valid_count += 1
+                                yield payment
+                            else:
+                                # Only the needed columns were decoded; the report gets them all
+                                self._reject(schema.full_row(_parse_record(record)[0]), row_number,
+                                             validation_errors)
+                            continue
+
+                        # Anything else is read by the csv module (blank lines give no rows)
+                        for values in _parse_record(record):
+                            row_number += 1
+                            row = schema.row(values)
+                            validation_errors, amount_cents = check_payment_row(row, row_number, cache)
+                            if not validation_errors:
+                                payment = Payment.from_row(row, keep_extra, amount_cents, groups)
+                                if duplicates is not None:
+                                    first_row = duplicates.check(payment, row_number)
+                                    if first_row is not None and self._duplicate(
+                                            payment, schema.full_row(values), row_number, first_row):
+                                        continue
+                                self.valid_count += 1
+                                yield payment
+                            else:
+                                self._reject(schema.full_row(values), row_number, validation_errors)
+
+    @staticmethod
+    def _records(readline):
+        """Yield the raw bytes of each record (newlines inside quotes included)."""
+        for line in iter(readline, b''):
+            if b'"' in line:
+                quotes = line.count(b'"')
+                while quotes % 2:
+                    more = readline()
+                    if not more:
+                        break
+                    line += more
+                    quotes += more.count(b'"')
+            yield line
@@ -0,0 +1,268 @@
+"""
+Multi-process CSV validation for large files.
+
+The file is split into byte ranges that end on record boundaries (a
+newline outside quoted fields), and the ranges are validated in a process
+pool. Results come back in file order, so valid payments, invalid rows
+and row numbers are exactly what the single-process PaymentReader gives.
+"""
+
+import csv
+import io
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from . import row_log
+from .csv_reader import PaymentReader
+from .payment import Payment
+from .schema import RowSchema
+from .validation import check_payment_row
+from .validation_cache import ValidationCache
+
+logger = logging.getLogger(__name__)
+
+# Chunks per worker; more chunks than workers keeps the pool busy when
+# some ranges validate slower than others
+CHUNKS_PER_WORKER = 4
+
+# Upper bound for one chunk, so huge files are cut into more pieces and
+# memory stays bounded by the chunks in flight, not by the file size
+MAX_CHUNK_BYTES = 16 * 1024 * 1024
+
+# Chunks submitted ahead of the one being consumed, per worker
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+# Bytes read at a time while looking for record boundaries
+SCAN_BLOCK_SIZE = 1024 * 1024
+
+# Per-process state, set up by _init_worker()
+_worker_cache = None
+
+
+def find_record_boundaries(filepath, targets):
+    """
+    Find the record boundary at or after each target byte offset.
+
+    A boundary is the position right after a newline that is outside any
+    quoted field. Quoting is tracked by counting quote characters, which is
+    exact for RFC 4180 files (quotes only around whole fields, doubled
+    inside them).
+
+    Arguments:
+        filepath: Path to the CSV file
+        targets: Byte offsets in ascending order
+
+    Returns:
+        A list of boundary offsets, one per target (the file size when no
+        boundary follows a target)
+    """
+    boundaries = []
+    quotes = 0
+    position = 0
+
+    with open(filepath, 'rb') as file:
+        file_size = os.fstat(file.fileno()).st_size
+
+        for target in targets:
+            # Count quotes up to the target to know whether it is inside a field
+            while position < target:
+                data = file.read(min(SCAN_BLOCK_SIZE, target - position))
+                if not data:
+                    break
+                quotes += data.count(b'"')
+                position += len(data)
+
+            boundary = None
+            while boundary is None:
+                data = file.read(SCAN_BLOCK_SIZE)
+                if not data:
+                    boundary = file_size
+                    break
+                start = 0
+                while True:
+                    newline = data.find(b'\n', start)
+                    if newline == -1:
+                        quotes += data.count(b'"', start)
+                        position += len(data)
+                        break
+                    quotes += data.count(b'"', start, newline)
+                    if quotes % 2 == 0:
+                        boundary = position + newline + 1
+                        break
+                    start = newline + 1
+
+            boundaries.append(boundary)
+            position = boundary
+            file.seek(boundary)
+
+    return boundaries
+
+
+def split_csv(filepath, chunk_count):
+    """
+    Split a CSV file into its header and up to chunk_count data ranges.
+
+    Returns:
+        tuple: (fieldnames, list of (start, end) byte ranges)
+    """
+    file_size = os.path.getsize(filepath)
+    data_start = find_record_boundaries(filepath, [0])[0]
+
+    with open(filepath, 'rb') as file:
+        header = _decode(file.read(data_start))
+    fieldnames = next(csv.reader(header), None)
+
+    step = (file_size - data_start) / chunk_count
+    targets = [int(data_start + step * i) for i in range(1, chunk_count)]
+    cuts = [data_start] + find_record_boundaries(filepath, targets) + [file_size]
+
+    ranges = [(start, end) for start, end in zip(cuts, cuts[1:]) if end > start]
+    return fieldnames, ranges
+
+
+def _decode(data):
+    """Decode raw bytes the way open(..., encoding='utf-8') would, newlines included."""
+    return io.TextIOWrapper(io.BytesIO(data), encoding='utf-8')
+
+
+def _read_rows(filepath, start, end):
+    """Yield the non-blank rows of one byte range as lists of values."""
+    with open(filepath, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+    return (values for values in csv.reader(_decode(data)) if values)
+
+
+def _init_worker(cache_size, cache_items, row_log_limit):
+    """
+    Give each worker process its own validation cache, seeded from the
+    parent, and the parent's per-row logging limit.
+    """
+    global _worker_cache
+    _worker_cache = ValidationCache(cache_size)
+    _worker_cache.update(cache_items)
+    row_log.configure(row_log_limit)
+
+
+def _count_rows(task):
+    """Count the records in one range (blank lines are skipped, as DictReader does)."""
+    filepath, start, end = task
+    with open(filepath, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+    return sum(1 for row in csv.reader(_decode(data)) if row)
+
+
+def _validate_chunk(task):
+    """
+    Validate the rows of one range.
+
+    Returns:
+        tuple: (valid Payment records, invalid (row, row_number, errors) tuples,
+                cache hits, cache misses, newly cached verdicts,
+                per-row log message counts of this chunk)
+    """
+    filepath, start, end, fieldnames, first_row_number, keep_extra, aliases = task
+    cache = _worker_cache
+    hits, misses = cache.hits, cache.misses
+    cache.new_entries = []
+    log_counts = row_log.counts()
+
+    valid_payments = []
+    invalid_payments_data = []
+    schema = RowSchema(fieldnames, aliases, keep_extra)
+    groups = {} if schema.has_groups else None
+    for row_number, values in enumerate(_read_rows(filepath, start, end), start=first_row_number):
+        row = schema.row(values)
+        validation_errors, amount_cents = check_payment_row(row, row_number, cache)
+        if not validation_errors:
+            valid_payments.append(Payment.from_row(row, keep_extra, amount_cents, groups))
+        else:
+            invalid_payments_data.append((schema.full_row(values), row_number, validation_errors))
+
+    new_entries, cache.new_entries = cache.new_entries, None
+    chunk_log_counts = {category: count - log_counts.get(category, 0)
+                        for category, count in row_log.counts().items()
+                        if count != log_counts.get(category, 0)}
+    return (valid_payments, invalid_payments_data,
+            cache.hits - hits, cache.misses - misses, new_entries, chunk_log_counts)
+
+
+class ParallelPaymentReader(PaymentReader):
+    """
+    PaymentReader that validates rows in a pool of worker processes.
+
+    Iterating yields the valid payments in file order; invalid rows, their
+    row numbers and the error report are the same as with PaymentReader.
+    Each worker keeps its own validation cache, seeded from the parent's;
+    new verdicts are merged back into the parent cache as chunks complete.
+    """
+
+    def __init__(self, filepath, error_report_path=None, cache=None, keep_extra=False,
+                 max_error_rows=None, max_error_bytes=None, workers=2, aliases=None):
+        """
+        Args:
+            filepath: The path to the CSV file
+            error_report_path: Optional path for the CSV error report
+            cache: Optional ValidationCache (seeds the workers' caches)
+            keep_extra: If True, pass non-SEPA columns through in Payment.extra
+            max_error_rows: Optional cap on the rows written to the error report
+            max_error_bytes: Optional cap on the size of the error report
+            workers: Number of worker processes
+            aliases: Header names accepted for each column (see schema)
+        """
+        super().__init__(filepath, error_report_path, cache, keep_extra, max_error_rows, max_error_bytes,
+                         aliases=aliases)
+        self.workers = workers
+
+    def __iter__(self):
+        row_log.reset()
+        file_size = os.path.getsize(self.filepath)
+        chunk_count = max(self.workers * CHUNKS_PER_WORKER, file_size // MAX_CHUNK_BYTES + 1)
+        fieldnames, ranges = split_csv(self.filepath, chunk_count)
+        self._compile_schema(fieldnames)
+
+        logger.info(f"Validating {self.filepath} in {len(ranges)} chunk(s) with {self.workers} worker(s)")
+
+        with self._open_error_report(), ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.cache.maxsize, self.cache.items(), row_log.get_limit())
+        ) as pool:
+            # First pass: count records per chunk so every chunk knows its
+            # first row number (error messages include it)
+            counts = pool.map(_count_rows, [(self.filepath, start, end) for start, end in ranges])
+            tasks = []
+            row_number = 2  # Row 1 is the header
+            for (start, end), count in zip(ranges, counts):
+                tasks.append((self.filepath, start, end, fieldnames, row_number, self.keep_extra,
+                              self.aliases))
+                row_number += count
+
+            # Second pass: validate with a bounded window of chunks in flight,
+            # collecting results in file order
+            pending = deque()
+            tasks = iter(tasks)
+            for task in tasks:
+                pending.append(pool.submit(_validate_chunk, task))
+                if len(pending) >= self.workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                    break
+
+            while pending:
+                valid_payments, invalid_rows, hits, misses, new_entries, log_counts = pending.popleft().result()
+                for task in tasks:
+                    pending.append(pool.submit(_validate_chunk, task))
+                    break
+
+                self.cache.hits += hits
+                self.cache.misses += misses
+                self.cache.update(new_entries)
+                row_log.merge(log_counts)
+
+                for row, row_number, validation_errors in invalid_rows:
+                    self._reject(row, row_number, validation_errors)
+
+                self.valid_count += len(valid_payments)
+                yield from valid_payments
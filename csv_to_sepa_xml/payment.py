@@ -0,0 +1,154 @@
+"""
+Compact record for one validated payment.
+"""
+
+from collections import namedtuple
+
+from .validation import amount_to_cents
+
+# The CSV columns that end up in the SEPA XML
+SEPA_FIELDS = ('name', 'iban', 'bic', 'amount', 'reference')
+
+# Optional CSV columns that put payments into separate PmtInf blocks
+GROUP_COLUMNS = ('execution_date', 'currency', 'debtor_name', 'debtor_iban', 'debtor_bic')
+
+# Execution date, currency and debtor account shared by one PmtInf block.
+# Empty fields fall back to today, EUR and the configured company.
+PaymentGroup = namedtuple('PaymentGroup', GROUP_COLUMNS)
+
+
+def format_cents(cents, grouping=False):
+    """
+    Format integer cents as a decimal amount.
+
+    Args:
+        cents: Amount in cents (e.g. 150050)
+        grouping: If True, add thousands separators ("1,500.50")
+
+    Returns:
+        str: The amount with exactly two decimals ("1500.50")
+    """
+    sign = '-' if cents < 0 else ''
+    whole, fraction = divmod(abs(cents), 100)
+    if grouping:
+        return f"{sign}{whole:,}.{fraction:02d}"
+    return f"{sign}{whole}.{fraction:02d}"
+
+
+class Payment:
+    """
+    One payment, holding only the SEPA fields.
+
+    Uses __slots__ instead of the dict csv.DictReader produces. On the
+    7-column sample from examples/generate_large_sample.py (64-bit CPython,
+    measured with tracemalloc) a row dict with its strings takes about
+    730 bytes per payment; a Payment takes about 400 bytes (88 for the
+    object, the rest for its five field strings).
+
+    Columns other than the SEPA fields are dropped unless the reader is
+    asked to keep them, in which case they are passed through in `extra`.
+
+    Text values are kept exactly as they appear in the CSV. The amount is
+    stored as exact integer cents, parsed once during validation, so totals
+    are integer sums without float rounding.
+
+    `group` is the PaymentGroup built from the GROUP_COLUMNS, or None when
+    the CSV has none of them (everything goes into one PmtInf block).
+    Payments of the same group share one PaymentGroup object.
+    """
+
+    __slots__ = ('name', 'iban', 'bic', 'amount_cents', 'reference', 'extra', 'group')
+
+    def __init__(self, name, iban, bic, amount_cents, reference, extra=None, group=None):
+        """
+        Args:
+            name: Beneficiary name
+            iban: Beneficiary IBAN
+            bic: Beneficiary BIC (may be empty)
+            amount_cents: Amount in cents (int)
+            reference: Payment reference (may be empty)
+            extra: Optional dictionary of the remaining CSV columns
+            group: Optional PaymentGroup (execution date, currency, debtor)
+        """
+        self.name = name
+        self.iban = iban
+        self.bic = bic
+        self.amount_cents = amount_cents
+        self.reference = reference
+        self.extra = extra
+        self.group = group
+
+    @classmethod
+    def from_row(cls, row, keep_extra=False, amount_cents=None, groups=None):
+        """
+        Build a Payment from a CSV row dictionary.
+
+        Args:
+            row: Dictionary as produced by csv.DictReader
+            keep_extra: If True, keep the non-SEPA columns in `extra`
+            amount_cents: Amount already parsed by validation; parsed from
+                          row['amount'] if omitted
+            groups: Dictionary used to share PaymentGroup objects between
+                    payments; pass one per file when the CSV has GROUP_COLUMNS
+                    (see schema.RowSchema.has_groups), or None to skip grouping
+        """
+        get = row.get
+        if amount_cents is None:
+            amount_cents = amount_to_cents(get('amount', 0))
+        extra = None
+        if keep_extra:
+            extra = {key: value for key, value in row.items()
+                     if key not in SEPA_FIELDS and key not in GROUP_COLUMNS} or None
+        group = None
+        if groups is not None:
+            key = tuple((get(column) or '').strip() for column in GROUP_COLUMNS)
+            if any(key):
+                group = groups.get(key)
+                if group is None:
+                    group = groups[key] = PaymentGroup(*key)
+        return cls(get('name', ''), get('iban', ''), get('bic', ''), amount_cents,
+                   get('reference', ''), extra, group)
+
+    @property
+    def amount(self):
+        """The amount as a string with two decimals (e.g. "1500.00")."""
+        return format_cents(self.amount_cents)
+
+    def get(self, key, default=None):
+        """Dictionary-style access, for code written against the old row dicts."""
+        if key in SEPA_FIELDS:
+            return getattr(self, key)
+        if key in GROUP_COLUMNS and self.group is not None:
+            return getattr(self.group, key)
+        if self.extra is not None:
+            return self.extra.get(key, default)
+        return default
+
+    def to_dict(self):
+        """Return the payment as a row dictionary (SEPA fields first, then group columns and extras)."""
+        row = {field: getattr(self, field) for field in SEPA_FIELDS}
+        if self.group is not None:
+            row.update(self.group._asdict())
+        if self.extra:
+            row.update(self.extra)
+        return row
+
+    def __eq__(self, other):
+        if not isinstance(other, Payment):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    def __repr__(self):
+        return f"Payment(name={self.name!r}, iban={self.iban!r}, amount={self.amount!r})"
+
+    def __reduce__(self):
+        # Plain positional tuple: much cheaper to pickle between worker processes
+        return (Payment, (self.name, self.iban, self.bic, self.amount_cents, self.reference, self.extra,
+                         self.group))
+
+
+def as_payment(payment):
+    """Return payment as a Payment, converting row dictionaries."""
+    if isinstance(payment, Payment):
+        return payment
+    return Payment.from_row(payment, groups={})
@@ -0,0 +1,119 @@
+"""
+Per-row log messages, counted by category.
+
+Validation can produce a warning or error for every row of a file: empty
+references, BIC/IBAN country mismatches, invalid rows. On a dirty
+million-row file, writing all of them costs more than the validation
+itself. Every per-row message therefore goes through this module with a
+category. The message is counted, and in summary mode only the first few
+of each category are logged. log_summary() then logs the totals per
+category (PaymentReader.finish() calls it).
+
+Counts are kept per thread, and a reader resets them when it starts
+reading, so each summary covers one conversion, even when several run
+one after the other or in threads of the same process. The limit is
+process-wide.
+
+Messages use logging's lazy %-style arguments, so a suppressed message
+is never formatted.
+
+Usage:
+    row_log.warning(logger, 'empty_reference', "Row %d ('%s'): Reference is empty", 7, name)
+    ...
+    row_log.log_summary(logger)
+"""
+
+import logging
+import threading
+
+# Examples logged per category (None: log every message)
+_limit = None
+
+# Messages seen per category since the last reset or summary, per thread
+_local = threading.local()
+
+
+def _counts():
+    """Return the current thread's counts."""
+    counts = getattr(_local, 'counts', None)
+    if counts is None:
+        counts = _local.counts = {}
+    return counts
+
+
+def configure(limit=None):
+    """
+    Set how many messages of each category are logged.
+
+    Args:
+        limit: Number of example messages per category, or None to log all
+    """
+    global _limit
+    _limit = limit
+
+
+def get_limit():
+    """Return the configured number of examples per category (None: unlimited)."""
+    return _limit
+
+
+def reset():
+    """Forget the counts of this thread (at the start of a conversion)."""
+    _local.counts = {}
+
+
+def log(logger, level, category, message, *args):
+    """
+    Count a per-row message and log it unless its category is over the limit.
+
+    Args:
+        logger: Logger to emit the message on
+        level: Logging level (e.g. logging.WARNING)
+        category: Short name the message is counted under
+        message: %-style format string
+        *args: Arguments for the format string
+    """
+    counts = _counts()
+    count = counts.get(category, 0) + 1
+    counts[category] = count
+    if _limit is None or count <= _limit:
+        logger.log(level, message, *args)
+
+
+def warning(logger, category, message, *args):
+    """log() at WARNING level."""
+    log(logger, logging.WARNING, category, message, *args)
+
+
+def error(logger, category, message, *args):
+    """log() at ERROR level."""
+    log(logger, logging.ERROR, category, message, *args)
+
+
+def counts():
+    """Return a copy of this thread's message counts per category."""
+    return dict(_counts())
+
+
+def merge(other_counts):
+    """Add counts collected elsewhere (e.g. in a worker process) without logging."""
+    counts = _counts()
+    for category, count in other_counts.items():
+        counts[category] = counts.get(category, 0) + count
+
+
+def log_summary(logger):
+    """
+    Log one line per category with its total, then reset the counts.
+
+    Returns:
+        dict: The counts that were summarized
+    """
+    summarized = _counts()
+    reset()
+    for category, count in sorted(summarized.items()):
+        if _limit is not None and count > _limit:
+            logger.warning(f"{category}: {count:,} message(s), first {_limit} logged")
+        else:
+            logger.info(f"{category}: {count:,} message(s)")
+    return summarized
@@ -0,0 +1,147 @@
+"""
+Column schema of a CSV file, compiled once from its header.
+
+Bank exports rarely use our column names: "Beneficiary", "IBAN",
+"SWIFT", "Betrag", "Verwendungszweck"... RowSchema maps the header onto
+the SEPA and grouping columns once per file, through a table of aliases
+matched case-insensitively (spaces and hyphens count as underscores).
+Rows then come from csv.reader as lists and are turned into small
+dictionaries of the needed columns by position, instead of a
+csv.DictReader dictionary of every column.
+
+Usage:
+    schema = RowSchema(next(rows))
+    check_columns(schema.columns)
+    for values in rows:
+        row = schema.row(values)        # {'name': ..., 'iban': ..., ...}
+"""
+
+import operator
+
+from .config import COLUMN_ALIASES
+from .payment import SEPA_FIELDS, GROUP_COLUMNS
+
+
+def normalize_header(name):
+    """Return the form header names are compared in ("Account Holder" -> "account_holder")."""
+    return name.strip().casefold().replace(' ', '_').replace('-', '_')
+
+
+def parse_column_aliases(specs, aliases=None):
+    """
+    Add aliases given as "column=Header name" strings (the --column-alias option).
+
+    Args:
+        specs: Strings like "name=Beneficiary" or "reference=Purpose"
+        aliases: Table to extend; defaults to config.COLUMN_ALIASES
+
+    Returns:
+        A new alias table (column -> tuple of header names)
+
+    Raises:
+        ValueError: If a string is malformed or names an unknown column
+    """
+    aliases = dict(COLUMN_ALIASES if aliases is None else aliases)
+    for spec in specs or ():
+        column, separator, header = spec.partition('=')
+        column = column.strip()
+        if not separator or not header.strip():
+            raise ValueError(f"Column alias must look like COLUMN=HEADER, got '{spec}'")
+        if column not in SEPA_FIELDS and column not in GROUP_COLUMNS:
+            raise ValueError(f"Unknown column '{column}' in alias '{spec}' "
+                             f"(expected one of: {', '.join(SEPA_FIELDS + GROUP_COLUMNS)})")
+        aliases[column] = tuple(aliases.get(column, ())) + (header.strip(),)
+    return aliases
+
+
+class RowSchema:
+    """
+    Positions of the SEPA and grouping columns in one CSV header.
+
+    A column whose header is the column's own name wins over an alias (the
+    last one, if the name repeats, as with csv.DictReader); otherwise the
+    first alias in table order that the header contains is used.
+
+    Attributes:
+        fieldnames: The header as it appears in the file
+        columns: Column names of the dictionaries row() builds, in the
+                 order of indexes (our names; with keep_extra also every
+                 unmapped column under its own header name)
+        indexes: Position of each of those columns in a row
+        has_groups: True if any of the GROUP_COLUMNS was found
+    """
+
+    def __init__(self, fieldnames, aliases=None, keep_extra=False):
+        """
+        Args:
+            fieldnames: The header row (list of strings), or None for an empty file
+            aliases: Alias table (column -> header names); defaults to
+                     config.COLUMN_ALIASES
+            keep_extra: If True, row() also returns the unmapped columns
+        """
+        self.fieldnames = list(fieldnames or ())
+        self.keep_extra = keep_extra
+        if aliases is None:
+            aliases = COLUMN_ALIASES
+
+        headers = {}
+        for index, name in enumerate(self.fieldnames):
+            headers.setdefault(normalize_header(name), []).append(index)
+
+        positions = {}
+        for column in SEPA_FIELDS + GROUP_COLUMNS:
+            if column in self.fieldnames:
+                positions[column] = len(self.fieldnames) - 1 - self.fieldnames[::-1].index(column)
+                continue
+            for name in (column,) + tuple(aliases.get(column, ())):
+                found = [index for index in headers.get(normalize_header(name), ())
+                         if index not in positions.values()]
+                if found:
+                    positions[column] = found[0]
+                    break
+
+        if keep_extra:
+            mapped = set(positions.values())
+            ours = set(positions)
+            for index, name in enumerate(self.fieldnames):
+                if index not in mapped and name not in ours:
+                    positions[name] = index  # The last of a repeated name wins, as with DictReader
+
+        self.columns = tuple(positions)
+        self.indexes = tuple(positions.values())
+        self.has_groups = not set(GROUP_COLUMNS).isdisjoint(self.columns)
+        self._width = max(self.indexes) + 1 if self.indexes else 0
+        self._pick = operator.itemgetter(*self.indexes) if len(self.indexes) > 1 else None
+
+    def renamed(self):
+        """Return {header name: column} for the columns found under an alias."""
+        return {self.fieldnames[index]: column for column, index in zip(self.columns, self.indexes)
+                if self.fieldnames[index] != column}
+
+    def row(self, values):
+        """
+        Build the dictionary of one row under our column names.
+
+        Columns missing from a short row are empty strings. With keep_extra,
+        values beyond the header go under the None key (as with DictReader).
+        """
+        if len(values) >= self._width and self._pick is not None:
+            row = dict(zip(self.columns, self._pick(values)))
+        else:
+            count = len(values)
+            row = {column: values[index] if index < count else ''
+                   for column, index in zip(self.columns, self.indexes)}
+        if self.keep_extra and len(values) > len(self.fieldnames):
+            row[None] = values[len(self.fieldnames):]
+        return row
+
+    def full_row(self, values):
+        """Build the csv.DictReader dictionary of a row, under the header names (for error reports)."""
+        fieldnames = self.fieldnames
+        row = dict(zip(fieldnames, values))
+        if len(values) > len(fieldnames):
+            row[None] = values[len(fieldnames):]
+        elif len(values) < len(fieldnames):
+            for key in fieldnames[len(values):]:
+                row[key] = None
+        return row
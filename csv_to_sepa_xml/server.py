@@ -0,0 +1,405 @@
+"""
+Local HTTP conversion service (the --serve option).
+
+A small asyncio HTTP/1.1 server, standard library only, bound to
+127.0.0.1. Other tools POST a CSV and get the pain.001 XML back without
+shelling out to the CLI or managing temporary files themselves.
+
+Endpoints:
+    POST /convert   CSV request body (Content-Length or chunked). Replies
+                    200 with the XML, or 422 with a JSON error report when
+                    rows are invalid (add ?force=1 to get the XML for the
+                    valid rows anyway). Query parameters debtor_name,
+                    debtor_iban and debtor_bic override the server defaults.
+    GET /health     JSON status with the number of conversions running.
+
+The upload is streamed to a temporary file and the reply is streamed from
+one, so neither is held in memory. The conversion itself (the batch-mode
+convert_file(): validation and XML generation) runs in a process pool;
+a semaphore limits how many conversions run at once, and further requests
+wait for a free slot. Only the conversion holds a slot: the upload is
+spooled before it and the reply sent after it, so slow clients never
+keep the pool idle.
+
+Usage:
+    curl --data-binary @payments.csv http://127.0.0.1:8765/convert > payments.xml
+"""
+
+import asyncio
+import csv
+import json
+import logging
+import os
+import signal
+import tempfile
+from urllib.parse import urlsplit, parse_qs
+
+from .batch import create_pool, submit_file, conversion_options
+from .ids import SequenceIds
+from .validation_cache import ValidationCache
+from .config import DEFAULT_VALIDATION_CACHE_SIZE, DEFAULT_SERVER_PORT, DEFAULT_MAX_CONCURRENT
+
+logger = logging.getLogger(__name__)
+
+# The service is for tools on the same machine only
+LOCALHOST = '127.0.0.1'
+
+# Largest accepted upload
+MAX_BODY_BYTES = 1024 * 1024 * 1024
+
+# Bytes read from or written to a socket at a time
+CHUNK_SIZE = 64 * 1024
+
+# Seconds a client may take to send the request line and headers
+HEADER_TIMEOUT = 30
+
+REASONS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    411: 'Length Required', 413: 'Payload Too Large', 422: 'Unprocessable Entity',
+    500: 'Internal Server Error',
+}
+
+
+class HttpError(Exception):
+    """A request that is answered with an error status and a JSON message."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+async def read_request_head(reader):
+    """
+    Read the request line and headers.
+
+    Returns:
+        tuple: (method, target, headers with lower-case names), or None if
+               the client closed the connection without sending anything
+    """
+    try:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, target, _version = request_line.decode('latin-1').split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+    except ValueError:
+        raise HttpError(400, "Malformed request line or header")
+    return method.upper(), target, headers
+
+
+async def read_body(reader, headers, file, max_bytes=MAX_BODY_BYTES):
+    """
+    Copy the request body to a file, a chunk at a time.
+
+    Supports Content-Length and chunked transfer encoding.
+
+    Returns:
+        Number of body bytes written
+    """
+    written = 0
+
+    async def copy(count):
+        nonlocal written
+        if written + count > max_bytes:
+            raise HttpError(413, f"Request body is larger than {max_bytes} bytes")
+        while count:
+            data = await reader.read(min(count, CHUNK_SIZE))
+            if not data:
+                raise HttpError(400, "Request body ended early")
+            file.write(data)
+            written += len(data)
+            count -= len(data)
+
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        while True:
+            size_line = await reader.readline()
+            try:
+                size = int(size_line.split(b';')[0], 16)
+            except ValueError:
+                raise HttpError(400, "Malformed chunk size")
+            if size == 0:
+                # Skip trailers up to the blank line
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return written
+            await copy(size)
+            await reader.readline()  # CRLF after the chunk
+
+    if 'content-length' not in headers:
+        raise HttpError(411, "Content-Length or chunked transfer encoding required")
+    try:
+        length = int(headers['content-length'])
+    except ValueError:
+        raise HttpError(400, "Invalid Content-Length")
+    await copy(length)
+    return written
+
+
+async def send_response(writer, status, content_type, body=b'', path=None, headers=None):
+    """
+    Send a response with a bytes body, or with the content of a file
+    streamed in chunks (waiting for the client to keep up).
+    """
+    length = os.path.getsize(path) if path is not None else len(body)
+    head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {length}",
+            "Connection: close"]
+    for name, value in (headers or {}).items():
+        head.append(f"{name}: {value}")
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+    if path is None:
+        writer.write(body)
+    else:
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+                writer.write(chunk)
+                await writer.drain()
+    await writer.drain()
+
+
+async def send_json(writer, status, data):
+    """Send a small JSON response."""
+    await send_response(writer, status, 'application/json', json.dumps(data).encode('utf-8'))
+
+
+def write_error_json(result, report_path, json_path):
+    """
+    Turn a conversion result and its CSV error report into the JSON
+    error report sent back for a rejected upload.
+
+    The rows are copied one at a time, so a large report is never held
+    in memory.
+    """
+    with open(json_path, 'w', encoding='utf-8') as out:
+        out.write(json.dumps({
+            'error': result['error'] or f"{result['invalid']} invalid row(s)",
+            'payments': result['payments'],
+            'invalid_rows': result['invalid'],
+        })[:-1])
+        out.write(', "rows": [')
+        if report_path is not None and os.path.exists(report_path):
+            with open(report_path, 'r', encoding='utf-8', newline='') as report:
+                for number, row in enumerate(csv.DictReader(report)):
+                    if number:
+                        out.write(', ')
+                    row_number = row.pop('row_number')
+                    errors = row.pop('error_details')
+                    out.write(json.dumps({
+                        'row_number': int(row_number),
+                        'errors': errors.split(' | '),
+                        'data': row,
+                    }))
+        out.write(']}\n')
+
+
+class ConversionServer:
+    """
+    asyncio HTTP server converting uploaded CSVs in a process pool.
+    """
+
+    def __init__(self, company, port=DEFAULT_SERVER_PORT, workers=1, max_concurrent=DEFAULT_MAX_CONCURRENT,
+                 streaming=False, cache=None, max_body_bytes=MAX_BODY_BYTES, id_generator=None,
+                 convert_options=None):
+        """
+        Args:
+            company: Default (debtor name, IBAN, BIC) overrides, None for the config defaults
+            port: Port on 127.0.0.1 to listen on (0 picks a free one)
+            workers: Worker processes doing the conversions
+            max_concurrent: Conversions running at the same time
+            streaming: If True, convert in one constant-memory pass
+            cache: ValidationCache the workers' caches are seeded from
+            max_body_bytes: Largest accepted upload
+            id_generator: Where the documents get their ids (default: ClockIds,
+                          numbered by the uploads converted since start)
+            convert_options: Further keyword arguments of batch.convert_file()
+                             (reader_engine, aliases, duplicate_policy, ...)
+        """
+        self.company = company
+        self.port = port
+        self.workers = max(1, workers)
+        self.max_concurrent = max(1, max_concurrent)
+        self.streaming = streaming
+        self.cache = cache if cache is not None else ValidationCache(DEFAULT_VALIDATION_CACHE_SIZE)
+        self.max_body_bytes = max_body_bytes
+        self.id_generator = id_generator
+        self.convert_options = convert_options or {}
+        self.active = 0
+        self.served = 0
+        self._numbered = 0  # Uploads given document numbers so far
+        self._pool = None
+        self._slots = None
+        self._server = None
+
+    async def start(self):
+        """Start the pool and listen; returns once the socket is bound."""
+        self._pool = create_pool(self.workers, self.cache, ignore_interrupts=True,
+                                 id_generator=self.id_generator)
+        # Fork the workers now: a worker forked later would inherit (and
+        # keep open) the client sockets accepted so far
+        await asyncio.gather(*(asyncio.wrap_future(self._pool.submit(os.getpid))
+                               for _ in range(self.workers)))
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._server = await asyncio.start_server(self.handle, LOCALHOST, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Serving on http://{LOCALHOST}:{self.port} with {self.workers} worker(s), "
+                    f"{self.max_concurrent} concurrent conversion(s)")
+
+    async def close(self):
+        """Stop listening, let running requests finish, then stop the pool."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._pool is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._pool.shutdown)
+            self._pool = None
+        logger.info(f"Server stopped after {self.served} request(s)")
+
+    async def handle(self, reader, writer):
+        """Answer one request (one request per connection)."""
+        try:
+            head = await asyncio.wait_for(read_request_head(reader), HEADER_TIMEOUT)
+            if head is None:
+                return
+            method, target, headers = head
+            url = urlsplit(target)
+            self.served += 1
+            if url.path == '/health':
+                if method != 'GET':
+                    raise HttpError(405, "Use GET")
+                await send_json(writer, 200, {'status': 'ok', 'active': self.active,
+                                              'max_concurrent': self.max_concurrent})
+            elif url.path == '/convert':
+                if method != 'POST':
+                    raise HttpError(405, "Use POST with the CSV as request body")
+                await self.convert(reader, writer, headers, parse_qs(url.query))
+            else:
+                raise HttpError(404, f"Unknown path: {url.path}")
+        except HttpError as e:
+            logger.warning(f"HTTP {e.status}: {e}")
+            await send_json(writer, e.status, {'error': str(e)})
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.exception("Request failed")
+            try:
+                await send_json(writer, 500, {'error': str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def convert(self, reader, writer, headers, query):
+        """Handle POST /convert: upload, convert in the pool, stream the reply."""
+        company = tuple(query.get(name, [default])[0]
+                        for name, default in zip(('debtor_name', 'debtor_iban', 'debtor_bic'), self.company))
+        force = query.get('force', ['0'])[0].lower() in ('1', 'true', 'yes')
+
+        with tempfile.TemporaryDirectory(prefix='sepa_http_') as work_dir:
+            csv_path = os.path.join(work_dir, 'upload.csv')
+            xml_path = os.path.join(work_dir, 'upload.xml')
+            # Spooled before taking a slot, so slow uploads never hold up conversions
+            with open(csv_path, 'wb') as file:
+                size = await read_body(reader, headers, file, self.max_body_bytes)
+
+            async with self._slots:
+                self.active += 1
+                try:
+                    self._numbered += 1
+                    future = submit_file(self._pool, csv_path, xml_path, company, self.streaming,
+                                         error_report_dir=work_dir, number=self._numbered,
+                                         convert_options=self.convert_options)
+                    result = await asyncio.wrap_future(future)
+                finally:
+                    self.active -= 1
+            logger.info(f"Converted upload of {size} bytes: {result['payments']} payment(s), "
+                        f"{result['invalid']} invalid row(s)")
+
+            if result['ok'] and (force or not result['invalid']):
+                await send_response(writer, 200, 'application/xml; charset=utf-8', path=xml_path, headers={
+                    'X-Payments': result['payments'],
+                    'X-Invalid-Rows': result['invalid'],
+                    'X-Total-Cents': result['total_cents'],
+                })
+            else:
+                json_path = os.path.join(work_dir, 'errors.json')
+                write_error_json(result, os.path.join(work_dir, 'upload_errors.csv'), json_path)
+                await send_response(writer, 422, 'application/json', path=json_path)
+
+
+async def serve(server, stop_event):
+    """Run the server until stop_event is set."""
+    await server.start()
+    try:
+        await stop_event.wait()
+    finally:
+        await server.close()
+
+
+def run_server_mode(port=DEFAULT_SERVER_PORT, debtor_name=None, debtor_iban=None, debtor_bic=None, workers=1,
+                    max_concurrent=DEFAULT_MAX_CONCURRENT, streaming=False, cache_path=None,
+                    cache_size=DEFAULT_VALIDATION_CACHE_SIZE, id_sequence=None, reader_engine='csv',
+                    column_aliases=None, duplicate_policy=None, duplicate_memory_mb=None):
+    """
+    Run the HTTP conversion service on 127.0.0.1 until interrupted.
+
+    Arguments:
+        port: Port to listen on
+        debtor_name: Optional default override for company name
+        debtor_iban: Optional default override for company IBAN
+        debtor_bic: Optional default override for company BIC
+        workers: Worker processes doing the conversions
+        max_concurrent: Conversions running at the same time
+        streaming: If True, convert in one constant-memory pass
+        cache_path: Optional validation cache snapshot to seed the workers with
+        cache_size: Maximum number of cached IBAN/BIC validation results
+        id_sequence: Optional counter file to number the document ids from
+                     (see ids.SequenceIds); default: ids from the creation time
+        reader_engine: 'csv' or 'mmap' CSV reader (see cli.open_payment_reader)
+        column_aliases: Extra "column=Header name" aliases (see schema.parse_column_aliases)
+        duplicate_policy: 'warn', 'keep-first' or 'reject' to look for duplicate
+                          payments in each file (see duplicates); None to skip the check
+        duplicate_memory_mb: Bloom filter size for the duplicate check, in MB
+
+    Returns:
+        Exit code (0 after a clean stop, 1 if the server could not start)
+    """
+    try:
+        options = conversion_options(reader_engine, column_aliases, duplicate_policy, duplicate_memory_mb)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        logger.error(f"Server could not start: {e}")
+        return 1
+    cache = ValidationCache(cache_size)
+    if cache_path:
+        cache.load(cache_path)
+    server = ConversionServer((debtor_name, debtor_iban, debtor_bic), port, workers, max_concurrent,
+                              streaming, cache, id_generator=SequenceIds(id_sequence) if id_sequence else None,
+                              convert_options=options)
+
+    async def main():
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows: Ctrl+C raises KeyboardInterrupt instead
+        await serve(server, stop_event)
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"ERROR: Could not start server: {e}")
+        logger.error(f"Could not start server: {e}")
+        return 1
+    return 0
@@ -0,0 +1,225 @@
+"""
+Splitting large batches into several pain.001 files.
+
+Banks cap the number of transactions or the size of one pain.001 file.
+The validated payments are cut into shards that respect those limits;
+every shard is a complete document with its own MsgId, NbOfTxs and
+CtrlSum, the shards are serialized in parallel, and a JSON manifest lists
+them all.
+"""
+
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from .clock import run_time
+
+from .compression import compression_for_output, open_text_output, split_compression_suffix
+from .config import DEFAULT_COMPRESSION_LEVEL
+from .ids import ClockIds
+from .payment import format_cents
+from .xml_builder import SepaXmlWriter
+
+logger = logging.getLogger(__name__)
+
+
+def shard_paths(output_file, shard_count):
+    """
+    Return the file name of every shard and of the manifest.
+
+    "payments.xml" with 3 shards gives payments_001.xml ... payments_003.xml
+    and payments_manifest.json; "payments.xml.gz" gives payments_001.xml.gz
+    and so on.
+    """
+    name, compression_suffix = split_compression_suffix(output_file)
+    base, extension = os.path.splitext(name)
+    width = max(3, len(str(shard_count)))
+    paths = [f"{base}_{number:0{width}d}{extension or '.xml'}{compression_suffix}"
+             for number in range(1, shard_count + 1)]
+    return paths, f"{base}_manifest.json"
+
+
+def plan_shards(payments, max_tx_per_file=None, max_bytes_per_file=None, writer=None, group=None):
+    """
+    Cut the payments into consecutive ranges that respect the limits.
+
+    The byte limit is exact: every transaction is rendered once to measure
+    its UTF-8 size, and the header and footer sizes are included.
+
+    Arguments:
+        payments: List of Payment records
+        max_tx_per_file: Maximum transactions per file (None for no limit)
+        max_bytes_per_file: Maximum file size in bytes (None for no limit)
+        writer: SepaXmlWriter configured like the one that will write the
+                shards (only needed with max_bytes_per_file)
+        group: PaymentGroup written in the shard headers, if any
+
+    Returns:
+        A list of (start, end) index ranges into payments
+
+    Raises:
+        ValueError: If a limit is not positive or a single transaction
+                    does not fit into max_bytes_per_file
+    """
+    if max_tx_per_file is not None and max_tx_per_file < 1:
+        raise ValueError(f"Maximum transactions per file must be at least 1 (got {max_tx_per_file})")
+    if max_bytes_per_file is not None and max_bytes_per_file < 1:
+        raise ValueError(f"Maximum bytes per file must be at least 1 (got {max_bytes_per_file})")
+
+    if max_bytes_per_file is None:
+        step = max_tx_per_file or max(len(payments), 1)
+        return [(start, min(start + step, len(payments))) for start in range(0, len(payments), step)]
+
+    # Header size grows with the digits of NbOfTxs and CtrlSum, which both appear twice
+    header_base = (len(writer.render_header(0, 0, group).encode('utf-8'))
+                   - 2 * len('0') - 2 * len(format_cents(0)))
+    footer_size = len(writer.render_footer().encode('utf-8'))
+
+    ranges = []
+    start = 0
+    count = 0
+    total = 0
+    body_size = 0
+    for index, payment in enumerate(payments):
+        tx_size = len(writer.render_transaction(payment, index + 1).encode('utf-8'))
+        new_total = total + payment.amount_cents
+        size = (header_base + 2 * len(str(count + 1)) + 2 * len(format_cents(new_total))
+                + body_size + tx_size + footer_size)
+
+        full = max_tx_per_file is not None and count >= max_tx_per_file
+        if count and (full or size > max_bytes_per_file):
+            ranges.append((start, index))
+            start, count, total, body_size = index, 0, 0, 0
+            new_total = payment.amount_cents
+            size = (header_base + 2 + 2 * len(format_cents(new_total))
+                    + tx_size + footer_size)
+
+        if size > max_bytes_per_file:
+            raise ValueError(f"Transaction {index + 1} does not fit into {max_bytes_per_file} bytes "
+                             f"(needs {size} bytes including header)")
+
+        count += 1
+        total = new_total
+        body_size += tx_size
+
+    if count:
+        ranges.append((start, len(payments)))
+    return ranges
+
+
+def _write_shard(task):
+    """
+    Write one shard to disk (runs in a worker process).
+
+    Returns:
+        tuple: (path, number of transactions, control sum in cents, file size in bytes)
+    """
+    path, payments, first_index, company, ids, group, compression_level, created = task
+    total = sum(payment.amount_cents for payment in payments)
+
+    temp_path = path + '.part'
+    try:
+        with open_text_output(temp_path, compression_for_output(path), compression_level) as file:
+            writer = SepaXmlWriter(file, *company, created=created, ids=ids)
+            writer.write_header(len(payments), total, group)
+            for index, payment in enumerate(payments, start=first_index):
+                writer.write_transaction(payment, index)
+            writer.write_footer()
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return path, len(payments), total, os.path.getsize(path)
+
+
+def write_sharded_sepa_xml(payments, output_file, company_name=None, company_iban=None,
+                           company_bic=None, max_tx_per_file=None, max_bytes_per_file=None,
+                           workers=1, compression_level=DEFAULT_COMPRESSION_LEVEL, created=None, ids=None):
+    """
+    Write the payments as one or more SEPA XML files plus a JSON manifest.
+
+    EndToEndIds keep counting across shards, so they stay unique within
+    the batch. Each shard gets its own MsgId and PmtInfId: the batch's ids
+    with the shard number appended.
+
+    Shards hold a single PmtInf block, so all payments must share one
+    execution date, currency and debtor. With a .gz, .bz2 or .xz output
+    name every shard is compressed; the limits apply to the XML before
+    compression.
+
+    Arguments:
+        payments: List of Payment records from read_csv_file()
+        output_file: Output path; shards are named after it (see shard_paths)
+        company_name: Override for debtor name
+        company_iban: Override for debtor IBAN
+        company_bic: Override for debtor BIC
+        max_tx_per_file: Maximum transactions per file
+        max_bytes_per_file: Maximum file size in bytes
+        workers: Number of processes serializing shards at the same time
+        compression_level: Level for compressed shards, 1 (fastest) to 9 (smallest)
+        created: Creation time of the batch (default: the run time, see clock)
+        ids: DocumentIds of the batch; each shard gets DocumentIds.shard() of
+             them (default: made from the creation time)
+
+    Returns:
+        tuple: (manifest path, manifest as a dictionary)
+
+    Raises:
+        ValueError: If there are no payments (a manifest of no files is not
+                    a successful conversion), or they belong to more than
+                    one PmtInf block
+    """
+    if not payments:
+        raise ValueError("CSV file is empty or has no valid data")
+    groups = {payment.group for payment in payments}
+    if len(groups) > 1:
+        raise ValueError("Splitting into several files needs a single execution date, currency "
+                         f"and debtor, but the payments belong to {len(groups)} payment blocks")
+    group = groups.pop()
+
+    company = (company_name, company_iban, company_bic)
+    created = created or run_time()
+    ids = ids or ClockIds().document(created)
+
+    # Shard ids all have the same length, so the first one sizes them all
+    measuring_writer = SepaXmlWriter(None, *company, created=created, ids=ids.shard(1))
+    ranges = plan_shards(payments, max_tx_per_file, max_bytes_per_file, measuring_writer, group)
+    paths, manifest_path = shard_paths(output_file, len(ranges))
+
+    tasks = [(path, payments[start:end], start + 1, company, ids.shard(number), group, compression_level,
+              created)
+             for number, (path, (start, end)) in enumerate(zip(paths, ranges), start=1)]
+
+    logger.info(f"Writing {len(payments)} payments as {len(tasks)} file(s) with {workers} worker(s)")
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            results = list(pool.map(_write_shard, tasks))
+    else:
+        results = [_write_shard(task) for task in tasks]
+
+    shards = []
+    for task, (path, nb_of_txs, ctrl_sum, size) in zip(tasks, results):
+        shards.append({
+            'file': os.path.basename(path),
+            'message_id': task[4].message_id,
+            'nb_of_txs': nb_of_txs,
+            'ctrl_sum': format_cents(ctrl_sum),
+            'bytes': size,
+        })
+
+    total = sum(payment.amount_cents for payment in payments)
+    manifest = {
+        'created': created.strftime("%Y-%m-%dT%H:%M:%S"),
+        'nb_of_txs': len(payments),
+        'ctrl_sum': format_cents(total),
+        'files': len(shards),
+        'shards': shards,
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+        file.write('\n')
+
+    logger.info(f"Wrote {len(shards)} SEPA file(s), manifest: {manifest_path}")
+    return manifest_path, manifest
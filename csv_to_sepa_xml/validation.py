@@ -3,10 +3,72 @@ Validation functions for IBAN, BIC, and payment amounts.
 """
 
 import logging
+import string
+from datetime import date
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+from . import row_log
 from .config import SEPA_COUNTRY_IBAN_LENGTHS
 
 logger = logging.getLogger(__name__)
 
+# Letter-to-number table for the MOD-97 check (A=10, B=11, ..., Z=35)
+IBAN_LETTER_TABLE = str.maketrans({
+    letter: str(ord(letter) - ord('A') + 10) for letter in string.ascii_uppercase
+})
+
+# Every 2-character [0-9A-Z] pair mapped to (numeric value, 10 ** digit count),
+# so the country code and check digits fold into the remainder without
+# building a string.
+_IBAN_PAIR_TABLE = {
+    first + second: (int(digits), 10 ** len(digits))
+    for first in string.digits + string.ascii_uppercase
+    for second in string.digits + string.ascii_uppercase
+    for digits in [(first + second).translate(IBAN_LETTER_TABLE)]
+}
+
+
+def iban_mod97(iban):
+    """
+    Compute the ISO 7064 MOD-97-10 remainder of an IBAN.
+
+    Works piecewise instead of building one long digit string: the BBAN is
+    converted in one go (directly when it is all digits, which is the case
+    for most countries, through IBAN_LETTER_TABLE otherwise) and reduced
+    modulo 97, then the country code and check digits are folded in from a
+    precomputed table. Non-ASCII input takes the original
+    character-by-character path, so results stay identical for every input.
+
+    Args:
+        iban: IBAN without spaces
+
+    Returns:
+        int: The remainder modulo 97 (1 means the check digits are correct)
+
+    Raises:
+        ValueError: If the characters cannot be turned into a number
+    """
+    if iban.isascii():
+        bban = iban[4:]
+        if not bban.isdigit():
+            bban = bban.translate(IBAN_LETTER_TABLE)
+        remainder = int(bban) % 97 if bban else 0
+
+        pairs = _IBAN_PAIR_TABLE
+        if iban[:2] in pairs and iban[2:4] in pairs:
+            country_value, country_scale = pairs[iban[:2]]
+            check_value, check_scale = pairs[iban[2:4]]
+            return ((remainder * country_scale + country_value) * check_scale + check_value) % 97
+
+    rearranged = iban[4:] + iban[:4]
+    numeric_string = ""
+    for char in rearranged:
+        if char.isdigit():
+            numeric_string += char
+        else:
+            # A=10, B=11, ..., Z=35
+            numeric_string += str(ord(char) - ord('A') + 10)
+    return int(numeric_string) % 97
+
 
 def validate_iban(iban, name=""):
     """
@@ -48,22 +110,8 @@ def validate_iban(iban, name=""):
         return False, f"Wrong length for {country_code} (expected {expected_length} chars, got {actual_length})"
     
     # ISO 7064 MOD-97-10 check digit validation
-    # Move first 4 characters to the end
-    rearranged = iban[4:] + iban[:4]
-    
-    # Replace letters with numbers (A=10, B=11, ..., Z=35)
-    numeric_string = ""
-    for char in rearranged:
-        if char.isdigit():
-            numeric_string += char
-        else:
-            # A=10, B=11, ..., Z=35
-            numeric_string += str(ord(char) - ord('A') + 10)
-    
-    # Convert to integer and check modulo 97
     try:
-        numeric_value = int(numeric_string)
-        if numeric_value % 97 != 1:
+        if iban_mod97(iban) != 1:
             return False, "Invalid IBAN check digit (MOD-97 validation failed)"
     except ValueError:
         return False, "IBAN contains invalid characters for check digit calculation"
@@ -71,6 +119,29 @@ def validate_iban(iban, name=""):
     return True, None
 
 
+def validate_ibans(ibans):
+    """
+    Validate many IBANs in one call.
+    
+    Each distinct IBAN is checked once per batch, which pays off for payroll
+    and supplier files where the same accounts repeat.
+    
+    Args:
+        ibans: Iterable of IBAN strings
+        
+    Returns:
+        list: One (is_valid, error_message) tuple per IBAN, in input order
+    """
+    seen = {}
+    results = []
+    for iban in ibans:
+        result = seen.get(iban)
+        if result is None:
+            result = seen[iban] = validate_iban(iban)
+        results.append(result)
+    return results
+
+
 def validate_bic(bic, iban="", name=""):
     """
     Validate BIC/SWIFT code format.
@@ -114,33 +185,64 @@ def validate_bic(bic, iban="", name=""):
         return False, "BIC positions 9-11 (branch code) must be alphanumeric"
     
     # Cross-check country code with IBAN if provided
+    check_bic_country(bic, iban, name)
+    
+    return True, None
+
+
+def check_bic_country(bic, iban, name=""):
+    """
+    Warn when the BIC country code does not match the IBAN country code.
+    
+    This is a warning, not an error, as some cross-border scenarios might be valid.
+    
+    Args:
+        bic: A BIC that already passed validate_bic()
+        iban: IBAN of the same payment (may be empty)
+        name: Optional name for better error messages
+    """
     if iban and len(iban) >= 2:
         iban_country = iban[:2].upper()
         bic_country = bic[4:6].upper()
         if iban_country != bic_country:
-            logger.warning(f"BIC country code ({bic_country}) does not match IBAN country code ({iban_country}) for {name}")
-            # Note: This is a warning, not an error, as some cross-border scenarios might be valid
-    
-    return True, None
+            row_log.warning(logger, 'bic_country_mismatch',
+                            "BIC country code (%s) does not match IBAN country code (%s) for %s",
+                            bic_country, iban_country, name)
 
 
-def validate_amount(amount_str, name=""):
+def validate_amount_cents(amount_str, name=""):
     """
-    Validate payment amount.
+    Validate payment amount and parse it into exact integer cents.
+    
+    Plain amounts like "1500.00" or "890" are parsed with integer
+    arithmetic only; anything else (exponents, underscores, ...) goes
+    through float for the checks and Decimal for the exact value.
     
     Args:
         amount_str: The amount as a string
         name: Optional name for better error messages
         
     Returns:
-        tuple: (is_valid: bool, error_message: str or None, parsed_amount: float or None)
+        tuple: (is_valid: bool, error_message: str or None, cents: int or None)
     """
     # Check if empty
     if not amount_str or not str(amount_str).strip():
         return False, "Amount is empty", None
     
+    amount_str_clean = str(amount_str).strip()
+    
+    # Fast path: digits with an optional dot and up to 2 decimals
+    whole, dot, decimal_part = amount_str_clean.partition('.')
+    if (whole.isascii() and whole.isdigit()
+            and (not decimal_part or (decimal_part.isascii() and decimal_part.isdigit()))
+            and len(decimal_part) <= 2):
+        cents = int(whole) * 100 + (int(decimal_part.ljust(2, '0')) if decimal_part else 0)
+        if cents <= 0:
+            return False, f"Amount must be greater than 0 (got {float(amount_str_clean)})", None
+        return True, None, cents
+    
     try:
-        amount = float(str(amount_str).strip())
+        amount = float(amount_str_clean)
     except ValueError:
         return False, f"Amount is not a valid number: {amount_str}", None
     
@@ -149,26 +251,177 @@ def validate_amount(amount_str, name=""):
         return False, f"Amount must be greater than 0 (got {amount})", None
     
     # Check decimal places (max 2)
-    amount_str_clean = str(amount_str).strip()
     if '.' in amount_str_clean:
         decimal_part = amount_str_clean.split('.')[1]
         if len(decimal_part) > 2:
             return False, f"Amount cannot have more than 2 decimal places (got {len(decimal_part)})", None
     
-    return True, None, amount
+    # Exact value; rejects what float lets through but cannot be paid
+    # (inf, nan, or exponents like 1e-5 that hide extra decimals)
+    value = Decimal(amount_str_clean)
+    if not value.is_finite():
+        return False, f"Amount is not a valid number: {amount_str}", None
+    cents = value.scaleb(2)
+    if cents != cents.to_integral_value():
+        return False, "Amount cannot have more than 2 decimal places", None
+    
+    return True, None, int(cents)
 
 
-def validate_payment_row(row, row_number):
+def validate_amount(amount_str, name=""):
+    """
+    Validate payment amount.
+    
+    Args:
+        amount_str: The amount as a string
+        name: Optional name for better error messages
+        
+    Returns:
+        tuple: (is_valid: bool, error_message: str or None, parsed_amount: float or None)
+    """
+    is_valid, error, cents = validate_amount_cents(amount_str, name)
+    if not is_valid:
+        return False, error, None
+    return True, None, float(str(amount_str).strip())
+
+
+def amount_to_cents(amount):
+    """
+    Convert an amount (string, int, float or Decimal) to integer cents.
+    
+    Meant for amounts that did not go through validate_amount_cents(), such
+    as row dictionaries passed straight to the XML builder; values with more
+    than 2 decimals are rounded half-even, like the old "%.2f" formatting.
+    
+    Raises:
+        ValueError: If the amount is not a finite number
+    """
+    if isinstance(amount, int):
+        return amount * 100
+    try:
+        value = Decimal(repr(amount) if isinstance(amount, float) else str(amount).strip() or 0)
+    except InvalidOperation:
+        raise ValueError(f"Amount is not a valid number: {amount}")
+    if not value.is_finite():
+        raise ValueError(f"Amount is not a valid number: {amount}")
+    return int(value.scaleb(2).quantize(1, rounding=ROUND_HALF_EVEN))
+
+
+def validate_execution_date(date_str):
+    """
+    Validate a requested execution date (ISO format, e.g. "2024-03-15").
+
+    Args:
+        date_str: The date string to validate
+
+    Returns:
+        tuple: (is_valid: bool, error_message: str or None)
+    """
+    if len(date_str) != 10 or date_str[4] != '-' or date_str[7] != '-':
+        return False, "Execution date must be in YYYY-MM-DD format"
+    try:
+        date.fromisoformat(date_str)
+    except ValueError:
+        return False, "Execution date is not a valid calendar date"
+    return True, None
+
+
+def validate_currency(currency):
+    """
+    Validate an ISO 4217 currency code (three upper-case letters, e.g. "EUR").
+
+    Args:
+        currency: The currency code to validate
+
+    Returns:
+        tuple: (is_valid: bool, error_message: str or None)
+    """
+    if len(currency) != 3 or not currency.isascii() or not currency.isalpha() or not currency.isupper():
+        return False, "Currency must be a three-letter ISO code such as EUR"
+    return True, None
+
+
+def check_group_columns(row, name, cache=None):
+    """
+    Validate the optional execution_date/currency/debtor_* columns of a row.
+
+    Empty or missing values are fine: they fall back to today, EUR and the
+    configured company.
+
+    Args:
+        row: Dictionary containing payment data
+        name: Beneficiary name for error messages
+        cache: Optional ValidationCache for IBAN/BIC verdicts
+
+    Returns:
+        list: Error messages (empty if all present values are valid)
+    """
+    errors = []
+
+    execution_date = (row.get('execution_date') or '').strip()
+    if execution_date:
+        valid, error = validate_execution_date(execution_date)
+        if not valid:
+            errors.append(f"Invalid execution date for '{name}': {execution_date} - {error}")
+
+    currency = (row.get('currency') or '').strip()
+    if currency:
+        valid, error = validate_currency(currency)
+        if not valid:
+            errors.append(f"Invalid currency for '{name}': {currency} - {error}")
+
+    debtor_iban = (row.get('debtor_iban') or '').strip()
+    if debtor_iban:
+        if cache is not None:
+            valid, error = cache.validate_iban(debtor_iban)
+        else:
+            valid, error = validate_iban(debtor_iban, name)
+        if not valid:
+            errors.append(f"Invalid debtor IBAN for '{name}': {debtor_iban} - {error}")
+
+    debtor_bic = (row.get('debtor_bic') or '').strip()
+    if debtor_bic:
+        if cache is not None:
+            valid, error = cache.validate_bic(debtor_bic, debtor_iban, name)
+        else:
+            valid, error = validate_bic(debtor_bic, debtor_iban, name)
+        if not valid:
+            errors.append(f"Invalid debtor BIC for '{name}': {debtor_bic} - {error}")
+
+    return errors
+
+
+def validate_payment_row(row, row_number, cache=None):
     """
     Validate a single payment row from CSV.
     
     Args:
         row: Dictionary containing payment data
         row_number: Row number for error reporting
+        cache: Optional ValidationCache for IBAN/BIC verdicts
         
     Returns:
         tuple: (is_valid: bool, errors: list of error messages)
     """
+    errors, _ = check_payment_row(row, row_number, cache)
+    return len(errors) == 0, errors
+
+
+def check_payment_row(row, row_number, cache=None):
+    """
+    Validate a single payment row and return its amount in cents.
+    
+    Same checks as validate_payment_row(), which is built on it; readers use
+    this directly so the amount is parsed only once.
+    
+    Args:
+        row: Dictionary containing payment data
+        row_number: Row number for error reporting
+        cache: Optional ValidationCache for IBAN/BIC verdicts
+        
+    Returns:
+        tuple: (errors: list of error messages, amount_cents: int or None)
+    """
     errors = []
     name = row.get('name', '').strip()
     
@@ -179,25 +432,34 @@ def validate_payment_row(row, row_number):
     
     # Validate IBAN
     iban = row.get('iban', '').strip()
-    iban_valid, iban_error = validate_iban(iban, name)
+    if cache is not None:
+        iban_valid, iban_error = cache.validate_iban(iban)
+    else:
+        iban_valid, iban_error = validate_iban(iban, name)
     if not iban_valid:
         errors.append(f"Invalid IBAN for '{name}': {iban} - {iban_error}")
     
     # Validate BIC
     bic = row.get('bic', '').strip()
-    bic_valid, bic_error = validate_bic(bic, iban, name)
+    if cache is not None:
+        bic_valid, bic_error = cache.validate_bic(bic, iban, name)
+    else:
+        bic_valid, bic_error = validate_bic(bic, iban, name)
     if not bic_valid:
         errors.append(f"Invalid BIC for '{name}': {bic} - {bic_error}")
     
     # Validate amount
     amount_str = row.get('amount', '')
-    amount_valid, amount_error, parsed_amount = validate_amount(amount_str, name)
+    amount_valid, amount_error, amount_cents = validate_amount_cents(amount_str, name)
     if not amount_valid:
         errors.append(f"Invalid amount for '{name}': {amount_str} - {amount_error}")
     
     # Check reference (optional but log if missing)
     reference = row.get('reference', '').strip()
     if not reference:
-        logger.warning(f"Row {row_number} ('{name}'): Reference is empty")
+        row_log.warning(logger, 'empty_reference', "Row %s ('%s'): Reference is empty", row_number, name)
+
+    # Optional grouping columns (execution date, currency, debtor account)
+    errors.extend(check_group_columns(row, name, cache))
     
-    return len(errors) == 0, errors
+    return errors, amount_cents
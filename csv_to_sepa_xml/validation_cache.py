@@ -0,0 +1,175 @@
+"""
+Bounded LRU cache for IBAN and BIC validation results.
+
+Payroll and recurring supplier files repeat the same creditor accounts
+thousands of times; the cache remembers each verdict (and its error
+message) so the full checks only run once per distinct IBAN/BIC.
+"""
+
+import json
+import logging
+import os
+from collections import OrderedDict
+
+from . import __version__
+from .config import DEFAULT_VALIDATION_CACHE_SIZE
+from .validation import validate_iban, validate_bic, check_bic_country
+
+logger = logging.getLogger(__name__)
+
+# Snapshot format version; bump when the file layout changes
+SNAPSHOT_FORMAT = 1
+
+
+class ValidationCache:
+    """
+    Least-recently-used cache of IBAN/BIC validation verdicts.
+
+    Usage:
+        cache = ValidationCache(maxsize=50000)
+        cache.load("validation_cache.json")   # optional warm start
+        is_valid, error = cache.validate_iban("DE89370400440532013000")
+        cache.save("validation_cache.json")
+    """
+
+    def __init__(self, maxsize=DEFAULT_VALIDATION_CACHE_SIZE):
+        """
+        Args:
+            maxsize: Maximum number of verdicts kept (IBANs and BICs together)
+        """
+        if maxsize < 1:
+            raise ValueError(f"Cache size must be at least 1 (got {maxsize})")
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # When set to a list, every newly computed verdict is appended to it
+        # (used by worker processes to send their results back)
+        self.new_entries = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, key, check):
+        """Return the cached verdict for key, computing it with check() on a miss."""
+        entries = self._entries
+        verdict = entries.get(key)
+        if verdict is not None:
+            entries.move_to_end(key)
+            self.hits += 1
+            return verdict
+
+        self.misses += 1
+        verdict = entries[key] = check()
+        if self.new_entries is not None:
+            self.new_entries.append((key, verdict))
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return verdict
+
+    def validate_iban(self, iban):
+        """
+        Cached validate_iban().
+
+        Returns:
+            tuple: (is_valid: bool, error_message: str or None)
+        """
+        return self._lookup(('iban', iban), lambda: validate_iban(iban))
+
+    def validate_bic(self, bic, iban="", name=""):
+        """
+        Cached validate_bic().
+
+        Only the format verdict is cached; the BIC/IBAN country cross-check
+        depends on the row and still runs (and warns) every time.
+
+        Returns:
+            tuple: (is_valid: bool, error_message: str or None)
+        """
+        verdict = self._lookup(('bic', bic), lambda: validate_bic(bic))
+        if verdict[0]:
+            check_bic_country(bic.strip().upper(), iban, name)
+        return verdict
+
+    def items(self):
+        """Return all (key, verdict) pairs, least recently used first."""
+        return list(self._entries.items())
+
+    def update(self, items):
+        """Add (key, verdict) pairs, e.g. from items() of another cache."""
+        entries = self._entries
+        for key, verdict in items:
+            entries[key] = verdict
+            entries.move_to_end(key)
+            if len(entries) > self.maxsize:
+                entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """Return hit/miss statistics as a dictionary."""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def load(self, path):
+        """
+        Warm the cache from a snapshot written by save().
+
+        Missing, unreadable or outdated snapshots are ignored, since the
+        cache only ever saves work.
+
+        Returns:
+            int: Number of verdicts loaded
+        """
+        if not os.path.exists(path):
+            return 0
+
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable validation cache {path}: {e}")
+            return 0
+
+        # Verdicts from another version may follow different rules
+        if snapshot.get('format') != SNAPSHOT_FORMAT or snapshot.get('version') != __version__:
+            logger.info(f"Ignoring validation cache {path} from another version")
+            return 0
+
+        loaded = 0
+        for kind, value, is_valid, error in snapshot.get('entries', [])[-self.maxsize:]:
+            self._entries[(kind, value)] = (is_valid, error)
+            loaded += 1
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+        logger.info(f"Loaded {loaded} cached validation result(s) from {path}")
+        return loaded
+
+    def save(self, path):
+        """
+        Write all verdicts to a JSON snapshot, least recently used first.
+
+        The file is written to a temporary name and renamed, so an
+        interrupted save never leaves a broken snapshot behind.
+        """
+        snapshot = {
+            'format': SNAPSHOT_FORMAT,
+            'version': __version__,
+            'entries': [[kind, value, is_valid, error]
+                        for (kind, value), (is_valid, error) in self._entries.items()],
+        }
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(snapshot, file)
+        os.replace(temp_path, path)
+        logger.info(f"Saved {len(self._entries)} validation result(s) to {path}")
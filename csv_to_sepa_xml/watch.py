@@ -0,0 +1,331 @@
+"""
+Watch-folder mode: a long-running converter for a drop directory.
+
+The watcher polls a directory for *.csv files, converts the new and
+changed ones and writes the XML (and error reports) to an outbox. One
+process serves any number of files, so imports, logging setup, the
+validation cache and the worker pool are set up once.
+
+Changes are found with a persistent index of every input's size,
+modification time and SHA-256 content hash:
+- a file whose size and mtime match the index is skipped without reading it
+- a file whose stat changed is only picked up once it stayed the same for
+  one poll interval (so half-copied files are not converted)
+- it is then hashed; if the content matches the index (e.g. a touch or a
+  copy of the same file), only the stat is updated
+- a file that failed is not retried until its content changes
+
+At most max_pending files are converted per cycle; the rest wait for the
+next one, so a burst of files never queues unbounded work. SIGINT and
+SIGTERM stop the watcher after the files in progress: outputs are written
+to a temporary file and renamed, so none is left half-written.
+
+Usage:
+    watcher = FolderWatcher("inbox/", "outbox/", company)
+    watcher.run()
+"""
+
+import hashlib
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from .batch import run_batch, create_pool, conversion_options
+from .ids import SequenceIds
+from .validation_cache import ValidationCache
+from .config import DEFAULT_VALIDATION_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two scans of the watched directory
+DEFAULT_WATCH_INTERVAL = 2.0
+
+# Index of converted inputs, kept in the outbox
+INDEX_FILE_NAME = '.watch_index.json'
+
+# Files converted per cycle and worker; the rest wait for the next cycle
+PENDING_PER_WORKER = 2
+
+# Bytes read at a time when hashing an input
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FolderWatcher:
+    """
+    Convert new and changed CSV files of a directory into an outbox.
+    """
+
+    def __init__(self, watch_dir, outbox, company, workers=1, streaming=False, cache=None,
+                 interval=DEFAULT_WATCH_INTERVAL, max_pending=None, index_path=None,
+                 max_error_rows=None, max_error_bytes=None, id_generator=None, convert_options=None):
+        """
+        Args:
+            watch_dir: Directory polled for *.csv files
+            outbox: Directory for the XML files and error reports (created if missing)
+            company: (debtor name, IBAN, BIC) overrides, None for the defaults
+            workers: Number of files converted at the same time
+            streaming: If True, convert each file in one constant-memory pass
+            cache: ValidationCache kept for the whole run
+            interval: Seconds between two scans
+            max_pending: Files converted per cycle (default: PENDING_PER_WORKER per worker)
+            index_path: Where the index is kept (default: INDEX_FILE_NAME in the outbox)
+            max_error_rows: Optional cap on the rows written to each error report
+            max_error_bytes: Optional cap on the size of each error report in bytes
+            id_generator: Where the documents get their ids (default: ClockIds,
+                          numbered by the files converted since start)
+            convert_options: Further keyword arguments of batch.convert_file()
+                             (reader_engine, aliases, duplicate_policy, ...)
+        """
+        self.watch_dir = watch_dir
+        self.outbox = outbox
+        self.company = company
+        self.workers = max(1, workers)
+        self.streaming = streaming
+        self.cache = cache if cache is not None else ValidationCache(DEFAULT_VALIDATION_CACHE_SIZE)
+        self.interval = interval
+        self.max_pending = max_pending or self.workers * PENDING_PER_WORKER
+        self.index_path = index_path or os.path.join(outbox, INDEX_FILE_NAME)
+        self.max_error_rows = max_error_rows
+        self.max_error_bytes = max_error_bytes
+        self.id_generator = id_generator
+        self.convert_options = convert_options or {}
+        self.index = {}
+        self.converted = 0
+        self.failed = 0
+        self._last_stat = {}  # Stat seen on the previous scan, by file name
+        self._stop = threading.Event()
+        self._pool = None
+        self._numbered = 0  # Files given document numbers so far
+
+    def load_index(self):
+        """Load the index of a previous run, if there is one."""
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as file:
+                self.index = json.load(file)['files']
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable watch index {self.index_path}: {e}")
+            self.index = {}
+            return
+        logger.info(f"Watch index loaded: {len(self.index)} known file(s)")
+
+    def save_index(self):
+        """Write the index (atomically, so a crash never leaves it half-written)."""
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'version': 1, 'files': self.index}, file, indent=2)
+            file.write('\n')
+        os.replace(temp_path, self.index_path)
+
+    def remove_partial_outputs(self):
+        """Delete temporary outputs a killed process left in the outbox."""
+        for name in os.listdir(self.outbox):
+            if name.endswith('.part') or name.endswith('.tmp'):
+                os.remove(os.path.join(self.outbox, name))
+                logger.warning(f"Removed partial output {name} from the outbox")
+
+    def scan(self):
+        """
+        Return the names of the files that are ready to convert, oldest first.
+
+        Also updates the index for files whose stat changed but whose
+        content did not.
+        """
+        ready = []
+        seen = {}
+        for entry in os.scandir(self.watch_dir):
+            if not entry.name.lower().endswith('.csv') or entry.name.startswith('.') or not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # Removed while scanning
+            current = (stat.st_size, stat.st_mtime_ns)
+            seen[entry.name] = current
+
+            known = self.index.get(entry.name)
+            if known is not None and (known['size'], known['mtime_ns']) == current:
+                continue  # Unchanged since it was last converted (or failed)
+            if self._last_stat.get(entry.name) != current:
+                continue  # New or still being written; look again next scan
+
+            try:
+                digest = file_digest(entry.path)
+            except OSError as e:
+                logger.warning(f"Could not read {entry.path}: {e}")
+                continue
+            if known is not None and known['sha256'] == digest:
+                known['size'], known['mtime_ns'] = current
+                continue  # Same content (touched or copied again)
+            ready.append((stat.st_mtime_ns, entry.name, digest, current))
+
+        self._last_stat = seen
+        ready.sort()
+        return [(name, digest, current) for _mtime, name, digest, current in ready]
+
+    def run_once(self):
+        """
+        Scan once and convert up to max_pending ready files.
+
+        Returns:
+            tuple: (convert_file() results, number of ready files left waiting)
+        """
+        ready = self.scan()
+        batch, waiting = ready[:self.max_pending], len(ready) - self.max_pending
+        if not batch:
+            return [], 0
+        if waiting > 0:
+            logger.info(f"Watch: {len(ready)} file(s) ready, converting {len(batch)} now")
+
+        jobs = [(os.path.join(self.watch_dir, name), os.path.join(self.outbox, os.path.splitext(name)[0] + '.xml'))
+                for name, _digest, _stat in batch]
+        try:
+            results = run_batch(jobs, self.company, self.workers, self.streaming, self.cache,
+                                self.max_error_rows, self.max_error_bytes, self.outbox, self._pool,
+                                self.id_generator, self._numbered + 1, self.convert_options)
+        except BrokenProcessPool:
+            # A worker died and took the pool with it; start a new one and retry next cycle
+            logger.error("Watch: worker pool failed, restarting it")
+            self._pool.shutdown(wait=False)
+            self._pool = self._create_pool()
+            return [], len(ready)
+        finally:
+            self._numbered += len(jobs)
+
+        for (name, digest, (size, mtime_ns)), result in zip(batch, results):
+            self.index[name] = {
+                'size': size,
+                'mtime_ns': mtime_ns,
+                'sha256': digest,
+                'output': result['output'] if result['ok'] else None,
+                'ok': result['ok'],
+                'error': result['error'],
+                'payments': result['payments'],
+                'total_cents': result['total_cents'],
+                'converted_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+            if result['ok']:
+                self.converted += 1
+            else:
+                self.failed += 1
+        self.save_index()
+        return results, max(waiting, 0)
+
+    def _create_pool(self):
+        return create_pool(self.workers, self.cache, ignore_interrupts=True, id_generator=self.id_generator)
+
+    def stop(self, *_args):
+        """Ask the watcher to stop after the files in progress (usable as a signal handler)."""
+        if not self._stop.is_set():
+            logger.info("Watch: stopping after the files in progress")
+        self._stop.set()
+
+    def run(self):
+        """Scan and convert until stop() is called (or SIGINT/SIGTERM arrive)."""
+        os.makedirs(self.outbox, exist_ok=True)
+        self.load_index()
+        self.remove_partial_outputs()
+
+        handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                handlers[signum] = signal.signal(signum, self.stop)
+
+        if self.workers > 1:
+            self._pool = self._create_pool()
+        logger.info(f"Watching {self.watch_dir} every {self.interval:g} s, outbox {self.outbox}")
+        try:
+            while not self._stop.is_set():
+                _results, waiting = self.run_once()
+                if not waiting:
+                    self._stop.wait(self.interval)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+            logger.info(f"Watch stopped: {self.converted} file(s) converted, {self.failed} failed")
+
+
+def run_watch_mode(watch_dir, outbox=None, debtor_name=None, debtor_iban=None, debtor_bic=None,
+                   streaming=False, cache_path=None, cache_size=DEFAULT_VALIDATION_CACHE_SIZE, workers=1,
+                   interval=DEFAULT_WATCH_INTERVAL, max_error_rows=None, max_error_bytes=None,
+                   id_sequence=None, reader_engine='csv', column_aliases=None, duplicate_policy=None,
+                   duplicate_memory_mb=None):
+    """
+    Run the converter as a watch-folder daemon until interrupted.
+
+    Arguments:
+        watch_dir: Directory polled for *.csv files
+        outbox: Directory for the results (default: "outbox" inside watch_dir)
+        debtor_name: Optional override for company name
+        debtor_iban: Optional override for company IBAN
+        debtor_bic: Optional override for company BIC
+        streaming: If True, convert each file in one constant-memory pass
+        cache_path: Optional validation cache snapshot to load at start
+                    (and save at exit, when the files are converted in this process)
+        cache_size: Maximum number of cached IBAN/BIC validation results
+        workers: Number of files converted at the same time
+        interval: Seconds between two scans
+        max_error_rows: Optional cap on the rows written to each error report
+        max_error_bytes: Optional cap on the size of each error report in bytes
+        id_sequence: Optional counter file to number the document ids from
+                     (see ids.SequenceIds); default: ids from the creation time
+        reader_engine: 'csv' or 'mmap' CSV reader (see cli.open_payment_reader)
+        column_aliases: Extra "column=Header name" aliases (see schema.parse_column_aliases)
+        duplicate_policy: 'warn', 'keep-first' or 'reject' to look for duplicate
+                          payments in each file (see duplicates); None to skip the check
+        duplicate_memory_mb: Bloom filter size for the duplicate check, in MB
+
+    Returns:
+        Exit code (0 after a clean stop, 1 if the watcher could not start)
+    """
+    if not os.path.isdir(watch_dir):
+        print(f"ERROR: Watch directory not found: {watch_dir}")
+        logger.error(f"Watch directory not found: {watch_dir}")
+        return 1
+    if outbox is None:
+        outbox = os.path.join(watch_dir, 'outbox')
+    try:
+        options = conversion_options(reader_engine, column_aliases, duplicate_policy, duplicate_memory_mb)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        logger.error(f"Watch mode could not start: {e}")
+        return 1
+
+    cache = ValidationCache(cache_size)
+    if cache_path:
+        cache.load(cache_path)
+
+    watcher = FolderWatcher(watch_dir, outbox, (debtor_name, debtor_iban, debtor_bic), workers, streaming,
+                            cache, interval, max_error_rows=max_error_rows, max_error_bytes=max_error_bytes,
+                            id_generator=SequenceIds(id_sequence) if id_sequence else None,
+                            convert_options=options)
+    try:
+        watcher.run()
+    except OSError as e:
+        print(f"ERROR: {e}")
+        logger.exception("Watch mode failed")
+        return 1
+    finally:
+        if cache_path and watcher.workers == 1:
+            try:
+                cache.save(cache_path)
+            except OSError as e:
+                logger.warning(f"Could not save validation cache: {e}")
+    return 0
@@ -2,117 +2,427 @@
 SEPA XML generation from payment data.
 """
 
+import contextlib
+import io
 import logging
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
-from datetime import datetime
+import shutil
+import tempfile
+from array import array
+from .clock import run_time
+from .ids import ClockIds
+from .payment import as_payment, format_cents
 
 logger = logging.getLogger(__name__)
 
+# The namespace tells banks which XML standard we're using
+SEPA_NAMESPACE = "urn:iso:std:iso:20022:tech:xsd:pain.001.001.03"
 
-def build_sepa_xml(payments, company_name=None, company_iban=None, company_bic=None):
+INDENT = "  "
+
+# Bytes copied per read when moving spooled transactions into the output
+SPOOL_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def _escape(text):
     """
-    Convert a list of payments into SEPA XML format.
+    Escape text for XML output.
 
-    Arguments:
-        payments: List of payment dictionaries from read_csv_file()
-        company_name: Override for debtor name
-        company_iban: Override for debtor IBAN
-        company_bic: Override for debtor BIC
+    Mirrors what the old ElementTree -> minidom round-trip produced: line
+    endings are normalized to \\n (as the XML parser did) and &, <, > and "
+    are replaced with entities (as minidom's writer did).
+    """
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return (text.replace('&', '&amp;')
+                .replace('<', '&lt;')
+                .replace('"', '&quot;')
+                .replace('>', '&gt;'))
 
-    Returns:
-        A string containing the complete XML
+
+def _element(level, tag, text):
+    """Return one indented leaf element, self-closing when it has no text."""
+    if not text:
+        return f"{INDENT * level}<{tag}/>\n"
+    return f"{INDENT * level}<{tag}>{_escape(text)}</{tag}>\n"
+
+
+class SepaXmlWriter:
+    """
+    Streaming pain.001.001.03 writer.
+
+    Writes the document piece by piece to any object with a write() method,
+    so only one transaction is held in memory at a time. The output is
+    identical to what the old ElementTree + minidom pretty-printer produced.
+
+    Usage:
+        writer = SepaXmlWriter(stream, company_name="My Company GmbH")
+        writer.write_header(nb_of_txs, ctrl_sum)
+        for i, payment in enumerate(payments, start=1):
+            writer.write_transaction(payment, i)
+        writer.write_footer()
     """
-    from .config import DEFAULT_COMPANY_NAME, DEFAULT_COMPANY_IBAN, DEFAULT_COMPANY_BIC
-    
-    # Use provided values or fall back to defaults
-    name = company_name or DEFAULT_COMPANY_NAME
-    iban = company_iban or DEFAULT_COMPANY_IBAN
-    bic = company_bic or DEFAULT_COMPANY_BIC
 
-    # The namespace tells banks which XML standard we're using
-    namespace = "urn:iso:std:iso:20022:tech:xsd:pain.001.001.03"
+    def __init__(self, stream, company_name=None, company_iban=None, company_bic=None,
+                 message_id=None, payment_info_id=None, created=None, ids=None):
+        """
+        Args:
+            stream: Writable text stream (file, StringIO, ...)
+            company_name: Override for debtor name
+            company_iban: Override for debtor IBAN
+            company_bic: Override for debtor BIC
+            message_id: MsgId to use (default: the one from ids)
+            payment_info_id: PmtInfId to use (default: the one from ids)
+            created: Creation time (datetime) used for CreDtTm, the default ids
+                     and the default execution date (default: the run time,
+                     taken once here; see clock)
+            ids: DocumentIds giving MsgId, PmtInfId and EndToEndIds (default:
+                 ClockIds from the creation time, see ids)
+        """
+        from .config import DEFAULT_COMPANY_NAME, DEFAULT_COMPANY_IBAN, DEFAULT_COMPANY_BIC
+
+        self.stream = stream
+
+        # Use provided values or fall back to defaults
+        self.name = company_name or DEFAULT_COMPANY_NAME
+        self.iban = company_iban or DEFAULT_COMPANY_IBAN
+        self.bic = company_bic or DEFAULT_COMPANY_BIC
+
+        self.message_id = message_id
+        self.payment_info_id = payment_info_id
+        self.created = created or run_time()
+        self.ids = ids
+
+    def document_ids(self):
+        """Return the document's ids, made from the creation time on first use if none were given."""
+        if self.ids is None:
+            self.ids = ClockIds().document(self.created)
+        return self.ids
+
+    def payment_info_ids(self, count):
+        """
+        Return the PmtInfId of each of count PmtInf blocks.
+
+        A single block keeps the plain id (None lets render_payment_info
+        pick the default); several blocks get a "-001", "-002", ... suffix.
+        """
+        if count == 1:
+            return [self.payment_info_id]
+        base = self.payment_info_id or self.document_ids().payment_info_id
+        return [f"{base}-{number:03d}" for number in range(1, count + 1)]
+
+    def write_header(self, nb_of_txs, ctrl_sum_cents, group=None):
+        """
+        Write everything up to and including the debtor part of PmtInf.
+
+        Args:
+            nb_of_txs: Number of transactions that will follow
+            ctrl_sum_cents: Sum of all transaction amounts, in cents
+            group: Optional PaymentGroup of the single PmtInf block
+        """
+        self.stream.write(self.render_header(nb_of_txs, ctrl_sum_cents, group))
+
+    def write_transaction(self, payment, index):
+        """
+        Write one CdtTrfTxInf block.
+
+        Args:
+            payment: Payment from read_csv_file() (row dictionaries are accepted too)
+            index: 1-based position of the payment in the batch
+        """
+        self.stream.write(self.render_transaction(payment, index))
+
+    def write_footer(self):
+        """Close the PmtInf block and the document."""
+        self.stream.write(self.render_footer())
+
+    def render_header(self, nb_of_txs, ctrl_sum_cents, group=None):
+        """
+        Return the document start up to and including the debtor part of PmtInf.
+
+        Args:
+            nb_of_txs: Number of transactions that will follow
+            ctrl_sum_cents: Sum of all transaction amounts, in cents
+            group: Optional PaymentGroup of the single PmtInf block
+        """
+        return (self.render_group_header(nb_of_txs, ctrl_sum_cents)
+                + self.render_payment_info(nb_of_txs, ctrl_sum_cents, group))
+
+    def render_group_header(self, nb_of_txs, ctrl_sum_cents):
+        """
+        Return the document start and the GrpHdr block.
+
+        Args:
+            nb_of_txs: Number of transactions in the whole document
+            ctrl_sum_cents: Sum of all transaction amounts, in cents
+        """
+        parts = [
+            '<?xml version="1.0" ?>\n',
+            f'<Document xmlns="{SEPA_NAMESPACE}">\n',
+            f"{INDENT}<CstmrCdtTrfInitn>\n",
+
+            # --- GROUP HEADER ---
+            f"{INDENT * 2}<GrpHdr>\n",
+            _element(3, "MsgId", self.message_id or self.document_ids().message_id),
+            _element(3, "CreDtTm", self.created.strftime("%Y-%m-%dT%H:%M:%S")),
+            _element(3, "NbOfTxs", str(nb_of_txs)),
+            _element(3, "CtrlSum", format_cents(ctrl_sum_cents)),
+            f"{INDENT * 3}<InitgPty>\n",
+            _element(4, "Nm", self.name),
+            f"{INDENT * 3}</InitgPty>\n",
+            f"{INDENT * 2}</GrpHdr>\n",
+        ]
+        return ''.join(parts)
+
+    def render_payment_info(self, nb_of_txs, ctrl_sum_cents, group=None, payment_info_id=None):
+        """
+        Return the start of one PmtInf block, up to and including the debtor part.
+
+        Args:
+            nb_of_txs: Number of transactions in this block
+            ctrl_sum_cents: Sum of the block's transaction amounts, in cents
+            group: Optional PaymentGroup; an empty execution date means
+                   today and empty debtor fields mean the writer's company
+            payment_info_id: PmtInfId to use (default: the writer's payment_info_id)
+        """
+        name, iban, bic = self.name, self.iban, self.bic
+        execution_date = None
+        if group is not None:
+            execution_date = group.execution_date
+            name = group.debtor_name or name
+            iban = group.debtor_iban or iban
+            bic = group.debtor_bic or bic
 
-    # Create the root element (the top of our tree)
-    root = ET.Element("Document", xmlns=namespace)
+        total = format_cents(ctrl_sum_cents)
+        parts = [
+            # --- PAYMENT INFORMATION ---
+            f"{INDENT * 2}<PmtInf>\n",
+            _element(3, "PmtInfId", payment_info_id or self.payment_info_id
+                     or self.document_ids().payment_info_id),
+            _element(3, "PmtMtd", "TRF"),
+            _element(3, "NbOfTxs", str(nb_of_txs)),
+            _element(3, "CtrlSum", total),
+            f"{INDENT * 3}<PmtTpInf>\n",
+            f"{INDENT * 4}<SvcLvl>\n",
+            _element(5, "Cd", "SEPA"),
+            f"{INDENT * 4}</SvcLvl>\n",
+            f"{INDENT * 3}</PmtTpInf>\n",
+            _element(3, "ReqdExctnDt", execution_date or self.created.strftime("%Y-%m-%d")),
 
-    # Create the main container
-    main = ET.SubElement(root, "CstmrCdtTrfInitn")
+            # --- DEBTOR (YOUR COMPANY) ---
+            f"{INDENT * 3}<Dbtr>\n",
+            _element(4, "Nm", name),
+            f"{INDENT * 3}</Dbtr>\n",
+            f"{INDENT * 3}<DbtrAcct>\n",
+            f"{INDENT * 4}<Id>\n",
+            _element(5, "IBAN", iban),
+            f"{INDENT * 4}</Id>\n",
+            f"{INDENT * 3}</DbtrAcct>\n",
+            f"{INDENT * 3}<DbtrAgt>\n",
+            f"{INDENT * 4}<FinInstnId>\n",
+            _element(5, "BIC", bic),
+            f"{INDENT * 4}</FinInstnId>\n",
+            f"{INDENT * 3}</DbtrAgt>\n",
+            _element(3, "ChrgBr", "SLEV"),
+        ]
+        return ''.join(parts)
 
-    # --- GROUP HEADER ---
-    header = ET.SubElement(main, "GrpHdr")
-    message_id = "MSG" + datetime.now().strftime("%Y%m%d%H%M%S")
-    ET.SubElement(header, "MsgId").text = message_id
-    ET.SubElement(header, "CreDtTm").text = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
-    ET.SubElement(header, "NbOfTxs").text = str(len(payments))
+    def render_transaction(self, payment, index):
+        """
+        Return one CdtTrfTxInf block.
 
-    total = sum(float(p.get('amount', 0)) for p in payments)
-    ET.SubElement(header, "CtrlSum").text = f"{total:.2f}"
+        Args:
+            payment: Payment from read_csv_file() (row dictionaries are accepted too)
+            index: 1-based position of the payment in the batch
+        """
+        payment = as_payment(payment)
+        currency = "EUR"
+        if payment.group is not None and payment.group.currency:
+            currency = _escape(payment.group.currency)
+        parts = [
+            f"{INDENT * 3}<CdtTrfTxInf>\n",
+            f"{INDENT * 4}<PmtId>\n",
+            _element(5, "EndToEndId", self.document_ids().end_to_end_id(index)),
+            f"{INDENT * 4}</PmtId>\n",
+            f"{INDENT * 4}<Amt>\n",
+            f'{INDENT * 5}<InstdAmt Ccy="{currency}">{format_cents(payment.amount_cents)}</InstdAmt>\n',
+            f"{INDENT * 4}</Amt>\n",
+        ]
 
-    initiator = ET.SubElement(header, "InitgPty")
-    ET.SubElement(initiator, "Nm").text = name
+        if payment.bic:
+            parts += [
+                f"{INDENT * 4}<CdtrAgt>\n",
+                f"{INDENT * 5}<FinInstnId>\n",
+                _element(6, "BIC", payment.bic),
+                f"{INDENT * 5}</FinInstnId>\n",
+                f"{INDENT * 4}</CdtrAgt>\n",
+            ]
 
-    # --- PAYMENT INFORMATION ---
-    payment_info = ET.SubElement(main, "PmtInf")
-    payment_id = "PMT" + datetime.now().strftime("%Y%m%d%H%M%S")
-    ET.SubElement(payment_info, "PmtInfId").text = payment_id
-    ET.SubElement(payment_info, "PmtMtd").text = "TRF"
-    ET.SubElement(payment_info, "NbOfTxs").text = str(len(payments))
-    ET.SubElement(payment_info, "CtrlSum").text = f"{total:.2f}"
+        parts += [
+            f"{INDENT * 4}<Cdtr>\n",
+            _element(5, "Nm", payment.name),
+            f"{INDENT * 4}</Cdtr>\n",
+            f"{INDENT * 4}<CdtrAcct>\n",
+            f"{INDENT * 5}<Id>\n",
+            _element(6, "IBAN", payment.iban),
+            f"{INDENT * 5}</Id>\n",
+            f"{INDENT * 4}</CdtrAcct>\n",
+        ]
 
-    payment_type = ET.SubElement(payment_info, "PmtTpInf")
-    service_level = ET.SubElement(payment_type, "SvcLvl")
-    ET.SubElement(service_level, "Cd").text = "SEPA"
+        if payment.reference:
+            parts += [
+                f"{INDENT * 4}<RmtInf>\n",
+                _element(5, "Ustrd", payment.reference),
+                f"{INDENT * 4}</RmtInf>\n",
+            ]
 
-    ET.SubElement(payment_info, "ReqdExctnDt").text = datetime.now().strftime("%Y-%m-%d")
+        parts.append(f"{INDENT * 3}</CdtTrfTxInf>\n")
+        return ''.join(parts)
 
-    # --- DEBTOR (YOUR COMPANY) ---
-    debtor = ET.SubElement(payment_info, "Dbtr")
-    ET.SubElement(debtor, "Nm").text = name
+    def render_footer(self):
+        """Return the end of the PmtInf block and the document."""
+        return self.render_payment_info_end() + self.render_document_end()
 
-    debtor_account = ET.SubElement(payment_info, "DbtrAcct")
-    debtor_account_id = ET.SubElement(debtor_account, "Id")
-    ET.SubElement(debtor_account_id, "IBAN").text = iban
+    def render_payment_info_end(self):
+        """Return the end of one PmtInf block."""
+        return f"{INDENT * 2}</PmtInf>\n"
 
-    debtor_bank = ET.SubElement(payment_info, "DbtrAgt")
-    bank_id = ET.SubElement(debtor_bank, "FinInstnId")
-    ET.SubElement(bank_id, "BIC").text = bic
+    def render_document_end(self):
+        """Return the end of the document, after the last PmtInf block."""
+        return f"{INDENT}</CstmrCdtTrfInitn>\n</Document>\n"
 
-    ET.SubElement(payment_info, "ChrgBr").text = "SLEV"
 
-    # --- INDIVIDUAL PAYMENTS ---
-    for i, payment in enumerate(payments, start=1):
-        transaction = ET.SubElement(payment_info, "CdtTrfTxInf")
+def write_sepa_xml(payments, stream, company_name=None, company_iban=None, company_bic=None, created=None,
+                   ids=None):
+    """
+    Write a list of payments as SEPA XML to a writable text stream.
+
+    Payments are grouped into one PmtInf block per execution date, currency
+    and debtor (see Payment.group) in a single pass over the list; blocks
+    appear in the order their first payment appears in the CSV. Without
+    grouping columns everything goes into one block, as before.
+
+    Arguments:
+        payments: List of Payment records from read_csv_file()
+        stream: Writable text stream (e.g. a file opened with encoding='utf-8')
+        company_name: Override for debtor name
+        company_iban: Override for debtor IBAN
+        company_bic: Override for debtor BIC
+        created: Creation time of the document (default: the run time, see clock)
+        ids: DocumentIds to use (default: made from the creation time)
+
+    Returns:
+        The control sum written to the header, in cents
+    """
+    # group -> [number of transactions, sum in cents, positions in payments]
+    blocks = {}
+    total = 0
+    for position, payment in enumerate(payments):
+        payment = as_payment(payment)
+        total += payment.amount_cents
+        block = blocks.get(payment.group)
+        if block is None:
+            block = blocks[payment.group] = [0, 0, array('q')]
+        block[0] += 1
+        block[1] += payment.amount_cents
+        block[2].append(position)
+    if not blocks:
+        blocks[None] = [0, 0, array('q')]
+
+    writer = SepaXmlWriter(stream, company_name, company_iban, company_bic, created=created, ids=ids)
+    stream.write(writer.render_group_header(len(payments), total))
+    for (group, (count, block_total, positions)), payment_info_id in zip(
+            blocks.items(), writer.payment_info_ids(len(blocks))):
+        stream.write(writer.render_payment_info(count, block_total, group, payment_info_id))
+        for position in positions:
+            writer.write_transaction(payments[position], position + 1)
+        stream.write(writer.render_payment_info_end())
+    stream.write(writer.render_document_end())
+
+    logger.info(f"Generated XML with {len(payments)} payments in {len(blocks)} payment block(s), "
+                f"total {format_cents(total)}")
+
+    return total
+
+
+def stream_sepa_xml(payments, stream, company_name=None, company_iban=None, company_bic=None,
+                    spool_dir=None, created=None, ids=None):
+    """
+    Write SEPA XML from any iterable of payments in a single pass.
+
+    NbOfTxs and CtrlSum come before the transactions in the document, but
+    are only known once the input is exhausted. Transactions are therefore
+    rendered into a temporary spool file as they arrive; the header is
+    written once the counts are known and the spool is copied after it.
+    Memory use stays the same whatever the number of payments.
+
+    Each PmtInf block (see write_sepa_xml) gets its own spool file, so a
+    CSV with many execution dates or debtors keeps that many files open.
 
-        pmt_id = ET.SubElement(transaction, "PmtId")
-        end_to_end_id = f"E2E{datetime.now().strftime('%Y%m%d')}{i:04d}"
-        ET.SubElement(pmt_id, "EndToEndId").text = end_to_end_id
+    Arguments:
+        payments: Iterable of Payment records (e.g. a PaymentReader)
+        stream: Writable text stream for the finished document
+        company_name: Override for debtor name
+        company_iban: Override for debtor IBAN
+        company_bic: Override for debtor BIC
+        spool_dir: Directory for the spool files (default: system temp dir)
+        created: Creation time of the document (default: the run time, see clock)
+        ids: DocumentIds to use (default: made from the creation time)
 
-        amount_element = ET.SubElement(transaction, "Amt")
-        instructed_amount = ET.SubElement(amount_element, "InstdAmt", Ccy="EUR")
-        instructed_amount.text = f"{float(payment.get('amount', 0)):.2f}"
+    Returns:
+        tuple: (number of payments written, control sum in cents)
+    """
+    count = 0
+    total = 0
+
+    with contextlib.ExitStack() as spools:
+        # group -> [spool file, number of transactions, sum in cents]
+        blocks = {}
+        writer = SepaXmlWriter(None, company_name, company_iban, company_bic, created=created, ids=ids)
+        for payment in payments:
+            count += 1
+            payment = as_payment(payment)
+            total += payment.amount_cents
+            block = blocks.get(payment.group)
+            if block is None:
+                spool = spools.enter_context(tempfile.TemporaryFile('w+', encoding='utf-8', dir=spool_dir))
+                block = blocks[payment.group] = [spool, 0, 0]
+            block[0].write(writer.render_transaction(payment, count))
+            block[1] += 1
+            block[2] += payment.amount_cents
+        if not blocks:
+            blocks[None] = [io.StringIO(), 0, 0]
 
-        if payment.get('bic'):
-            creditor_bank = ET.SubElement(transaction, "CdtrAgt")
-            creditor_bank_id = ET.SubElement(creditor_bank, "FinInstnId")
-            ET.SubElement(creditor_bank_id, "BIC").text = payment.get('bic', '')
+        stream.write(writer.render_group_header(count, total))
+        for (group, (spool, block_count, block_total)), payment_info_id in zip(
+                blocks.items(), writer.payment_info_ids(len(blocks))):
+            stream.write(writer.render_payment_info(block_count, block_total, group, payment_info_id))
+            spool.seek(0)
+            shutil.copyfileobj(spool, stream, SPOOL_COPY_CHUNK_SIZE)
+            stream.write(writer.render_payment_info_end())
+        stream.write(writer.render_document_end())
 
-        creditor = ET.SubElement(transaction, "Cdtr")
-        ET.SubElement(creditor, "Nm").text = payment.get('name', '')
+    logger.info(f"Generated XML with {count} payments in {len(blocks)} payment block(s), "
+                f"total {format_cents(total)}")
 
-        creditor_account = ET.SubElement(transaction, "CdtrAcct")
-        creditor_account_id = ET.SubElement(creditor_account, "Id")
-        ET.SubElement(creditor_account_id, "IBAN").text = payment.get('iban', '')
+    return count, total
 
-        if payment.get('reference'):
-            remittance = ET.SubElement(transaction, "RmtInf")
-            ET.SubElement(remittance, "Ustrd").text = payment.get('reference', '')
 
-    # --- CONVERT TO PRETTY XML STRING ---
-    xml_string = ET.tostring(root, encoding='unicode')
-    dom = minidom.parseString(xml_string)
-    pretty_xml = dom.toprettyxml(indent="  ")
+def build_sepa_xml(payments, company_name=None, company_iban=None, company_bic=None):
+    """
+    Convert a list of payments into SEPA XML format.
+
+    Prefer write_sepa_xml() for large batches: it writes straight to the
+    output file instead of building the whole document as a string.
 
-    logger.info(f"Generated XML with {len(payments)} payments, total EUR {total:.2f}")
+    Arguments:
+        payments: List of Payment records from read_csv_file()
+        company_name: Override for debtor name
+        company_iban: Override for debtor IBAN
+        company_bic: Override for debtor BIC
 
-    return pretty_xml
+    Returns:
+        A string containing the complete XML
+    """
+    buffer = io.StringIO()
+    write_sepa_xml(payments, buffer, company_name, company_iban, company_bic)
+    return buffer.getvalue()
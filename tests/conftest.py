@@ -0,0 +1,41 @@
+"""Fixtures shared by the test modules."""
+
+import csv
+
+import pytest
+
+# 2024-03-01 12:30:45 UTC
+SOURCE_DATE_EPOCH = "1709296245"
+
+
+@pytest.fixture
+def fixed_clock(monkeypatch):
+    """Fix the creation time (see clock), so two conversions give the same bytes."""
+    monkeypatch.setenv('SOURCE_DATE_EPOCH', SOURCE_DATE_EPOCH)
+
+
+@pytest.fixture
+def tricky_csv(tmp_path):
+    """
+    Path of a CSV exercising the readers: quoted newlines, commas and
+    doubled quotes in needed and unused columns, CRLF line ends, blank
+    lines, rows with too few or too many fields, and invalid payments.
+    """
+    path = tmp_path / "payments.csv"
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file, lineterminator='\r\n')
+        writer.writerow(['name', 'iban', 'bic', 'amount', 'reference', 'address'])
+        for i in range(300):
+            name = f'Payee "{i}"\nSecond line' if i % 7 == 0 else f"Payee, {i}"
+            iban = "DE89370400440532013001" if i % 11 == 0 else "DE44500105175407324931"
+            amount = "-5" if i % 13 == 0 else f"{i + 1}.50"
+            address = f"Street {i}, Town\nCountry" if i % 3 == 0 else f"Street {i}"
+            row = [name, iban, "COBADEFFXXX", amount, f"Ref {i}", address]
+            if i % 17 == 0:
+                row = row[:5]  # too few fields
+            elif i % 19 == 0:
+                row.append("surplus")
+            writer.writerow(row)
+            if i % 40 == 0:
+                file.write('\r\n')  # blank line, skipped by the readers
+    return str(path)
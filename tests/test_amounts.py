@@ -0,0 +1,24 @@
+"""Tests for parsing amounts into integer cents."""
+
+from csv_to_sepa_xml.payment import format_cents
+from csv_to_sepa_xml.validation import validate_amount_cents
+
+
+def test_validate_amount_cents_parses_exact_cents():
+    """Common spellings parse to the exact number of cents."""
+    cases = {'1500.00': 150000, '890': 89000, '2750.5': 275050, ' 0.01 ': 1, '1e3': 100000, '12.': 1200}
+    for text, cents in cases.items():
+        assert validate_amount_cents(text) == (True, None, cents), text
+
+
+def test_validate_amount_cents_rejects_unpayable_amounts():
+    """Non-positive, non-finite and sub-cent amounts are invalid."""
+    for text in ['', '0', '-100', '100.123', 'abc', 'inf', 'nan', '1e-5']:
+        assert validate_amount_cents(text)[0] is False, text
+
+
+def test_format_cents():
+    """Cents format back with exactly two decimals."""
+    assert format_cents(150050) == "1500.50"
+    assert format_cents(5) == "0.05"
+    assert format_cents(123456789, grouping=True) == "1,234,567.89"
@@ -0,0 +1,47 @@
+"""Tests for the file-object conversion API."""
+
+import io
+
+import pytest
+
+from csv_to_sepa_xml import convert, build_sepa_xml, read_csv_file
+
+CSV = ("name,iban,bic,amount,reference\n"
+       "Alice,DE89370400440532013000,COBADEFFXXX,10.50,Invoice 1\n"
+       "Bob,DE00000000000000000000,COBADEFFXXX,-1,Invoice 2\n"
+       "Carol,DE44500105175407324931,COBADEFFXXX,2.25,Invoice 3\n")
+
+
+def test_convert_between_binary_streams(tmp_path, monkeypatch):
+    """Bytes in, bytes out: same XML as the file-based pipeline, streams left open."""
+    monkeypatch.setenv('SOURCE_DATE_EPOCH', "1709296245")  # Both documents get the same time and ids
+    source = io.BytesIO(CSV.encode('utf-8'))
+    target = io.BytesIO()
+    errors = []
+    result = convert(source, target, on_error=lambda row, row_number, messages: errors.append(row_number))
+
+    assert not source.closed and not target.closed
+    assert (result.payments, result.invalid_rows, result.total) == (2, 1, "12.75")
+    assert errors == [3]
+    assert set(result.seconds) == {'read', 'write', 'total'}
+
+    path = tmp_path / "payments.csv"
+    path.write_text(CSV)
+    expected = build_sepa_xml(read_csv_file(str(path), error_report_path=str(tmp_path / "errors.csv")))
+    assert target.getvalue().decode('utf-8') == expected
+
+
+def test_convert_text_streams_with_error_report():
+    """Text streams work too; the error report goes to a second stream."""
+    target = io.StringIO()
+    report = io.StringIO()
+    result = convert(io.StringIO(CSV), target, error_stream=report, streaming=True)
+    assert result.payments == 2
+    assert '<NbOfTxs>2</NbOfTxs>' in target.getvalue()
+    assert report.getvalue().splitlines()[0] == 'row_number,name,iban,bic,amount,reference,error_details'
+    assert report.getvalue().splitlines()[1].startswith('3,Bob,')
+
+
+def test_convert_without_valid_rows_raises():
+    with pytest.raises(ValueError):
+        convert(io.StringIO(CSV.splitlines()[0] + "\n" + CSV.splitlines()[2] + "\n"), io.StringIO())
@@ -0,0 +1,85 @@
+"""Tests for batch mode: many files converted in one run."""
+
+import pytest
+
+from csv_to_sepa_xml.batch import collect_jobs, conversion_options, run_batch, summarize
+from csv_to_sepa_xml.cli import (CHECKPOINT_OPTIONS, LEDGER_OPTIONS, SPLIT_OPTIONS, parse_arguments,
+                                 unsupported_options)
+
+HEADER = "name,iban,bic,amount,reference\n"
+VALID = "Alice,DE89370400440532013000,COBADEFFXXX,10.50,Invoice 1\n"
+INVALID = "Bob,DE00000000000000000000,COBADEFFXXX,-1,Invoice 2\n"
+
+
+def test_collect_jobs_from_directory_glob_and_manifest(tmp_path):
+    """Directories, globs and manifests give the same kind of (input, output) pairs."""
+    inputs = tmp_path / "in"
+    inputs.mkdir()
+    for name in ("b.csv", "a.csv", "notes.txt"):
+        (inputs / name).write_text(HEADER + VALID)
+    out = str(tmp_path / "out")
+
+    from_dir = collect_jobs(str(inputs), out)
+    assert [job[1] for job in from_dir] == [f"{out}/a.xml", f"{out}/b.xml"]
+    assert collect_jobs(str(inputs / "*.csv"), out) == from_dir
+
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("# month end\nin/a.csv\n\nin/b.csv, entity_b.xml\n")
+    assert collect_jobs(str(manifest), out) == [
+        (str(inputs / "a.csv"), f"{out}/a.xml"),
+        (str(inputs / "b.csv"), f"{out}/entity_b.xml"),
+    ]
+
+    manifest.write_text("in/a.csv,same.xml\nin/b.csv,same.xml\n")
+    with pytest.raises(ValueError):
+        collect_jobs(str(manifest), out)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_failed_file_does_not_stop_the_batch(tmp_path, workers):
+    """A file without valid rows fails on its own; the others are converted."""
+    (tmp_path / "good.csv").write_text(HEADER + VALID * 2 + INVALID)
+    (tmp_path / "bad.csv").write_text(HEADER + INVALID)
+    (tmp_path / "other.csv").write_text(HEADER + VALID)
+    out = tmp_path / "out"
+    out.mkdir()
+
+    jobs = collect_jobs(str(tmp_path), str(out))
+    results = run_batch(jobs, (None, None, None), workers=workers)
+    assert [(result['ok'], result['payments']) for result in results] == [(False, 0), (True, 2), (True, 1)]
+    assert "No valid payments" in results[0]['error']
+    assert sorted(path.name for path in out.iterdir()) == ["good.xml", "other.xml"]
+
+    summary = summarize(results, 1.0, workers)
+    assert (summary['converted'], summary['failed'], summary['payments']) == (2, 1, 3)
+    assert (summary['invalid_rows'], summary['total_cents']) == (2, 3150)
+
+
+def test_ledger_options_are_refused_outside_cli_mode():
+    """--batch with --ledger must fail instead of converting without the ledger."""
+    args = parse_arguments(['--batch', 'in/', 'out/', '--ledger', 'payments.db', '--ledger-policy', 'skip'])
+    assert unsupported_options(args, LEDGER_OPTIONS) == ['--ledger', '--ledger-policy']
+    assert unsupported_options(parse_arguments(['--batch', 'in/', 'out/']), LEDGER_OPTIONS) == []
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_duplicate_policy_applies_to_every_file(tmp_path, workers):
+    """--duplicates reaches each file of a batch; repeats are only looked for within a file."""
+    (tmp_path / "repeats.csv").write_text(HEADER + VALID * 3)
+    (tmp_path / "single.csv").write_text(HEADER + VALID)
+    out = tmp_path / "out"
+    out.mkdir()
+
+    jobs = collect_jobs(str(tmp_path), str(out))
+    options = conversion_options(duplicate_policy='keep-first', column_aliases=["reference=Purpose"])
+    results = run_batch(jobs, (None, None, None), workers=workers, convert_options=options)
+    assert [(result['ok'], result['payments'], result['invalid']) for result in results] == [(True, 1, 2), (True, 1, 0)]
+
+    results = run_batch(jobs, (None, None, None), workers=workers,
+                        convert_options=conversion_options(duplicate_policy='reject'))
+    assert [result['ok'] for result in results] == [False, True]
+
+
+def test_checkpoint_and_split_options_are_refused_in_batch_mode():
+    args = parse_arguments(['--batch', 'in/', 'out/', '--resume', '--max-tx-per-file', '100'])
+    assert unsupported_options(args, SPLIT_OPTIONS + CHECKPOINT_OPTIONS) == ['--max-tx-per-file', '--resume']
@@ -0,0 +1,89 @@
+"""Tests for checkpointed, resumable conversion."""
+
+import csv
+import os
+
+import pytest
+
+from csv_to_sepa_xml.checkpoint import CheckpointedConversion
+from csv_to_sepa_xml.xml_builder import SepaXmlWriter
+
+
+def write_csv(directory):
+    """300 rows with quoted newlines and invalid rows; returns the path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "payments.csv")
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['name', 'iban', 'bic', 'amount', 'reference'])
+        for i in range(300):
+            name = f"Payee\n{i}" if i % 9 == 0 else f"Payee {i}"
+            iban = "DE89370400440532013001" if i % 11 == 0 else "DE44500105175407324931"
+            writer.writerow([name, iban, "COBADEFFXXX", f"{i + 1}.25", f"Ref {i}"])
+    return path
+
+
+def make_conversion(directory):
+    return CheckpointedConversion(os.path.join(directory, "payments.csv"), os.path.join(directory, "out.xml"),
+                                  (None, None, None), checkpoint_every=50)
+
+
+def crash_at(monkeypatch, crash_index):
+    """Make the writer fail when it reaches a transaction."""
+    original = SepaXmlWriter.render_transaction
+
+    def render_transaction(self, payment, index):
+        if index == crash_index:
+            raise MemoryError
+        return original(self, payment, index)
+
+    monkeypatch.setattr(SepaXmlWriter, 'render_transaction', render_transaction)
+
+
+def read_results(directory):
+    """Return the XML, the error report and the names of all files in the directory."""
+    names = sorted(os.listdir(directory))
+    [report] = [name for name in names if '_errors_' in name]
+    with open(os.path.join(directory, "out.xml"), encoding='utf-8') as file:
+        xml = file.read()
+    with open(os.path.join(directory, report), encoding='utf-8') as file:
+        return xml, file.read(), names
+
+
+def test_resume_gives_the_same_output(tmp_path, monkeypatch, fixed_clock):
+    """A run killed half-way and resumed writes the same XML and error report as one that never stopped."""
+    whole_dir, resumed_dir = str(tmp_path / "whole"), str(tmp_path / "resumed")
+    write_csv(whole_dir)
+    write_csv(resumed_dir)
+    whole = make_conversion(whole_dir)
+    result = whole.run()
+    assert result[0] == 272
+
+    with monkeypatch.context() as patch:
+        crash_at(patch, 170)
+        interrupted = make_conversion(resumed_dir)
+        with pytest.raises(MemoryError):
+            interrupted.run()
+    state = interrupted.load_state()
+    assert interrupted.checkpoints == 3 and state['row_number'] == 151
+
+    assert make_conversion(resumed_dir).run(resume=True) == result
+
+    xml, report, names = read_results(resumed_dir)
+    whole_xml, whole_report, _ = read_results(whole_dir)
+    assert xml == whole_xml
+    assert f"<CreDtTm>{state['created']}</CreDtTm>" in xml
+    assert report == whole_report
+    assert len(names) == 3  # CSV, XML and error report; no state or spool files left
+
+
+def test_changed_input_is_not_resumed(tmp_path, monkeypatch):
+    """A checkpoint of another version of the input is refused rather than mixed in."""
+    input_file = write_csv(str(tmp_path))
+    crash_at(monkeypatch, 100)
+    with pytest.raises(MemoryError):
+        make_conversion(str(tmp_path)).run()
+    with open(input_file, 'a', encoding='utf-8') as file:
+        file.write("Late,DE44500105175407324931,COBADEFFXXX,1.00,Ref\n")
+    with pytest.raises(ValueError):
+        make_conversion(str(tmp_path)).run(resume=True)
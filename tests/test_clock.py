@@ -0,0 +1,61 @@
+"""Tests for the run clock and reproducible output with SOURCE_DATE_EPOCH."""
+
+from datetime import datetime
+
+import pytest
+
+from csv_to_sepa_xml.batch import run_batch
+from csv_to_sepa_xml.cli import run_cli_mode
+from csv_to_sepa_xml.clock import run_time
+
+CSV_TEXT = (
+    "name,iban,bic,amount,reference\n"
+    "Alice,DE44500105175407324931,COBADEFFXXX,10.50,Invoice 1\n"
+    "Bob,DE89370400440532013000,COBADEFFXXX,3.00,Invoice 2\n"
+)
+
+EPOCH = "1709296245"  # 2024-03-01 12:30:45 UTC
+
+
+def test_run_time_honors_source_date_epoch():
+    assert run_time({'SOURCE_DATE_EPOCH': EPOCH}) == datetime(2024, 3, 1, 12, 30, 45)
+    assert run_time({}).microsecond == 0
+    with pytest.raises(ValueError):
+        run_time({'SOURCE_DATE_EPOCH': "yesterday"})
+
+
+@pytest.mark.parametrize('options', [{}, {'streaming': True}, {'max_tx_per_file': 1}])
+@pytest.mark.parametrize('suffix', ['.xml', '.xml.gz'])
+def test_same_input_gives_the_same_bytes(tmp_path, monkeypatch, options, suffix):
+    """Two runs at different times write identical files once the time is fixed."""
+    monkeypatch.setenv('SOURCE_DATE_EPOCH', EPOCH)
+    (tmp_path / "payments.csv").write_text(CSV_TEXT)
+    outputs = []
+    for run in ("first", "second"):
+        output = tmp_path / run / f"payments{suffix}"
+        output.parent.mkdir()
+        assert run_cli_mode(str(tmp_path / "payments.csv"), str(output), quiet=True, **options) == 0
+        outputs.append(sorted((path.name, path.read_bytes()) for path in output.parent.iterdir()))
+    assert outputs[0] == outputs[1]
+    if suffix == '.xml':
+        assert any(b"<CreDtTm>2024-03-01T12:30:45</CreDtTm>" in data for _, data in outputs[0])
+
+
+def test_batch_files_are_reproducible(tmp_path, monkeypatch):
+    """Batch mode numbers its files, so they differ from each other but not between runs."""
+    monkeypatch.setenv('SOURCE_DATE_EPOCH', EPOCH)
+    (tmp_path / "a.csv").write_text(CSV_TEXT)
+    (tmp_path / "b.csv").write_text(CSV_TEXT)
+    runs = []
+    for run in ("first", "second"):
+        jobs = [(str(tmp_path / name), str(tmp_path / f"{run}_{name}.xml")) for name in ("a.csv", "b.csv")]
+        assert all(result['ok'] for result in run_batch(jobs, (None, None, None)))
+        runs.append([open(output, 'rb').read() for _, output in jobs])
+    assert runs[0] == runs[1]
+    assert runs[0][0] != runs[0][1]
+
+
+def test_invalid_source_date_epoch_fails_the_run(tmp_path, monkeypatch):
+    monkeypatch.setenv('SOURCE_DATE_EPOCH', "not a time")
+    (tmp_path / "payments.csv").write_text(CSV_TEXT)
+    assert run_cli_mode(str(tmp_path / "payments.csv"), str(tmp_path / "payments.xml"), quiet=True) == 1
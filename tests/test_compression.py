@@ -0,0 +1,69 @@
+"""Tests for gzip/bz2/xz compressed input and output."""
+
+import bz2
+import gzip
+import lzma
+import re
+
+import pytest
+
+from csv_to_sepa_xml.cli import run_cli_mode
+from csv_to_sepa_xml.compression import detect_compression
+from csv_to_sepa_xml.csv_reader import read_csv_file
+from csv_to_sepa_xml.payment import Payment
+from csv_to_sepa_xml.sharding import write_sharded_sepa_xml
+
+CSV_TEXT = (
+    "name,iban,bic,amount,reference\n"
+    "Alice,DE44500105175407324931,COBADEFFXXX,10.50,Invoice 1\n"
+    "Bob,DE89370400440532013001,COBADEFFXXX,3.00,Invoice 2\n"  # bad check digit
+    "\"Carol\nSmith\",DE44500105175407324931,COBADEFFXXX,7.25,Invoice 3\n"
+)
+
+OPENERS = {'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+SUFFIXES = {'gzip': '.gz', 'bz2': '.bz2', 'xz': '.xz'}
+
+
+@pytest.mark.parametrize('compression', sorted(OPENERS))
+def test_compressed_input_and_output(tmp_path, fixed_clock, compression):
+    """A compressed CSV converts to the same XML as the plain one, compressed on the way out."""
+    plain_csv = tmp_path / "payments.csv"
+    plain_csv.write_text(CSV_TEXT, encoding='utf-8')
+    # Detected by content, whatever the name
+    packed_csv = tmp_path / "payments.dat"
+    with OPENERS[compression](packed_csv, 'wt', encoding='utf-8') as file:
+        file.write(CSV_TEXT)
+    assert detect_compression(str(packed_csv)) == compression
+    assert read_csv_file(str(packed_csv)) == read_csv_file(str(plain_csv))
+
+    plain_xml = tmp_path / "plain.xml"
+    packed_xml = tmp_path / f"packed.xml{SUFFIXES[compression]}"
+    assert run_cli_mode(str(plain_csv), str(plain_xml), quiet=True) == 0
+    assert run_cli_mode(str(packed_csv), str(packed_xml), quiet=True, compression_level=1) == 0
+    assert detect_compression(str(packed_xml)) == compression
+    with OPENERS[compression](packed_xml, 'rt', encoding='utf-8') as file:
+        assert file.read() == plain_xml.read_text(encoding='utf-8')
+
+
+@pytest.mark.parametrize('compression', sorted(OPENERS))
+def test_error_report_name_drops_compression_suffix(tmp_path, compression):
+    """payments.csv.gz reports to payments_errors_<time>.csv, not payments.csv.gz_errors or .csv_errors."""
+    packed_csv = tmp_path / f"payments.csv{SUFFIXES[compression]}"
+    with OPENERS[compression](packed_csv, 'wt', encoding='utf-8') as file:
+        file.write(CSV_TEXT)
+    assert run_cli_mode(str(packed_csv), str(tmp_path / "payments.xml"), quiet=True) == 0
+    reports = [path.name for path in tmp_path.iterdir() if "errors" in path.name]
+    assert len(reports) == 1
+    assert re.fullmatch(r"payments_errors_\d{8}_\d{6}\.csv", reports[0])
+    assert ".csv." not in reports[0] and ".csv_errors" not in reports[0]
+
+
+def test_sharded_output_is_compressed(tmp_path):
+    """Every shard keeps the .xml name and the compression suffix."""
+    payments = [Payment(f"Payee {i}", "DE44500105175407324931", "COBADEFFXXX", 1000 + i, f"Ref {i}")
+                for i in range(5)]
+    _, manifest = write_sharded_sepa_xml(payments, str(tmp_path / "out.xml.gz"), max_tx_per_file=2)
+    assert [shard['file'] for shard in manifest['shards']] == ["out_001.xml.gz", "out_002.xml.gz",
+                                                               "out_003.xml.gz"]
+    with gzip.open(tmp_path / "out_003.xml.gz", 'rt', encoding='utf-8') as file:
+        assert "<NbOfTxs>1</NbOfTxs>" in file.read()
@@ -0,0 +1,96 @@
+"""Tests for duplicate payment detection."""
+
+import csv
+
+import pytest
+
+from csv_to_sepa_xml.cli import parse_arguments
+from csv_to_sepa_xml.csv_reader import PaymentReader
+from csv_to_sepa_xml.duplicates import DuplicateDetector, payment_fingerprint
+from csv_to_sepa_xml.mmap_reader import MmapPaymentReader
+from csv_to_sepa_xml.payment import Payment
+
+
+def write_csv(path):
+    """40 payments; rows 12, 22 and 32 (CSV row numbers) repeat row 2 under another name."""
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['name', 'iban', 'bic', 'amount', 'reference'])
+        for i in range(40):
+            if i % 10 == 0 and i:
+                writer.writerow([f"Again {i}", "DE44500105175407324931", "COBADEFFXXX", "1.50", "Ref 0 "])
+            else:
+                writer.writerow([f"Payee {i}", "DE44500105175407324931", "COBADEFFXXX", f"{i + 1}.50", f"Ref {i}"])
+
+
+def read(reader_class, path, report, policy, memory_bytes=None):
+    reader = reader_class(path, report, duplicates=DuplicateDetector(policy, memory_bytes))
+    payments = list(reader)
+    with open(report, encoding='utf-8') as file:
+        errors = [row['error_details'] for row in csv.DictReader(file)]
+    return reader, payments, errors
+
+
+@pytest.mark.parametrize('reader_class', [PaymentReader, MmapPaymentReader])
+def test_keep_first_drops_repeats(tmp_path, reader_class):
+    """keep-first keeps the first payment and reports each repeat with the row it repeats."""
+    path, report = str(tmp_path / "payments.csv"), str(tmp_path / "errors.csv")
+    write_csv(path)
+    reader, payments, errors = read(reader_class, path, report, 'keep-first')
+    reader.finish()
+    assert len(payments) == 37
+    assert (reader.valid_count, reader.invalid_count) == (37, 3)
+    assert len(errors) == 3
+    assert all(error.startswith("Duplicate of row 2 ") for error in errors)
+
+
+def test_warn_keeps_repeats(tmp_path):
+    """warn keeps every payment but still lists the repeats in the error report."""
+    path, report = str(tmp_path / "payments.csv"), str(tmp_path / "errors.csv")
+    write_csv(path)
+    reader, payments, errors = read(PaymentReader, path, report, 'warn')
+    reader.finish()
+    assert len(payments) == 40
+    assert len(errors) == 3
+    assert all(error.endswith("(kept)") for error in errors)
+
+
+def test_reject_fails_after_reading(tmp_path):
+    """reject reports every duplicate and then fails the run."""
+    path, report = str(tmp_path / "payments.csv"), str(tmp_path / "errors.csv")
+    write_csv(path)
+    reader, _, errors = read(PaymentReader, path, report, 'reject')
+    assert len(errors) == 3
+    with pytest.raises(ValueError, match="3 duplicate"):
+        reader.finish()
+
+
+def test_bloom_filter_finds_the_same_duplicates(tmp_path):
+    """A Bloom filter flags the same rows as the exact index, without the first row number."""
+    path, report = str(tmp_path / "payments.csv"), str(tmp_path / "errors.csv")
+    write_csv(path)
+    reader, payments, errors = read(PaymentReader, path, report, 'warn', memory_bytes=4096)
+    assert len(payments) == 40
+    assert len(errors) == 3
+    assert all(error.startswith("Probable duplicate of an earlier row") for error in errors)
+    assert reader.duplicates.bloom.false_positive_rate() < 1e-9
+
+
+@pytest.mark.parametrize('policy', ['keep-first', 'reject'])
+def test_bloom_filter_only_warns(policy):
+    """A false positive must never drop or fail a unique payment."""
+    with pytest.raises(ValueError, match="only allowed with the 'warn' policy"):
+        DuplicateDetector(policy, 4096)
+    with pytest.raises(SystemExit):
+        parse_arguments(['--cli', 'in.csv', 'out.xml', '--duplicates', policy, '--duplicate-memory', '64'])
+
+
+def test_padded_iban_is_the_same_payment():
+    payment = Payment("Payee", "DE44500105175407324931", "COBADEFFXXX", 150, "Ref 0")
+    padded = Payment("Again", " DE44 5001 0517 5407 3249 31 ", "COBADEFFXXX", 150, " Ref 0 ")
+    assert payment_fingerprint(payment) == payment_fingerprint(padded)
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        DuplicateDetector('ignore')
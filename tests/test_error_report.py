@@ -0,0 +1,71 @@
+"""Tests for the streaming CSV error report."""
+
+import csv
+import os
+
+from csv_to_sepa_xml.csv_reader import ErrorReportWriter, PaymentReader
+
+HEADER = "name,iban,bic,amount,reference\n"
+VALID = "Alice,DE89370400440532013000,COBADEFFXXX,10.00,Invoice 1\n"
+INVALID = "Bob,DE00000000000000000000,COBADEFFXXX,-1,Invoice 2\n"
+
+
+def read_all(path, **kwargs):
+    reader = PaymentReader(path, **kwargs)
+    payments = list(reader)
+    return reader, payments
+
+
+def test_no_report_for_clean_input(tmp_path):
+    """A file without invalid rows leaves no error report behind."""
+    path = tmp_path / "payments.csv"
+    path.write_text(HEADER + VALID * 3)
+    report = tmp_path / "errors.csv"
+    reader, payments = read_all(str(path), error_report_path=str(report))
+    assert len(payments) == 3
+    assert reader.invalid_count == 0
+    assert not report.exists()
+
+
+def test_report_columns_and_row_cap(tmp_path):
+    """Rows over max_error_rows are rejected and counted but not written."""
+    path = tmp_path / "payments.csv"
+    path.write_text(HEADER + VALID + INVALID * 5)
+    report = tmp_path / "errors.csv"
+    reader, payments = read_all(str(path), error_report_path=str(report), max_error_rows=2)
+    assert len(payments) == 1
+    assert reader.invalid_count == 5
+    assert (reader.error_report.rows_written, reader.error_report.rows_dropped) == (2, 3)
+
+    with open(report, newline='', encoding='utf-8') as file:
+        rows = list(csv.DictReader(file))
+    assert list(rows[0]) == ['row_number', 'name', 'iban', 'bic', 'amount', 'reference', 'error_details']
+    assert [row['row_number'] for row in rows] == ['3', '4']
+    assert ' | ' in rows[0]['error_details']
+
+
+def test_byte_cap_is_never_exceeded(tmp_path):
+    """The report stops at the row that would take it over max_bytes, even if later rows are shorter."""
+    report = str(tmp_path / "errors.csv")
+    row = {'name': 'Bob', 'amount': '-1'}
+    with ErrorReportWriter(report, ['name', 'amount'], max_bytes=100) as writer:
+        for row_number in range(2, 20):
+            writer.write(row, row_number, ["Amount must be positive"])
+        written = writer.rows_written
+        writer.write(row, 20, ["-"])
+    assert os.path.getsize(report) == writer.bytes_written <= 100
+    assert 0 < writer.rows_written == written
+    assert writer.rows_written + writer.rows_dropped == 19
+
+
+def test_rows_with_surplus_fields_are_reported(tmp_path):
+    """A rejected row with more fields than the header does not stop the report."""
+    path = tmp_path / "payments.csv"
+    path.write_text(HEADER + INVALID.replace("\n", ",surplus,more\n") + INVALID)
+    report = tmp_path / "errors.csv"
+    reader, _ = read_all(str(path), error_report_path=str(report))
+    assert not reader.error_report.failed
+    with open(report, newline='', encoding='utf-8') as file:
+        rows = list(csv.DictReader(file))
+    assert [row['row_number'] for row in rows] == ['2', '3']
+    assert rows[0]['reference'] == "Invoice 2" and None not in rows[0]
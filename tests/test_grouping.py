@@ -0,0 +1,63 @@
+"""Tests for grouping payments into several PmtInf blocks."""
+
+import io
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+from csv_to_sepa_xml import clock
+from csv_to_sepa_xml.csv_reader import read_csv_file
+from csv_to_sepa_xml.xml_builder import build_sepa_xml, stream_sepa_xml
+
+NS = {'sepa': 'urn:iso:std:iso:20022:tech:xsd:pain.001.001.03'}
+
+CSV = """name,iban,bic,amount,reference,execution_date,currency,debtor_iban
+Maria Schmidt,DE44500105175407324931,COBADEFFXXX,1500.00,Inv 1,2024-03-15,,
+Jean Dupont,FR7630006000011234567890189,BNPAFRPPXXX,2750.50,Inv 2,2024-03-18,,DE44500105175407324931
+Ana Garcia,ES9121000418450200051332,CAIXESBBXXX,3200.00,Inv 3,2024-03-15,,
+Peter Muller,AT611904300234573201,BKAUATWWXXX,10.00,Inv 4,2024-02-30,,
+Jan Jansen,NL91ABNA0417164300,ABNANL2AXXX,5.00,Inv 5,,usd,
+"""
+
+
+class FixedDatetime(datetime):
+    """datetime whose now() never moves, so two documents can be compared."""
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2024, 3, 1, 12, 30, 45)
+
+
+def read_payments(tmp_path):
+    path = tmp_path / "grouped.csv"
+    path.write_text(CSV, encoding='utf-8')
+    return read_csv_file(str(path), error_report_path=str(tmp_path / "errors.csv"))
+
+
+def test_one_block_per_execution_date_and_debtor(tmp_path):
+    """Each block carries its own date, debtor and totals; the header covers all."""
+    payments = read_payments(tmp_path)
+    assert len(payments) == 3  # invalid date and lower-case currency are rejected
+    assert payments[0].group is payments[2].group
+
+    root = ET.fromstring(build_sepa_xml(payments))
+    assert root.find('.//sepa:GrpHdr/sepa:NbOfTxs', NS).text == "3"
+    assert root.find('.//sepa:GrpHdr/sepa:CtrlSum', NS).text == "7450.50"
+
+    blocks = root.findall('.//sepa:PmtInf', NS)
+    summary = [(block.find('sepa:ReqdExctnDt', NS).text,
+                block.find('sepa:NbOfTxs', NS).text,
+                block.find('sepa:CtrlSum', NS).text,
+                block.find('sepa:DbtrAcct/sepa:Id/sepa:IBAN', NS).text) for block in blocks]
+    assert summary == [("2024-03-15", "2", "4700.00", "DE89370400440532013000"),
+                       ("2024-03-18", "1", "2750.50", "DE44500105175407324931")]
+    ids = [block.find('sepa:PmtInfId', NS).text for block in blocks]
+    assert ids[0].endswith("-001") and ids[1].endswith("-002")
+
+
+def test_streaming_groups_like_list(tmp_path, monkeypatch):
+    """Per-block spool files give the same document as grouping the list."""
+    monkeypatch.setattr(clock, 'datetime', FixedDatetime)
+    payments = read_payments(tmp_path)
+    buffer = io.StringIO()
+    stream_sepa_xml(iter(payments), buffer)
+    assert buffer.getvalue() == build_sepa_xml(payments)
@@ -0,0 +1,49 @@
+"""Equivalence tests for the table-driven IBAN MOD-97 check."""
+
+import random
+
+from csv_to_sepa_xml.validation import iban_mod97, validate_iban, validate_ibans
+
+
+def legacy_mod97(iban):
+    """The original check-digit algorithm validate_iban used to run."""
+    rearranged = iban[4:] + iban[:4]
+    numeric_string = ""
+    for char in rearranged:
+        if char.isdigit():
+            numeric_string += char
+        else:
+            numeric_string += str(ord(char) - ord('A') + 10)
+    return int(numeric_string) % 97
+
+
+def random_iban(rng):
+    """Random IBAN-like string: mostly ASCII, sometimes exotic characters."""
+    alphabet = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    if rng.random() < 0.1:
+        alphabet += "ÄÖÜÉ٣²"
+    country = rng.choice(["DE", "FR", "IT", "NL", "RO", "MT"])
+    return country + "".join(rng.choice(alphabet) for _ in range(rng.randint(2, 30)))
+
+
+def test_iban_mod97_matches_legacy_algorithm():
+    """Same remainder (or same ValueError) as the original loop on random input."""
+    rng = random.Random(97)
+    for _ in range(20000):
+        iban = random_iban(rng)
+        try:
+            expected = legacy_mod97(iban)
+        except ValueError:
+            expected = ValueError
+        try:
+            actual = iban_mod97(iban)
+        except ValueError:
+            actual = ValueError
+        assert actual == expected, iban
+
+
+def test_validate_ibans_matches_validate_iban():
+    """The batch API returns exactly what validate_iban returns, in order."""
+    ibans = ["DE44500105175407324931", "FR1420041010050500013M02606", "DE89370400440532013001",
+             "", "de44500105175407324931", "XX1234567890", "DE44500105175407324931"]
+    assert validate_ibans(ibans) == [validate_iban(iban) for iban in ibans]
@@ -0,0 +1,74 @@
+"""Tests for MsgId, PmtInfId and EndToEndId generation."""
+
+import pickle
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pytest
+
+from csv_to_sepa_xml.batch import run_batch
+from csv_to_sepa_xml.ids import ClockIds, DocumentIds, SequenceIds, allocate
+
+CREATED = datetime(2026, 3, 2, 9, 30, 15)
+
+
+def test_clock_ids_are_fixed_width_and_numbered():
+    """EndToEndIds keep their width; numbered documents of the same second differ."""
+    ids = ClockIds().document(CREATED)
+    assert (ids.message_id, ids.end_to_end_id(1)) == ("MSG20260302093015", "E2E20260302093015000000001")
+    assert len(ids.end_to_end_id(999_999_999)) == len(ids.end_to_end_id(1))
+
+    first, second = ClockIds().document(CREATED, 1), ClockIds().document(CREATED, 2)
+    assert first.message_id == "MSG20260302093015-0001"
+    assert first.end_to_end_id(12) != second.end_to_end_id(12)
+    assert first.shard(3).payment_info_id == "PMT20260302093015-0001-0003"
+
+
+def test_ids_longer_than_35_characters_are_refused():
+    with pytest.raises(ValueError):
+        DocumentIds("M" * 36, "PMT", "E2E")
+    with pytest.raises(ValueError):
+        DocumentIds("MSG", "PMT", "E" * 27)
+
+
+def test_sequence_ids_reserve_blocks(tmp_path):
+    """Generators on one counter never share a number; a pickled copy reserves its own block."""
+    path = str(tmp_path / "ids.seq")
+    one, two = SequenceIds(path, block_size=4), SequenceIds(path, block_size=4)
+    numbers = [one.next_number(), two.next_number(), one.next_number(), pickle.loads(pickle.dumps(one)).next_number()]
+    assert numbers == [1, 5, 2, 9]
+    assert SequenceIds(path).document(CREATED).message_id == "MSG202603020000000013"
+
+    (tmp_path / "broken.seq").write_text("not a number")
+    with pytest.raises(ValueError):
+        allocate(str(tmp_path / "broken.seq"))
+
+
+def _allocate_many(path):
+    return [allocate(path, 3) for _ in range(50)]
+
+
+def test_allocate_is_unique_across_processes(tmp_path):
+    path = str(tmp_path / "ids.seq")
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        firsts = [first for result in pool.map(_allocate_many, [path] * 4) for first in result]
+    assert sorted(firsts) == list(range(1, 600, 3))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_files_get_distinct_ids(tmp_path, workers):
+    """Files converted in the same second still get their own MsgId and EndToEndIds."""
+    jobs = []
+    for name in ("a", "b", "c"):
+        (tmp_path / f"{name}.csv").write_text("name,iban,bic,amount,reference\n"
+                                              "Alice,DE89370400440532013000,COBADEFFXXX,10.50,Invoice 1\n")
+        jobs.append((str(tmp_path / f"{name}.csv"), str(tmp_path / f"{name}.xml")))
+    run_batch(jobs, (None, None, None), workers, id_generator=SequenceIds(str(tmp_path / "ids.seq")))
+
+    message_ids, end_to_end_ids = set(), set()
+    for _, output in jobs:
+        xml = open(output, encoding='utf-8').read()
+        message_ids.update(re.findall(r"<MsgId>(.*?)</MsgId>", xml))
+        end_to_end_ids.update(re.findall(r"<EndToEndId>(.*?)</EndToEndId>", xml))
+    assert len(message_ids) == len(end_to_end_ids) == 3
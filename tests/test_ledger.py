@@ -0,0 +1,95 @@
+"""Tests for the cross-run payment ledger."""
+
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from csv_to_sepa_xml.cli import run_cli_mode
+from csv_to_sepa_xml.ledger import LedgerCheck, PaymentLedger
+from csv_to_sepa_xml.payment import Payment
+
+
+def write_csv(path, first, last):
+    """Payments first..last-1, each with its own reference."""
+    lines = ["name,iban,bic,amount,reference"]
+    lines += [f"Payee {i},DE44500105175407324931,COBADEFFXXX,{i + 1}.00,Invoice {i}" for i in range(first, last)]
+    path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    return str(path)
+
+
+def ledger_rows(path):
+    with sqlite3.connect(path) as db:
+        return (db.execute("SELECT COUNT(*) FROM runs").fetchone()[0],
+                db.execute("SELECT COUNT(*) FROM payments").fetchone()[0])
+
+
+def test_resubmission_is_rejected(tmp_path):
+    """The same file converted twice fails the second time and leaves the ledger as it was."""
+    ledger = str(tmp_path / "ledger.db")
+    csv_path = write_csv(tmp_path / "payments.csv", 0, 50)
+    assert run_cli_mode(csv_path, str(tmp_path / "first.xml"), quiet=True, ledger_path=ledger) == 0
+    assert ledger_rows(ledger) == (1, 50)
+
+    assert run_cli_mode(csv_path, str(tmp_path / "second.xml"), quiet=True, ledger_path=ledger) == 1
+    assert not (tmp_path / "second.xml").exists()
+    assert ledger_rows(ledger) == (1, 50)
+
+
+def test_pinned_old_creation_time_is_not_pruned(tmp_path, monkeypatch):
+    """A SOURCE_DATE_EPOCH older than the retention period still blocks resubmission."""
+    monkeypatch.setenv('SOURCE_DATE_EPOCH', "946684800")  # 2000-01-01
+    ledger = str(tmp_path / "ledger.db")
+    csv_path = write_csv(tmp_path / "payments.csv", 0, 10)
+    assert run_cli_mode(csv_path, str(tmp_path / "first.xml"), quiet=True, ledger_path=ledger) == 0
+    assert ledger_rows(ledger) == (1, 10)
+    assert run_cli_mode(csv_path, str(tmp_path / "second.xml"), quiet=True, ledger_path=ledger) == 1
+    assert "<CreDtTm>2000-01-01T00:00:00</CreDtTm>" in (tmp_path / "first.xml").read_text(encoding='utf-8')
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_skip_leaves_out_submitted_payments(tmp_path, streaming):
+    """With the skip policy only the payments not converted before are written."""
+    ledger = str(tmp_path / "ledger.db")
+    assert run_cli_mode(write_csv(tmp_path / "monday.csv", 0, 30), str(tmp_path / "monday.xml"),
+                        quiet=True, ledger_path=ledger) == 0
+    output = tmp_path / "tuesday.xml"
+    assert run_cli_mode(write_csv(tmp_path / "tuesday.csv", 20, 45), str(output), quiet=True,
+                        streaming=streaming, ledger_path=ledger, ledger_policy='skip') == 0
+    xml = output.read_text(encoding='utf-8')
+    assert xml.count("<CdtTrfTxInf>") == 15
+    assert "Invoice 19<" not in xml and "Invoice 30<" in xml
+    assert ledger_rows(ledger) == (2, 45)
+
+
+def test_batches_and_end_to_end_ids(tmp_path):
+    """Small batches give the same result; EndToEndIds are recorded as the writer numbers them."""
+    created = datetime(2026, 3, 2, 9, 30)
+    payments = [Payment(f"Payee {i}", "DE44500105175407324931", "COBADEFFXXX", 100 + i, f"Ref {i}")
+                for i in range(25)]
+    with PaymentLedger(str(tmp_path / "ledger.db")) as ledger:
+        check = LedgerCheck(ledger, 'skip', created, batch_size=7)
+        assert list(check.filter(payments[:10])) == payments[:10]
+        check.commit()
+
+        check = LedgerCheck(ledger, 'skip', created, batch_size=7)
+        assert list(check.filter(payments)) == payments[10:]
+        check.finish()
+        check.commit()
+        assert check.submitted == 10
+        assert check.reused_ids == 10  # Numbered from 1 again in the same second
+        assert list(ledger.lookup_end_to_end_ids(["E2E20260302093000000000015", "E2E20260302093000000000016"])
+                    ) == ["E2E20260302093000000000015"]
+
+
+def test_prune_removes_old_runs(tmp_path):
+    """Runs older than the cutoff go with their payments; a payment submitted again stays."""
+    payment = Payment("Payee", "DE44500105175407324931", "COBADEFFXXX", 100, "Ref")
+    with PaymentLedger(str(tmp_path / "ledger.db")) as ledger:
+        for day in (1, 20):
+            check = LedgerCheck(ledger, 'warn', datetime(2026, 1, day), recorded=datetime(2026, 1, day))
+            list(check.filter([payment, Payment("Other", payment.iban, payment.bic, day, "Ref")]))
+            check.commit()
+        assert ledger.stats() == (2, 3)
+        assert ledger.prune(datetime(2026, 1, 10)) == (1, 1)
+        assert ledger.stats() == (1, 2)
@@ -0,0 +1,26 @@
+"""Tests for the memory-mapped CSV reader."""
+
+import pytest
+
+from csv_to_sepa_xml.csv_reader import PaymentReader
+from csv_to_sepa_xml.mmap_reader import MmapPaymentReader
+
+
+@pytest.mark.parametrize('keep_extra', [False, True])
+def test_mmap_reader_matches_csv_reader(tmp_path, tricky_csv, keep_extra):
+    """Same valid rows, invalid rows, row numbers and error report as PaymentReader."""
+    path = tricky_csv
+
+    serial = PaymentReader(path, str(tmp_path / "serial_errors.csv"), keep_extra=keep_extra)
+    mapped = MmapPaymentReader(path, str(tmp_path / "mmap_errors.csv"), keep_extra=keep_extra)
+    assert list(mapped) == list(serial)
+    assert (tmp_path / "mmap_errors.csv").read_text() == (tmp_path / "serial_errors.csv").read_text()
+    assert (mapped.valid_count, mapped.invalid_count) == (serial.valid_count, serial.invalid_count)
+
+
+def test_mmap_reader_rejects_empty_file(tmp_path):
+    """An empty file fails like it does with csv.DictReader."""
+    path = tmp_path / "empty.csv"
+    path.write_bytes(b'')
+    with pytest.raises(ValueError):
+        list(MmapPaymentReader(str(path)))
@@ -0,0 +1,24 @@
+"""Tests for multi-process CSV validation."""
+
+from csv_to_sepa_xml import parallel_reader
+from csv_to_sepa_xml.csv_reader import PaymentReader
+from csv_to_sepa_xml.parallel_reader import ParallelPaymentReader, find_record_boundaries
+
+
+def test_boundaries_never_split_quoted_fields(tmp_path):
+    """Every boundary lands right after a newline outside quotes."""
+    path = tmp_path / "payments.csv"
+    path.write_bytes(b'a,b\n"x\ny",1\n"q""\n",2\n')
+    assert find_record_boundaries(str(path), [0, 5, 14]) == [4, 12, 21]
+
+
+def test_parallel_reader_matches_serial_reader(tmp_path, tricky_csv, monkeypatch):
+    """Same valid rows, invalid rows and row numbers as the serial reader."""
+    path = tricky_csv
+    monkeypatch.setattr(parallel_reader, 'CHUNKS_PER_WORKER', 10)
+
+    serial = PaymentReader(path, error_report_path=str(tmp_path / "serial_errors.csv"))
+    parallel = ParallelPaymentReader(path, error_report_path=str(tmp_path / "parallel_errors.csv"), workers=2)
+    assert list(parallel) == list(serial)
+    assert (tmp_path / "parallel_errors.csv").read_text() == (tmp_path / "serial_errors.csv").read_text()
+    assert (parallel.valid_count, parallel.invalid_count) == (serial.valid_count, serial.invalid_count)
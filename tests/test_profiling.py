@@ -0,0 +1,43 @@
+"""Tests for the per-stage profiler behind --profile."""
+
+import json
+
+from csv_to_sepa_xml import csv_reader, validation
+from csv_to_sepa_xml.csv_reader import read_csv_file
+from csv_to_sepa_xml.profiling import Profiler
+
+
+def test_instrument_counts_validator_calls_and_restores(tmp_path):
+    """Every row is timed while instrumented; the original functions come back afterwards."""
+    path = tmp_path / "payments.csv"
+    path.write_text("name,iban,bic,amount,reference\n"
+                    "Maria Schmidt,DE44500105175407324931,COBADEFFXXX,1500.00,Inv 1\n"
+                    "Jean Dupont,FR7630006000011234567890189,BNPAFRPPXXX,2750.50,Inv 2\n",
+                    encoding='utf-8')
+    original = csv_reader.check_payment_row, validation.validate_amount_cents
+
+    profiler = Profiler()
+    with profiler.instrument():
+        with profiler.stage('read_csv_file') as stats:
+            stats.rows = len(read_csv_file(str(path)))
+
+    assert (csv_reader.check_payment_row, validation.validate_amount_cents) == original
+    stages = profiler.to_dict()['stages']
+    assert stages['read_csv_file']['rows'] == 2
+    assert stages['validate_payment_row']['calls'] == 2
+    assert stages['validate_amount']['parent'] == 'validate_payment_row'
+    assert 'validate_amount' in profiler.format_table()
+
+
+def test_save_writes_json_metrics(tmp_path):
+    """The metrics file is plain JSON with stages and counters."""
+    profiler = Profiler()
+    with profiler.stage('write_sepa_xml'):
+        pass
+    profiler.count('rows_read', 5)
+    profiler.save(str(tmp_path / "metrics.json"))
+
+    metrics = json.loads((tmp_path / "metrics.json").read_text())
+    assert metrics['counters'] == {'rows_read': 5}
+    assert metrics['stages']['write_sepa_xml']['calls'] == 1
+    assert metrics['stages']['write_sepa_xml']['cpu_seconds'] is not None
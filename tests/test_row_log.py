@@ -0,0 +1,59 @@
+"""Tests for the per-row log message counting behind --log-summary."""
+
+import logging
+import threading
+
+from csv_to_sepa_xml import row_log
+from csv_to_sepa_xml.csv_reader import read_csv_file
+
+logger = logging.getLogger("test_row_log")
+
+
+def test_summary_mode_logs_examples_then_totals(caplog):
+    """Only the first N messages per category are logged; the summary has every count."""
+    row_log.configure(2)
+    try:
+        with caplog.at_level(logging.INFO, logger="test_row_log"):
+            for row_number in range(5):
+                row_log.warning(logger, 'empty_reference', "Row %d: Reference is empty", row_number)
+            row_log.error(logger, 'invalid_row', "Row 9: bad")
+            assert row_log.log_summary(logger) == {'empty_reference': 5, 'invalid_row': 1}
+    finally:
+        row_log.configure(None)
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert messages == ["Row 0: Reference is empty", "Row 1: Reference is empty", "Row 9: bad",
+                        "empty_reference: 5 message(s), first 2 logged", "invalid_row: 1 message(s)"]
+    assert row_log.counts() == {}
+
+
+def test_reader_counts_every_empty_reference(tmp_path, caplog):
+    """The reader reports per-row warnings by category when it finishes."""
+    path = tmp_path / "payments.csv"
+    path.write_text("name,iban,bic,amount,reference\n"
+                    + "Maria Schmidt,DE44500105175407324931,COBADEFFXXX,1.00,\n" * 3,
+                    encoding='utf-8')
+    with caplog.at_level(logging.INFO):
+        read_csv_file(str(path))
+    assert "empty_reference: 3 message(s)" in caplog.text
+
+
+def test_counts_are_kept_per_thread():
+    """Conversions in two threads of one process each summarize only their own messages."""
+    barrier = threading.Barrier(2)
+    summaries = {}
+
+    def run(name, messages):
+        row_log.reset()
+        barrier.wait()
+        for row_number in range(messages):
+            row_log.warning(logger, 'empty_reference', "Row %d: Reference is empty", row_number)
+        barrier.wait()
+        summaries[name] = row_log.log_summary(logger)
+
+    threads = [threading.Thread(target=run, args=(name, messages)) for name, messages in (('a', 3), ('b', 5))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert summaries == {'a': {'empty_reference': 3}, 'b': {'empty_reference': 5}}
@@ -0,0 +1,45 @@
+"""Tests for the compiled column schema and header aliases."""
+
+import pytest
+
+from csv_to_sepa_xml.csv_reader import read_csv_file
+from csv_to_sepa_xml.schema import RowSchema, parse_column_aliases
+
+
+def test_aliases_match_case_and_separators():
+    """Bank-style headers resolve to our columns; the real name wins over an alias."""
+    schema = RowSchema(['Beneficiary Name', 'IBAN', 'SWIFT-BIC', 'Betrag', 'Purpose', 'name'])
+    assert dict(zip(schema.columns, schema.indexes)) == {
+        'name': 5, 'iban': 1, 'bic': 2, 'amount': 3, 'reference': 4,
+    }
+    assert schema.renamed() == {'IBAN': 'iban', 'SWIFT-BIC': 'bic', 'Betrag': 'amount', 'Purpose': 'reference'}
+    assert not schema.has_groups
+
+
+def test_rows_by_position():
+    """Rows keep only the needed columns; short rows get empty strings, full_row keeps DictReader's shape."""
+    schema = RowSchema(['id', 'name', 'iban', 'bic', 'amount', 'reference', 'note'])
+    assert schema.row(['7', 'Alice', 'DE44', 'BIC', '1.00', 'Ref', 'x']) == {
+        'name': 'Alice', 'iban': 'DE44', 'bic': 'BIC', 'amount': '1.00', 'reference': 'Ref',
+    }
+    assert schema.row(['7', 'Alice'])['amount'] == ''
+    assert schema.full_row(['7', 'Alice'])['note'] is None
+
+    extra = RowSchema(schema.fieldnames, keep_extra=True)
+    assert extra.row(['7', 'Alice', 'DE44', 'BIC', '1.00', 'Ref', 'x', 'surplus'])[None] == ['surplus']
+    assert extra.row(['7', 'Alice', 'DE44', 'BIC', '1.00', 'Ref', 'x'])['note'] == 'x'
+
+
+def test_custom_aliases(tmp_path):
+    """--column-alias adds header names; unknown columns are refused."""
+    aliases = parse_column_aliases(["name=Empfänger", "reference=Zweck"])
+    path = tmp_path / "export.csv"
+    path.write_text("Empfänger,IBAN,BIC,Betrag,Zweck\n"
+                    "Alice,DE44500105175407324931,COBADEFFXXX,10.50,Invoice 1\n", encoding='utf-8')
+    [payment] = read_csv_file(str(path), aliases=aliases)
+    assert (payment.name, payment.amount, payment.reference) == ("Alice", "10.50", "Invoice 1")
+
+    with pytest.raises(ValueError):
+        read_csv_file(str(path))  # Without the aliases, 'name' is missing
+    with pytest.raises(ValueError):
+        parse_column_aliases(["payee=Empfänger"])
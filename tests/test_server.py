@@ -0,0 +1,92 @@
+"""Tests for the local HTTP conversion service."""
+
+import asyncio
+import json
+
+from csv_to_sepa_xml.server import ConversionServer
+
+HEADER = "name,iban,bic,amount,reference\n"
+VALID = "Alice,DE89370400440532013000,COBADEFFXXX,10.50,Invoice 1\n"
+INVALID = "Bob,DE00000000000000000000,COBADEFFXXX,-1,Invoice 2\n"
+
+
+async def request(port, head, body=b''):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(head.encode('latin-1') + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status_line, _, rest = response.partition(b'\r\n')
+    _headers, _, content = rest.partition(b'\r\n\r\n')
+    return int(status_line.split()[1]), _headers.decode('latin-1'), content
+
+
+def post(port, csv_text, query=''):
+    body = csv_text.encode('utf-8')
+    head = f"POST /convert{query} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n"
+    return request(port, head, body)
+
+
+def test_convert_upload_and_error_report():
+    """Valid uploads get XML back; invalid rows get a JSON error report unless forced."""
+
+    async def scenario():
+        server = ConversionServer((None, None, None), port=0, max_concurrent=1)
+        await server.start()
+        try:
+            status, headers, content = await post(server.port, HEADER + VALID * 2)
+            assert status == 200
+            assert 'X-Payments: 2' in headers
+            assert b'<NbOfTxs>2</NbOfTxs>' in content
+
+            status, _headers, content = await post(server.port, HEADER + VALID + INVALID)
+            assert status == 422
+            report = json.loads(content)
+            assert (report['payments'], report['invalid_rows']) == (1, 1)
+            assert report['rows'][0]['row_number'] == 3
+            assert report['rows'][0]['data']['name'] == 'Bob'
+
+            status, headers, _content = await post(server.port, HEADER + VALID + INVALID, '?force=1')
+            assert status == 200 and 'X-Invalid-Rows: 1' in headers
+
+            # Chunked upload
+            body = HEADER + VALID
+            chunked = f"{len(body):x}\r\n{body}\r\n0\r\n\r\n".encode('utf-8')
+            status, _headers, _content = await request(
+                server.port, "POST /convert HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n", chunked)
+            assert status == 200
+
+            status, _headers, content = await request(server.port, "GET /health HTTP/1.1\r\n\r\n")
+            assert status == 200 and json.loads(content)['status'] == 'ok'
+            status, _headers, _content = await request(server.port, "GET /nope HTTP/1.1\r\n\r\n")
+            assert status == 404
+        finally:
+            await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_slow_upload_does_not_hold_a_conversion_slot():
+    """With one slot, a client still sending its body does not block other conversions."""
+
+    async def scenario():
+        server = ConversionServer((None, None, None), port=0, max_concurrent=1)
+        await server.start()
+        try:
+            body = (HEADER + VALID).encode('utf-8')
+            reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+            writer.write(f"POST /convert HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode('latin-1')
+                         + body[:10])
+            await writer.drain()
+
+            status, _headers, _content = await asyncio.wait_for(post(server.port, HEADER + VALID), timeout=10)
+            assert status == 200
+
+            writer.write(body[10:])
+            await writer.drain()
+            assert (await reader.read()).startswith(b'HTTP/1.1 200')
+            writer.close()
+        finally:
+            await server.close()
+
+    asyncio.run(scenario())
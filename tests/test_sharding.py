@@ -0,0 +1,41 @@
+"""Tests for splitting output into several pain.001 files."""
+
+import json
+import os
+
+import pytest
+
+from csv_to_sepa_xml.payment import Payment
+from csv_to_sepa_xml.sharding import write_sharded_sepa_xml
+
+PAYMENTS = [Payment(f"Payee {i}", "DE44500105175407324931", "COBADEFFXXX", 1000 + i, f"Ref {i}")
+            for i in range(25)]
+
+
+def test_split_by_transaction_count(tmp_path):
+    """Each shard holds at most N transactions and its own totals."""
+    manifest_path, manifest = write_sharded_sepa_xml(PAYMENTS, str(tmp_path / "out.xml"), max_tx_per_file=10)
+    assert [shard['nb_of_txs'] for shard in manifest['shards']] == [10, 10, 5]
+    assert len({shard['message_id'] for shard in manifest['shards']}) == 3
+    assert json.load(open(manifest_path)) == manifest
+    assert manifest['ctrl_sum'] == "253.00"
+
+
+def test_no_payments_is_an_error(tmp_path):
+    """Like a single file, nothing to write fails instead of writing an empty manifest."""
+    with pytest.raises(ValueError, match="no valid data"):
+        write_sharded_sepa_xml([], str(tmp_path / "out.xml"), max_tx_per_file=10)
+    assert not list(tmp_path.iterdir())
+
+
+def test_split_by_size_never_exceeds_limit(tmp_path):
+    """Shards stay within the byte limit and use as much of it as they can."""
+    limit = 6000
+    _, manifest = write_sharded_sepa_xml(PAYMENTS, str(tmp_path / "out.xml"), max_bytes_per_file=limit)
+    assert sum(shard['nb_of_txs'] for shard in manifest['shards']) == len(PAYMENTS)
+    for shard in manifest['shards']:
+        size = os.path.getsize(tmp_path / shard['file'])
+        assert size == shard['bytes'] <= limit
+    # Every shard but the last is full: one more transaction would not fit
+    tx_size = 700
+    assert all(shard['bytes'] > limit - tx_size for shard in manifest['shards'][:-1])
@@ -0,0 +1,40 @@
+"""Tests for the bounded IBAN/BIC validation cache."""
+
+from csv_to_sepa_xml.validation import validate_bic, validate_iban
+from csv_to_sepa_xml.validation_cache import ValidationCache
+
+
+def test_cache_returns_same_verdicts_and_counts_hits():
+    """Cached verdicts equal the direct ones; repeats are served as hits."""
+    cache = ValidationCache(maxsize=10)
+    for _ in range(3):
+        assert cache.validate_iban("DE89370400440532013001") == validate_iban("DE89370400440532013001")
+        assert cache.validate_bic("INTESA") == validate_bic("INTESA")
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (4, 2)
+
+
+def test_cache_evicts_least_recently_used():
+    """The size limit holds and the oldest unused entry goes first."""
+    cache = ValidationCache(maxsize=2)
+    cache.validate_bic("COBADEFFXXX")
+    cache.validate_bic("BNPAFRPPXXX")
+    cache.validate_bic("COBADEFFXXX")  # refresh
+    cache.validate_bic("UNCRITMM")     # evicts BNPAFRPPXXX
+    assert len(cache) == 2
+    assert cache.stats()['evictions'] == 1
+    cache.validate_bic("COBADEFFXXX")
+    assert cache.stats()['hits'] == 2
+
+
+def test_snapshot_round_trip(tmp_path):
+    """A saved snapshot warms a new cache."""
+    path = str(tmp_path / "cache.json")
+    cache = ValidationCache()
+    cache.validate_iban("DE44500105175407324931")
+    cache.save(path)
+
+    warm = ValidationCache()
+    assert warm.load(path) == 1
+    assert warm.validate_iban("DE44500105175407324931") == (True, None)
+    assert warm.stats()['misses'] == 0
@@ -0,0 +1,64 @@
+"""Tests for the watch-folder mode."""
+
+import os
+
+from csv_to_sepa_xml.watch import FolderWatcher
+
+HEADER = "name,iban,bic,amount,reference\n"
+VALID = "Alice,DE89370400440532013000,COBADEFFXXX,10.50,Invoice 1\n"
+INVALID = "Bob,DE00000000000000000000,COBADEFFXXX,-1,Invoice 2\n"
+
+
+def names(results):
+    return [os.path.basename(result['input']) for result in results]
+
+
+def test_converts_only_new_and_changed_files(tmp_path):
+    """Files are converted once they are stable, and again only when their content changes."""
+    inbox, outbox = tmp_path / "inbox", tmp_path / "outbox"
+    inbox.mkdir()
+    (inbox / "a.csv").write_text(HEADER + VALID + INVALID)
+    watcher = FolderWatcher(str(inbox), str(outbox), (None, None, None), interval=0)
+    os.makedirs(outbox)
+
+    assert watcher.run_once() == ([], 0)  # First sighting: wait until the file is stable
+    results, waiting = watcher.run_once()
+    assert (names(results), waiting) == (["a.csv"], 0)
+    assert (outbox / "a.xml").exists() and (outbox / "a_errors.csv").exists()
+
+    # Touched without a content change: the index is updated, nothing is converted
+    os.utime(inbox / "a.csv", ns=(1, 1))
+    watcher.run_once()
+    assert watcher.run_once() == ([], 0)
+    assert watcher.index["a.csv"]['mtime_ns'] == 1
+
+    # A restarted watcher knows the file from the index
+    restarted = FolderWatcher(str(inbox), str(outbox), (None, None, None))
+    restarted.load_index()
+    restarted.run_once()
+    assert restarted.run_once() == ([], 0)
+
+    (inbox / "a.csv").write_text(HEADER + VALID * 2)
+    restarted.run_once()
+    results, _waiting = restarted.run_once()
+    assert [result['payments'] for result in results] == [2]
+    assert not (outbox / "a_errors.csv").exists()
+
+
+def test_backpressure_limits_files_per_cycle(tmp_path):
+    """Only max_pending files are converted per cycle; the rest wait."""
+    inbox, outbox = tmp_path / "inbox", tmp_path / "outbox"
+    inbox.mkdir()
+    os.makedirs(outbox)
+    for number in range(5):
+        (inbox / f"f{number}.csv").write_text(HEADER + VALID)
+    watcher = FolderWatcher(str(inbox), str(outbox), (None, None, None), max_pending=2)
+
+    watcher.run_once()
+    results, waiting = watcher.run_once()
+    assert (len(results), waiting) == (2, 3)
+    results, waiting = watcher.run_once()
+    assert (len(results), waiting) == (2, 1)
+    results, waiting = watcher.run_once()
+    assert (len(results), waiting) == (1, 0)
+    assert len(list(outbox.glob("*.xml"))) == 5
@@ -0,0 +1,87 @@
+"""Tests for the streaming SEPA XML writer."""
+
+import io
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from xml.dom import minidom
+
+from csv_to_sepa_xml import clock, xml_builder
+from csv_to_sepa_xml.xml_builder import build_sepa_xml, write_sepa_xml
+
+
+class FixedDatetime(datetime):
+    """datetime whose now() never moves, so two documents can be compared."""
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2024, 3, 1, 12, 30, 45)
+
+
+PAYMENTS = [
+    {'name': 'Maria Schmidt', 'iban': 'DE44500105175407324931', 'bic': 'COBADEFFXXX',
+     'amount': '1500.00', 'reference': 'Invoice 2024-001'},
+    {'name': 'Smith & <Sons> "Ltd"', 'iban': 'FR7630006000011234567890189', 'bic': '',
+     'amount': '2750.5', 'reference': ''},
+    {'name': 'Line\r\nbreak', 'iban': 'IT60X0542811101000000123456', 'bic': 'BPPIITRRXXX',
+     'amount': '890', 'reference': 'Müller €'},
+]
+
+
+def reference_xml(payments, name):
+    """The ElementTree + minidom pipeline the streaming writer replaced."""
+    now = FixedDatetime.now()
+    root = ET.Element("Document", xmlns=xml_builder.SEPA_NAMESPACE)
+    main = ET.SubElement(root, "CstmrCdtTrfInitn")
+    header = ET.SubElement(main, "GrpHdr")
+    ET.SubElement(header, "MsgId").text = "MSG" + now.strftime("%Y%m%d%H%M%S")
+    ET.SubElement(header, "CreDtTm").text = now.strftime("%Y-%m-%dT%H:%M:%S")
+    ET.SubElement(header, "NbOfTxs").text = str(len(payments))
+    total = sum(float(p['amount']) for p in payments)
+    ET.SubElement(header, "CtrlSum").text = f"{total:.2f}"
+    ET.SubElement(ET.SubElement(header, "InitgPty"), "Nm").text = name
+    info = ET.SubElement(main, "PmtInf")
+    ET.SubElement(info, "PmtInfId").text = "PMT" + now.strftime("%Y%m%d%H%M%S")
+    ET.SubElement(info, "PmtMtd").text = "TRF"
+    ET.SubElement(info, "NbOfTxs").text = str(len(payments))
+    ET.SubElement(info, "CtrlSum").text = f"{total:.2f}"
+    ET.SubElement(ET.SubElement(ET.SubElement(info, "PmtTpInf"), "SvcLvl"), "Cd").text = "SEPA"
+    ET.SubElement(info, "ReqdExctnDt").text = now.strftime("%Y-%m-%d")
+    ET.SubElement(ET.SubElement(info, "Dbtr"), "Nm").text = name
+    ET.SubElement(ET.SubElement(ET.SubElement(info, "DbtrAcct"), "Id"), "IBAN").text = "DE89370400440532013000"
+    ET.SubElement(ET.SubElement(ET.SubElement(info, "DbtrAgt"), "FinInstnId"), "BIC").text = "COBADEFFXXX"
+    ET.SubElement(info, "ChrgBr").text = "SLEV"
+    for i, p in enumerate(payments, start=1):
+        tx = ET.SubElement(info, "CdtTrfTxInf")
+        ET.SubElement(ET.SubElement(tx, "PmtId"), "EndToEndId").text = f"E2E{now.strftime('%Y%m%d%H%M%S')}{i:09d}"
+        ET.SubElement(ET.SubElement(tx, "Amt"), "InstdAmt", Ccy="EUR").text = f"{float(p['amount']):.2f}"
+        if p['bic']:
+            ET.SubElement(ET.SubElement(ET.SubElement(tx, "CdtrAgt"), "FinInstnId"), "BIC").text = p['bic']
+        ET.SubElement(ET.SubElement(tx, "Cdtr"), "Nm").text = p['name']
+        ET.SubElement(ET.SubElement(ET.SubElement(tx, "CdtrAcct"), "Id"), "IBAN").text = p['iban']
+        if p['reference']:
+            ET.SubElement(ET.SubElement(tx, "RmtInf"), "Ustrd").text = p['reference']
+    return minidom.parseString(ET.tostring(root, encoding='unicode')).toprettyxml(indent="  ")
+
+
+def test_build_sepa_xml_matches_minidom_output(monkeypatch):
+    """The streamed document is byte for byte what minidom used to produce."""
+    monkeypatch.setattr(clock, 'datetime', FixedDatetime)
+    expected = reference_xml(PAYMENTS, 'ACME & Co')
+    assert build_sepa_xml(PAYMENTS, company_name='ACME & Co') == expected
+
+
+def test_write_sepa_xml_returns_control_sum():
+    """write_sepa_xml streams into the given file object and returns the total in cents."""
+    buffer = io.StringIO()
+    total = write_sepa_xml(PAYMENTS, buffer)
+    assert total == 514050
+    assert buffer.getvalue().endswith("</Document>\n")
+
+
+def test_stream_sepa_xml_matches_list_output(monkeypatch):
+    """Spooling a generator gives the same document as writing a list."""
+    monkeypatch.setattr(clock, 'datetime', FixedDatetime)
+    buffer = io.StringIO()
+    count, total = xml_builder.stream_sepa_xml(iter(PAYMENTS), buffer, company_name='ACME & Co')
+    assert count == len(PAYMENTS)
+    assert buffer.getvalue() == build_sepa_xml(PAYMENTS, company_name='ACME & Co')